@@ -0,0 +1,282 @@
+import os
+import math
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlparse
+
+# --- Configuration (environment overrides) ---
+# Request threads a worker serves; URL scoring may hold at most
+# (1 - ADMISSION_RESERVED_SHARE) of them, leaving the rest to uploads and pages
+WORKER_THREADS = int(os.environ.get('MARKSKING_WORKER_THREADS', '64'))
+ADMISSION_RESERVED_SHARE = float(os.environ.get('MARKSKING_ADMISSION_RESERVED_SHARE', '0.25'))
+# Concurrent outbound page fetches, in total and per answer key host
+MAX_OUTBOUND = int(os.environ.get('MARKSKING_MAX_OUTBOUND', '32'))
+MAX_OUTBOUND_PER_HOST = int(os.environ.get('MARKSKING_MAX_OUTBOUND_PER_HOST', '16'))
+# Concurrent requests to one fetch backend (a proxy service or the direct route)
+MAX_PER_BACKEND = int(os.environ.get('MARKSKING_MAX_PER_BACKEND', '12'))
+# Requests allowed to wait for a fetch slot, and for how long
+ADMISSION_QUEUE = int(os.environ.get('MARKSKING_ADMISSION_QUEUE', '16'))
+ADMISSION_MAX_WAIT = float(os.environ.get('MARKSKING_ADMISSION_MAX_WAIT', '10'))
+# The same limits for the ASGI entry point, where a waiting fetch holds no thread
+ASYNC_MAX_OUTBOUND = int(os.environ.get('MARKSKING_ASYNC_MAX_OUTBOUND', '1024'))
+ASYNC_MAX_OUTBOUND_PER_HOST = int(os.environ.get('MARKSKING_ASYNC_MAX_OUTBOUND_PER_HOST', '256'))
+ASYNC_MAX_PER_BACKEND = int(os.environ.get('MARKSKING_ASYNC_MAX_PER_BACKEND', '256'))
+ASYNC_ADMISSION_QUEUE = int(os.environ.get('MARKSKING_ASYNC_ADMISSION_QUEUE', '4096'))
+
+# Bounds of the Retry-After estimate (seconds)
+MIN_RETRY_AFTER = 2
+MAX_RETRY_AFTER = 60
+
+
+class Saturated(Exception):
+    """Raised when a fetch cannot be admitted; routes answer 503 with Retry-After."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Admission control for outbound answer key fetches.
+
+    A fetch needs a slot for its target host, then a global slot, so a request
+    waiting on a busy host never holds a global slot that fetches from other
+    hosts could use. When no slot is free the request joins a bounded wait
+    queue for at most max_wait seconds; once the queue is full, or the wait
+    runs out, Saturated is raised at once instead of piling up more blocked
+    request threads. Slots plus queue never exceed the unreserved share of
+    the worker's threads, so file uploads and static pages are still served
+    while URL scoring is saturated.
+    """
+
+    def __init__(self, max_outbound=MAX_OUTBOUND, max_per_host=MAX_OUTBOUND_PER_HOST,
+                 max_queue=ADMISSION_QUEUE, max_wait=ADMISSION_MAX_WAIT,
+                 worker_threads=WORKER_THREADS, reserved_share=ADMISSION_RESERVED_SHARE):
+        budget = max(int(worker_threads * (1 - reserved_share)), 1)
+        self.max_outbound = max(min(max_outbound, budget), 1)
+        self.max_queue = max(min(max_queue, budget - self.max_outbound), 0)
+        self.max_per_host = max(min(max_per_host, self.max_outbound), 1)
+        self.max_wait = max_wait
+        self._slots = threading.BoundedSemaphore(self.max_outbound)
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._active = 0
+        # Smoothed seconds a fetch holds its slot (for the Retry-After estimate)
+        self._hold_seconds = 2.0
+        self.admitted = 0
+        self.rejected = 0
+
+    def _host_slots(self, host):
+        with self._lock:
+            semaphore = self._hosts.get(host)
+            if semaphore is None:
+                semaphore = self._hosts[host] = threading.BoundedSemaphore(self.max_per_host)
+            return semaphore
+
+    def retry_after(self):
+        """Seconds a rejected client should wait: the current backlog over the fetch capacity."""
+        backlog = self._active + self._waiting + 1
+        estimate = math.ceil(self._hold_seconds * backlog / self.max_outbound)
+        return min(max(estimate, MIN_RETRY_AFTER), MAX_RETRY_AFTER)
+
+    def _reject(self, reason):
+        with self._lock:
+            self.rejected += 1
+        retry_after = self.retry_after()
+        print(f"🚦 Fetch not admitted ({reason}); retry after {retry_after}s")
+        raise Saturated(f"Too many answer keys are being fetched right now ({reason})", retry_after)
+
+    def _acquire(self, semaphore, deadline):
+        """Takes a slot, queueing until the deadline when none is free. Returns False on timeout."""
+        if semaphore.acquire(blocking=False):
+            return True
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                queue_full = True
+            else:
+                queue_full = False
+                self._waiting += 1
+        if queue_full:
+            self._reject('queue full')
+        try:
+            return semaphore.acquire(timeout=max(deadline - time.monotonic(), 0))
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    @contextmanager
+    def admit(self, url):
+        """
+        Holds a per-host and a global fetch slot (taken in that order) for the duration of the block.
+
+        Raises:
+            Saturated: If the wait queue is full or no slot freed up in time.
+        """
+        deadline = time.monotonic() + self.max_wait
+        host_slots = self._host_slots(urlparse(url).hostname or '')
+        if not self._acquire(host_slots, deadline):
+            self._reject('timed out waiting for host')
+        try:
+            if not self._acquire(self._slots, deadline):
+                self._reject('timed out waiting')
+            try:
+                with self._lock:
+                    self._active += 1
+                    self.admitted += 1
+                started = time.monotonic()
+                try:
+                    yield
+                finally:
+                    held = time.monotonic() - started
+                    with self._lock:
+                        self._active -= 1
+                        self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * held
+            finally:
+                self._slots.release()
+        finally:
+            host_slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {'active': self._active, 'waiting': self._waiting, 'admitted': self.admitted,
+                    'rejected': self.rejected, 'max_outbound': self.max_outbound, 'max_queue': self.max_queue}
+
+
+class AsyncAdmissionController(AdmissionController):
+    """
+    AdmissionController for fetches awaited on an event loop (asgi.py). Same
+    slots, bounded queue, deadline and Retry-After estimate, but waiting
+    happens on asyncio semaphores, so the limits are not tied to a thread count.
+    """
+
+    def __init__(self, max_outbound=ASYNC_MAX_OUTBOUND, max_per_host=ASYNC_MAX_OUTBOUND_PER_HOST,
+                 max_queue=ASYNC_ADMISSION_QUEUE, max_wait=ADMISSION_MAX_WAIT):
+        super().__init__(max_outbound, max_per_host, max_queue, max_wait,
+                         worker_threads=max_outbound + max_queue, reserved_share=0)
+        self._slots = asyncio.BoundedSemaphore(self.max_outbound)
+
+    def _host_slots(self, host):
+        with self._lock:
+            semaphore = self._hosts.get(host)
+            if semaphore is None:
+                semaphore = self._hosts[host] = asyncio.BoundedSemaphore(self.max_per_host)
+            return semaphore
+
+    async def _acquire(self, semaphore, deadline):
+        if not semaphore.locked():
+            await semaphore.acquire()
+            return True
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                queue_full = True
+            else:
+                queue_full = False
+                self._waiting += 1
+        if queue_full:
+            self._reject('queue full')
+        try:
+            await asyncio.wait_for(semaphore.acquire(), max(deadline - time.monotonic(), 0))
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    @asynccontextmanager
+    async def admit(self, url):
+        """
+        Holds a per-host and a global fetch slot (taken in that order) for the duration of the block.
+
+        Raises:
+            Saturated: If the wait queue is full or no slot freed up in time.
+        """
+        deadline = time.monotonic() + self.max_wait
+        host_slots = self._host_slots(urlparse(url).hostname or '')
+        if not await self._acquire(host_slots, deadline):
+            self._reject('timed out waiting for host')
+        try:
+            if not await self._acquire(self._slots, deadline):
+                self._reject('timed out waiting')
+            try:
+                with self._lock:
+                    self._active += 1
+                    self.admitted += 1
+                started = time.monotonic()
+                try:
+                    yield
+                finally:
+                    held = time.monotonic() - started
+                    with self._lock:
+                        self._active -= 1
+                        self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * held
+            finally:
+                self._slots.release()
+        finally:
+            host_slots.release()
+
+
+class BackendLimiter:
+    """
+    Per-backend concurrency limits for fetch strategies. A strategy whose
+    backend is at its limit is skipped (the pipeline moves on to the next
+    one) rather than waited for, so one slow proxy cannot hold every request.
+    """
+
+    def __init__(self, max_per_backend=MAX_PER_BACKEND):
+        self.max_per_backend = max(max_per_backend, 1)
+        self._backends = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, name):
+        with self._lock:
+            semaphore = self._backends.get(name)
+            if semaphore is None:
+                semaphore = self._backends[name] = threading.BoundedSemaphore(self.max_per_backend)
+        return semaphore.acquire(blocking=False)
+
+    def release(self, name):
+        self._backends[name].release()
+
+
+# Process-wide limits shared by all routes and bulk jobs
+admission = AdmissionController()
+backend_limits = BackendLimiter()
+# Their counterparts for the ASGI entry point's event loop
+async_admission = AsyncAdmissionController()
+async_backend_limits = BackendLimiter(ASYNC_MAX_PER_BACKEND)
+
+
+if __name__ == '__main__':
+    # Saturation simulation: slow fetches against a small controller
+    import argparse
+    from concurrent.futures import ThreadPoolExecutor
+
+    parser = argparse.ArgumentParser(description="Simulate admission control under load")
+    parser.add_argument('--requests', type=int, default=60)
+    parser.add_argument('--fetch-seconds', type=float, default=0.2)
+    args = parser.parse_args()
+
+    controller = AdmissionController(max_outbound=8, max_per_host=8, max_queue=8, max_wait=1.0,
+                                     worker_threads=64, reserved_share=0.25)
+    outcomes = {'ok': 0, 'rejected': 0}
+    outcomes_lock = threading.Lock()
+
+    def fetch(number):
+        try:
+            with controller.admit(f"https://example.test/key/{number}"):
+                time.sleep(args.fetch_seconds)
+            outcome = 'ok'
+        except Saturated:
+            outcome = 'rejected'
+        with outcomes_lock:
+            outcomes[outcome] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.requests) as pool:
+        list(pool.map(fetch, range(args.requests)))
+    print(f"{outcomes} in {time.perf_counter() - started:.2f}s; {controller.stats()}")
@@ -0,0 +1,258 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from answer_sheet import UNREAD
+from result_store import result_store
+
+# How many exam shifts to keep master keys for (least recently used are dropped)
+MAX_SHIFTS = 512
+
+# A code becomes a question's agreed key once this many independent sheets
+# (distinct roll numbers) report it, outnumbering any other codes this many to one
+KEY_QUORUM = int(os.environ.get('MARKSKING_KEY_QUORUM', '3'))
+# Sheets per shift that vote; later sheets are only compared
+MAX_VOTERS = 64
+
+# Seconds a process trusts what it last read of a shift's key revisions
+REVISION_REFRESH = float(os.environ.get('MARKSKING_REVISION_REFRESH', '30'))
+
+# candidate_info values that mean "not parsed" and must never form a shift key
+_UNKNOWN_VALUES = {'', 'n/a', 'unknown'}
+
+
+class MasterKey:
+    """
+    Answer key of one exam shift as compact parallel arrays: for every question,
+    how many independent sheets reported each key code.
+    """
+
+    def __init__(self, quorum=KEY_QUORUM, max_voters=MAX_VOTERS):
+        self.quorum = quorum
+        self.max_voters = max_voters
+        self.question_ids = []
+        self.positions = {}
+        self.votes = []
+        self.voters = set()
+        self.complete = False
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def _agreed(self, votes):
+        code, count = max(votes.items(), key=lambda item: item[1])
+        others = sum(votes.values()) - count
+        return code if count >= self.quorum and count >= self.quorum * others else None
+
+    def lookup(self, question_id):
+        """Returns the agreed key code for a question, or None while the shift's sheets have not agreed on one."""
+        position = self.positions.get(question_id)
+        return None if position is None else self._agreed(self.votes[position])
+
+    def leading(self, question_id):
+        """Returns the key code most sheets reported for a question, or None if the shift has not seen it."""
+        position = self.positions.get(question_id)
+        if position is None:
+            return None
+        votes = self.votes[position]
+        return max(votes, key=votes.get)
+
+    def vote(self, voter, sheet):
+        """
+        Counts a sheet's embedded key codes, once per voter (roll number).
+
+        Returns:
+            bool: False when the voter has voted already or the shift has enough votes.
+        """
+        if voter in self.voters or len(self.voters) >= self.max_voters:
+            return False
+        self.voters.add(voter)
+        for question_id, code in zip(sheet.question_ids, sheet.key):
+            if code == UNREAD:
+                continue
+            position = self.positions.get(question_id)
+            if position is None:
+                position = self.positions[question_id] = len(self.question_ids)
+                self.question_ids.append(question_id)
+                self.votes.append({})
+            votes = self.votes[position]
+            votes[code] = votes.get(code, 0) + 1
+        self.complete = all(self._agreed(votes) is not None for votes in self.votes)
+        return True
+
+
+class ShiftKeyIndex:
+    """
+    Master answer keys keyed by (exam, exam date, exam time).
+
+    Every sheet is scored against its own embedded key, and questions where it
+    disagrees with the other sheets of its shift are reported. Only once
+    independent sheets agree on a question's code (see MasterKey) does that
+    code override a disagreeing page, and a shift whose every question is agreed
+    lets later pages skip reading rightAns (see agreed_shifts()). Pages fetched
+    by URL vote, whichever proxy they came through; uploaded files never do,
+    since their HTML is user supplied.
+
+    Published key revisions (saved to the result store by rescoring.py) take
+    precedence over both, in every process that reads them.
+    """
+
+    def __init__(self, max_shifts=MAX_SHIFTS, revisions=None):
+        self.max_shifts = max_shifts
+        # Callable shift -> (revised_at, {question_id: code}) or None
+        self.revisions = revisions
+        self._shifts = OrderedDict()
+        self._revisions = OrderedDict()
+        self._agreed = frozenset()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def shift_key(exam, candidate_info):
+        """Returns the index key for a page, or None if its date/time were not parsed."""
+        candidate_info = candidate_info or {}
+        exam_date = str(candidate_info.get('exam_date', '')).strip()
+        exam_time = str(candidate_info.get('exam_time', '')).strip()
+        if exam_date.lower() in _UNKNOWN_VALUES or exam_time.lower() in _UNKNOWN_VALUES:
+            return None
+        return (exam, exam_date, exam_time)
+
+    def get(self, shift):
+        with self._lock:
+            return self._shifts.get(shift)
+
+    def forget(self, shift):
+        """Drops a shift's master key (e.g. after SSC publishes a final key)."""
+        with self._lock:
+            self._shifts.pop(shift, None)
+            self._revisions.pop(shift, None)
+            self._agreed = self._agreed - {shift}
+
+    def __len__(self):
+        return len(self._shifts)
+
+    def agreed_shifts(self, exam):
+        """Shifts of an exam whose every question has an agreed key code (pages of those need not read rightAns)."""
+        return frozenset(shift for shift in self._agreed if shift[0] == exam)
+
+    def revision(self, shift):
+        """
+        (revised_at, {question_id: code}) of a shift's published key revisions,
+        or None. Re-read from the revision source at most every REVISION_REFRESH
+        seconds per shift.
+        """
+        if self.revisions is None or shift is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            cached = self._revisions.get(shift)
+        if cached is not None and now - cached[0] < REVISION_REFRESH:
+            return cached[1]
+        try:
+            revision = self.revisions(shift)
+        except Exception as e:
+            print(f"Error reading key revisions: {e}")
+            revision = cached[1] if cached is not None else None
+        with self._lock:
+            self._revisions[shift] = (now, revision)
+            self._revisions.move_to_end(shift)
+            while len(self._revisions) > self.max_shifts:
+                self._revisions.popitem(last=False)
+        return revision
+
+    def revised_after(self, exam, candidate_info, timestamp):
+        """
+        True when a result of this shift scored (or rendered) at timestamp may
+        predate a key revision, allowing REVISION_REFRESH for processes to see it.
+        """
+        revision = self.revision(self.shift_key(exam, candidate_info))
+        return revision is not None and timestamp < revision[0] + REVISION_REFRESH
+
+    def reconcile(self, exam, candidate_info, sheet, trusted=False):
+        """
+        Resolves the key a sheet should be scored against: its own embedded key,
+        except where a key revision or the shift's agreed key says otherwise.
+
+        Args:
+            exam (str): Exam identifier, e.g. 'mts', 'je', 'chsl'.
+            candidate_info (dict): Parsed candidate details of the page.
+            sheet (AnswerSheet): The page's questions, chosen options and embedded key.
+            trusted (bool): True for pages fetched by URL rather than uploaded.
+
+        Returns:
+            tuple: (key, key_check) where key is the code string to score with, or
+                   None when the page's key was not read and the shift no longer has
+                   a code for every question (extract it again with the key). key_check
+                   reports whether the shift was already indexed, the question IDs
+                   whose embedded key disagrees with the shift's other sheets
+                   (mismatched_questions), those of them scored with the shift's agreed
+                   key (overridden_questions) and those a key revision changed
+                   (revised_questions).
+        """
+        key_check = {'indexed': False, 'shift_seen': False, 'mismatched_questions': [],
+                     'overridden_questions': [], 'revised_questions': []}
+        shift = self.shift_key(exam, candidate_info)
+        unread = UNREAD in sheet.key
+        if shift is None or not len(sheet):
+            return (None if unread else sheet.key), key_check
+        if not sheet.has_unique_ids():
+            print("⚠️ Duplicate question IDs on page, skipping answer key index")
+            return (None if unread else sheet.key), key_check
+
+        revision = self.revision(shift)
+        revised = revision[1] if revision is not None else {}
+        voter = str((candidate_info or {}).get('roll_no', '')).strip()
+        if voter.lower() in _UNKNOWN_VALUES:
+            voter = None
+        resolved, missing = [], False
+        with self._lock:
+            master = self._shifts.get(shift)
+            if master is not None:
+                key_check['shift_seen'] = True
+                self._shifts.move_to_end(shift)
+            elif trusted and voter:
+                master = MasterKey()
+                self._shifts[shift] = master
+                while len(self._shifts) > self.max_shifts:
+                    self._shifts.popitem(last=False)
+
+            for question_id, own_code in zip(sheet.question_ids, sheet.key):
+                code = own_code
+                if master is not None:
+                    agreed = master.lookup(question_id)
+                    if own_code == UNREAD:
+                        code = agreed
+                    else:
+                        leading = master.leading(question_id)
+                        if leading is not None and leading != own_code:
+                            key_check['mismatched_questions'].append(question_id)
+                            if agreed is not None:
+                                key_check['overridden_questions'].append(question_id)
+                                code = agreed
+                revised_code = revised.get(question_id)
+                if revised_code is not None:
+                    if revised_code != code:
+                        key_check['revised_questions'].append(question_id)
+                    code = revised_code
+                if code is None or code == UNREAD:
+                    missing = True
+                    break
+                resolved.append(code)
+
+            if master is not None:
+                if trusted and voter and not unread and master.vote(voter, sheet):
+                    agreed_shifts = self._agreed | {shift} if master.complete else self._agreed - {shift}
+                    self._agreed = frozenset(shift for shift in agreed_shifts if shift in self._shifts)
+                key_check['indexed'] = True
+
+        if missing:
+            return None, key_check
+        if key_check['mismatched_questions']:
+            print(f"⚠️ Embedded answer key disagrees with other sheets of {shift} on "
+                  f"{len(key_check['mismatched_questions'])} question(s), "
+                  f"{len(key_check['overridden_questions'])} scored with the agreed key")
+        return ''.join(resolved), key_check
+
+
+# Process-wide index shared by all scrapers
+shift_key_index = ShiftKeyIndex(revisions=result_store.revision if result_store is not None else None)
@@ -0,0 +1,119 @@
+# Compact per-page record of an answer key: question IDs plus one-character option codes
+
+# Option codes stored in AnswerSheet.chosen / AnswerSheet.key
+SKIPPED = '-'     # candidate did not attempt ("--" on the page)
+BONUS = '*'       # no rightAns cell on the page: marks for everyone
+UNMATCHED = '?'   # chosen option that can never equal a one-character key
+UNREAD = '.'      # rightAns not read: the shift's agreed key supplies it (see ShiftKeyIndex)
+
+OUTCOMES = ('right', 'wrong', 'skipped', 'bonus')
+
+
+def encode_chosen(chosen_opt):
+    """Maps the 'Chosen Option' cell text to a one-character code."""
+    if chosen_opt == '--':
+        return SKIPPED
+    if len(chosen_opt) == 1 and chosen_opt not in (SKIPPED, BONUS, UNMATCHED, UNREAD):
+        return chosen_opt
+    return UNMATCHED
+
+
+def encode_right(right_opt):
+    """Maps the first character of the rightAns cell (or None when missing) to a code."""
+    return BONUS if right_opt is None else right_opt
+
+
+def outcome(chosen_code, right_code):
+    """Returns 'right', 'wrong', 'skipped' or 'bonus', mirroring the scrapers' rules."""
+    if right_code == BONUS:
+        return 'bonus'
+    if chosen_code == SKIPPED:
+        return 'skipped'
+    if chosen_code == right_code:
+        return 'right'
+    return 'wrong'
+
+
+class AnswerSheet:
+    """
+    Questions of one answer key page in page order.
+
+    question_ids, chosen and key are parallel: chosen[i] and key[i] are the
+    option codes for question_ids[i]. Sections are recorded as index ranges
+    together with the name and the index of the group (grp-cntnr) they sit in.
+    """
+
+    def __init__(self, question_ids=None, chosen='', key='', sections=None):
+        self.question_ids = list(question_ids or [])
+        self._chosen = list(chosen)
+        self._key = list(key)
+        self.sections = list(sections or [])
+
+    @property
+    def chosen(self):
+        return ''.join(self._chosen)
+
+    @property
+    def key(self):
+        return ''.join(self._key)
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def begin_section(self, name, group_index):
+        """Starts a new section; questions added afterwards belong to it."""
+        start = len(self.question_ids)
+        self.sections.append({'name': name, 'group': group_index, 'start': start, 'end': start})
+
+    def add_question(self, question_id, chosen_opt, right_opt):
+        """Records one question from its raw cell values."""
+        self.question_ids.append(question_id)
+        self._chosen.append(encode_chosen(chosen_opt))
+        self._key.append(encode_right(right_opt))
+        if self.sections:
+            self.sections[-1]['end'] = len(self.question_ids)
+
+    def has_unique_ids(self):
+        """True when every question ID occurs once (required for shift-level indexing)."""
+        return len(set(self.question_ids)) == len(self.question_ids)
+
+    def tally(self, section, key=None):
+        """
+        Counts outcomes for one section.
+
+        Args:
+            section (dict): An entry of self.sections.
+            key (str): Key codes to score against. Defaults to the page's own key.
+
+        Returns:
+            tuple: (right, wrong, not_attempted, bonus)
+        """
+        key = self.key if key is None else key
+        counts = dict.fromkeys(OUTCOMES, 0)
+        chosen = self.chosen
+        for i in range(section['start'], section['end']):
+            counts[outcome(chosen[i], key[i])] += 1
+        return counts['right'], counts['wrong'], counts['skipped'], counts['bonus']
+
+    def question_outcomes(self, key=None):
+        """Returns {question_id: outcome} in page order (later duplicates win, as before)."""
+        key = self.key if key is None else key
+        chosen = self.chosen
+        return {qid: outcome(chosen[i], key[i]) for i, qid in enumerate(self.question_ids)}
+
+    def to_dict(self):
+        """JSON-friendly compact form."""
+        return {
+            'question_ids': list(self.question_ids),
+            'chosen': self.chosen,
+            'key': self.key,
+            'sections': [dict(section) for section in self.sections],
+        }
+
+    def __reduce__(self):
+        # Pickled in the compact form (parse workers send sheets back this way)
+        return (AnswerSheet.from_dict, (self.to_dict(),))
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['question_ids'], data['chosen'], data['key'], data['sections'])
@@ -0,0 +1,195 @@
+# ASGI entry point for serving many slow URL submissions from one process:
+#
+#     uvicorn asgi:app --workers N
+#
+# Every request is handed to the Flask app, whose views run in a small pool
+# of ASGI_THREADS threads. For a POST of an answer key URL to a scoring route
+# the page is first fetched on the event loop (async_fetch.py); the view then
+# finds it already fetched and only parses and scores it. A submission that
+# waits on a slow proxy or answer key host holds a socket, not a thread.
+import io
+import os
+import sys
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import Request
+
+from wsgi import app as flask_app
+from parse_pool import parse_pool
+from fetch_pipeline import prefetched_pages
+from rate_limit import CHECKED_ENVIRON_KEY, check_rate, rate_limiter
+from preflight import InvalidSubmission, check_url
+from async_fetch import close_http_client, prefetch_page
+
+# --- Configuration (environment overrides) ---
+# Threads running Flask views (parsing, scoring, rendering, uploads)
+ASGI_THREADS = int(os.environ.get('MARKSKING_ASGI_THREADS', '16'))
+# Larger bodies are file uploads: nothing to fetch, so not inspected on the event loop
+PREFETCH_MAX_BODY = 64 * 1024
+
+# Scoring views whose URL submissions are fetched on the event loop
+SCORING_ENDPOINTS = {
+    'main.calculate_mts_score': 'mts',
+    'main.calculate_je_score': 'je',
+    'main.calculate_chsl_score': 'chsl',
+}
+
+_views = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix='asgi-view')
+
+
+async def _read_body(receive, limit):
+    """The request body, stopping once it exceeds `limit` (Flask then answers 413). None if the client left."""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunk = message.get('body', b'')
+        chunks.append(chunk)
+        size += len(chunk)
+        if not message.get('more_body') or (limit is not None and size > limit):
+            return b''.join(chunks)
+
+
+def _environ(scope, body):
+    """PEP 3333 environ for an ASGI HTTP scope and its (buffered) body."""
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        key = name.decode('latin-1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = 'HTTP_' + key
+        value = value.decode('latin-1')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _scoring_exam(environ):
+    """The exam of a POST to a scoring route, else None."""
+    if environ['REQUEST_METHOD'] != 'POST':
+        return None
+    try:
+        endpoint, _ = flask_app.url_map.bind_to_environ(environ).match(method='POST')
+    except HTTPException:
+        return None
+    return SCORING_ENDPOINTS.get(endpoint)
+
+
+async def _prefetch(exam, environ, body, context):
+    """
+    Fetches the page of a URL submission before its view runs. The client's
+    'url' budget is spent here (and marked as spent for the view), so a
+    rate-limited client triggers no fetch.
+    """
+    if len(body) > PREFETCH_MAX_BODY:
+        return
+    request = Request(dict(environ, **{'wsgi.input': io.BytesIO(body)}))
+    url = request.form.get('ans_key_url')
+    if not url:
+        return
+    try:
+        check_url(url)
+    except InvalidSubmission:
+        # Nothing to fetch: the view rejects it
+        return
+    if rate_limiter.name == 'memory':
+        decision = check_rate(request, 'url')
+    else:
+        decision = await asyncio.to_thread(check_rate, request, 'url')
+    if not decision:
+        # The view answers 429 (a refused check spends nothing)
+        return
+    environ[CHECKED_ENVIRON_KEY] = 'url'
+    prefetched = await prefetch_page(exam, url)
+    if prefetched is not None:
+        context.run(prefetched_pages.set, {url: prefetched})
+
+
+def _run_view(environ, loop, send):
+    """Runs the Flask app for one request in a view thread, streaming its response back to the loop."""
+    def blocking_send(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+        return write
+
+    def write(data):
+        if not response.get('started'):
+            blocking_send({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+            response['started'] = True
+        if data:
+            blocking_send({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+    body = flask_app(environ, start_response)
+    try:
+        for chunk in body:
+            write(chunk)
+        write(b'')
+        blocking_send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Start the parse workers before the first request
+            await asyncio.to_thread(parse_pool.warm)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_http_client()
+            await asyncio.to_thread(parse_pool.shutdown)
+            _views.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    body = await _read_body(receive, flask_app.config.get('MAX_CONTENT_LENGTH'))
+    if body is None:
+        return
+    environ = _environ(scope, body)
+    context = contextvars.copy_context()
+    exam = _scoring_exam(environ)
+    if exam is not None:
+        await _prefetch(exam, environ, body, context)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_views, context.run, _run_view, environ, loop, send)
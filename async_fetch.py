@@ -0,0 +1,194 @@
+import time
+import asyncio
+from collections import OrderedDict
+
+import fetch_pipeline
+from fetch_pipeline import FetchError, Prefetched
+from cache_backends import cache, get_page, get_result, set_page
+from admission import ASYNC_MAX_OUTBOUND, Saturated, async_admission, async_backend_limits
+from memory_budget import PageTooLarge, check_page_size
+from proxy_only import (ALLORIGINS_RAW_URL, ALLORIGINS_URL, CORS_ANYWHERE_HEADERS, CORS_ANYWHERE_URL, JSONPROXY_URL,
+                        PROXY_TIMEOUT, STREAM_CHUNK, THINGPROXY_URL, EnvelopeDecoder, PageReader, proxy_url)
+
+# Try to import the async HTTP client (needed for fetches on the event loop)
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+
+# --- Proxy strategies (async twins of proxy_only's, same names) ---
+
+async def proxy_get(client, template, url, headers=None):
+    async with client.stream('GET', proxy_url(template, url), headers=headers) as response:
+        if response.status_code != 200:
+            return None
+        reader = PageReader(response.headers)
+        async for chunk in response.aiter_bytes(STREAM_CHUNK):
+            reader.feed(chunk)
+        return reader.text()
+
+
+async def _get_envelope(client, url):
+    async with client.stream('GET', proxy_url(ALLORIGINS_URL, url)) as response:
+        if response.status_code == 200:
+            decoder = EnvelopeDecoder()
+            async for chunk in response.aiter_bytes(STREAM_CHUNK):
+                if decoder.feed(chunk):
+                    break
+            return decoder.contents()
+    return None
+
+
+async def fetch_allorigins(client, url, timeout=PROXY_TIMEOUT):
+    # Same rules as proxy_only.fetch_allorigins(): one timeout for both
+    # attempts, and only transport or HTTP failures of /raw fall through
+    deadline = time.monotonic() + timeout
+    try:
+        content = await asyncio.wait_for(proxy_get(client, ALLORIGINS_RAW_URL, url), timeout)
+    except (httpx.HTTPError, asyncio.TimeoutError):
+        content = None
+    if content:
+        return content
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise asyncio.TimeoutError(f"AllOrigins did not answer within {timeout}s")
+    return await asyncio.wait_for(_get_envelope(client, url), remaining)
+
+
+async def fetch_thingproxy(client, url):
+    return await proxy_get(client, THINGPROXY_URL, url)
+
+
+async def fetch_jsonproxy(client, url):
+    return await proxy_get(client, JSONPROXY_URL, url)
+
+
+async def fetch_cors_anywhere(client, url):
+    return await proxy_get(client, CORS_ANYWHERE_URL, url, headers=CORS_ANYWHERE_HEADERS)
+
+
+ASYNC_PROXY_STRATEGIES = (
+    ('allorigins', fetch_allorigins),
+    ('thingproxy', fetch_thingproxy),
+    ('jsonproxy', fetch_jsonproxy),
+    ('cors_anywhere', fetch_cors_anywhere),
+)
+
+
+class AsyncFetchPipeline:
+    """
+    FetchPipeline for an event loop. Strategies are coroutine functions taking
+    (client, url); the order, run-once-per-name rule, busy-backend skipping
+    and attempt records are the same as FetchPipeline's.
+    """
+
+    def __init__(self, client, strategies=ASYNC_PROXY_STRATEGIES):
+        self.client = client
+        self.strategies = list(strategies)
+        self.attempts = OrderedDict()
+
+    async def fetch(self, url):
+        """
+        Runs the strategies not yet attempted, in order, until one returns content.
+
+        Returns:
+            str: The page content.
+
+        Raises:
+            FetchError: If every strategy has failed.
+            PageTooLarge: If a strategy found the page above the size budget.
+        """
+        for name, function in self.strategies:
+            if name in self.attempts:
+                continue
+            if not async_backend_limits.try_acquire(name):
+                self.attempts[name] = {'ok': False, 'ms': 0.0, 'detail': 'backend busy'}
+                continue
+            started = time.perf_counter()
+            detail = error = None
+            try:
+                content = await function(self.client, url)
+            except Exception as e:
+                content, detail, error = None, str(e) or type(e).__name__, e
+            finally:
+                async_backend_limits.release(name)
+            ok = bool(content)
+            self.attempts[name] = {'ok': ok, 'ms': round((time.perf_counter() - started) * 1000, 1), 'detail': detail}
+            if ok:
+                return content
+            if isinstance(error, PageTooLarge):
+                raise error
+        raise FetchError(f"Unable to fetch {url} (tried: {', '.join(self.attempts) or 'nothing'})")
+
+
+_client = None
+_inflight = {}
+
+
+def http_client():
+    """The process's shared async HTTP client (connection pool), created on first use."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=PROXY_TIMEOUT, follow_redirects=True,
+                                    limits=httpx.Limits(max_connections=ASYNC_MAX_OUTBOUND))
+    return _client
+
+
+async def close_http_client():
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+async def _off_loop(function, *args):
+    """Runs a cache call in a thread unless the cache lives in this process's memory."""
+    if cache.name == 'memory':
+        return function(*args)
+    return await asyncio.to_thread(function, *args)
+
+
+async def _fetch(url):
+    started = time.perf_counter()
+    html_content = await _off_loop(get_page, url)
+    if html_content is not None:
+        return Prefetched(html_content, attempts={'cache': {'ok': True, 'ms': (time.perf_counter() - started) * 1000,
+                                                            'detail': None}})
+
+    pipeline = AsyncFetchPipeline(http_client(), ASYNC_PROXY_STRATEGIES)
+    try:
+        async with async_admission.admit(url):
+            html_content = await pipeline.fetch(url)
+        check_page_size(len(html_content))
+    except FetchError as e:
+        print(f"Error fetching URL: {e}")
+        return Prefetched(attempts=pipeline.attempts)
+    except (Saturated, PageTooLarge) as e:
+        return Prefetched(error=e, attempts=pipeline.attempts)
+    await _off_loop(set_page, url, html_content)
+    return Prefetched(html_content, attempts=pipeline.attempts)
+
+
+async def prefetch_page(exam, url):
+    """
+    Fetches the answer key page of a URL submission on the event loop, ahead
+    of the (threaded) view, so a slow proxy or host holds no thread. Identical
+    URLs in flight share one fetch.
+
+    Returns:
+        Prefetched: The outcome for fetch_pipeline.prefetched_pages, or None
+                    when the view needs no fetch (result already cached) or
+                    must fetch itself (no httpx, or the proxy strategies are
+                    off and the threaded fallbacks apply).
+    """
+    if not (HTTPX_AVAILABLE and fetch_pipeline.PROXY_ONLY_AVAILABLE):
+        return None
+    if await _off_loop(get_result, exam, url) is not None:
+        return None
+    task = _inflight.get(url)
+    if task is None:
+        task = _inflight[url] = asyncio.ensure_future(_fetch(url))
+        task.add_done_callback(lambda _: _inflight.pop(url, None))
+    return await asyncio.shield(task)
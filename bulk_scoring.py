@@ -0,0 +1,180 @@
+import os
+import io
+import csv
+import json
+import time
+import queue
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+from preflight import InvalidSubmission, check_url
+
+# --- Configuration (environment overrides) ---
+BULK_MAX_ROWS = int(os.environ.get('MARKSKING_BULK_MAX_ROWS', '500'))
+BULK_CONCURRENCY = int(os.environ.get('MARKSKING_BULK_CONCURRENCY', '16'))
+BULK_PER_HOST = int(os.environ.get('MARKSKING_BULK_PER_HOST', '4'))
+
+# Seconds between keep-alive comments while no row has finished
+HEARTBEAT_SECONDS = 15
+
+# Accepted exam names (route names and their short forms)
+EXAM_ALIASES = {'mts': 'mts', 'je': 'je', 'ssc-je': 'je', 'chsl': 'chsl'}
+
+# Process-wide limits shared by all running bulk jobs
+_global_slots = threading.BoundedSemaphore(BULK_CONCURRENCY)
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+
+class BulkInputError(ValueError):
+    """Raised for malformed bulk input (reported to the client as HTTP 400)."""
+
+
+def parse_rows(json_data=None, csv_text=None, default_exam=None):
+    """
+    Reads bulk input into [{'row', 'exam', 'url'}].
+
+    Accepts JSON ({"rows": [...]} or a bare list of {"exam", "url"} objects or
+    URL strings) or CSV text with an exam,url header (or url only, with
+    default_exam). Rows are numbered from 1 in input order.
+    """
+    entries = []
+    if json_data is not None:
+        items = json_data.get('rows') if isinstance(json_data, dict) else json_data
+        default_exam = (json_data.get('exam') if isinstance(json_data, dict) else None) or default_exam
+        if not isinstance(items, list):
+            raise BulkInputError("JSON input must be a list of rows or {\"rows\": [...]}")
+        for item in items:
+            if isinstance(item, str):
+                entries.append((default_exam, item))
+            elif isinstance(item, dict):
+                entries.append((item.get('exam') or default_exam, item.get('url')))
+            else:
+                raise BulkInputError("Each row must be a URL or an object with 'exam' and 'url'")
+    elif csv_text is not None:
+        reader = csv.reader(io.StringIO(csv_text))
+        lines = [line for line in reader if any(cell.strip() for cell in line)]
+        header = [cell.strip().lower() for cell in lines[0]] if lines else []
+        if 'url' in header:
+            url_index = header.index('url')
+            exam_index = header.index('exam') if 'exam' in header else None
+            lines = lines[1:]
+        else:
+            url_index, exam_index = (1, 0) if lines and len(lines[0]) > 1 else (0, None)
+        for line in lines:
+            exam = line[exam_index] if exam_index is not None and exam_index < len(line) else default_exam
+            entries.append((exam, line[url_index] if url_index < len(line) else ''))
+    else:
+        raise BulkInputError("Provide a JSON body or a CSV file/text of URLs")
+
+    if not entries:
+        raise BulkInputError("No rows found")
+    if len(entries) > BULK_MAX_ROWS:
+        raise BulkInputError(f"At most {BULK_MAX_ROWS} rows per request")
+
+    rows = []
+    for number, (exam, url) in enumerate(entries, start=1):
+        exam = EXAM_ALIASES.get(str(exam or '').strip().lower())
+        url = str(url or '').strip()
+        if exam is None:
+            raise BulkInputError(f"Row {number}: exam must be one of mts, je, chsl")
+        try:
+            check_url(url)
+        except InvalidSubmission as e:
+            raise BulkInputError(f"Row {number}: {e}")
+        rows.append({'row': number, 'exam': exam, 'url': url})
+    return rows
+
+
+def _host_semaphore(url):
+    host = urlparse(url).hostname or ''
+    with _host_slots_lock:
+        semaphore = _host_slots.get(host)
+        if semaphore is None:
+            semaphore = _host_slots[host] = threading.BoundedSemaphore(BULK_PER_HOST)
+        return semaphore
+
+
+def summarise(row, result, error=None, elapsed_ms=0.0):
+    """The per-row payload streamed to the client (no question-level data)."""
+    payload = {'row': row['row'], 'exam': row['exam'], 'url': row['url'], 'ok': bool(result),
+               'ms': round(elapsed_ms, 1)}
+    if result:
+        candidate_info = result.get('candidate_info') or {}
+        payload.update({
+            'roll_no': candidate_info.get('roll_no'),
+            'cand_name': candidate_info.get('cand_name'),
+            'exam_date': candidate_info.get('exam_date'),
+            'exam_time': candidate_info.get('exam_time'),
+            'total_marks': result['exam_summary']['total_marks'],
+            'sections': [
+                {'name': section.get('section_name'), 'marks': section.get('marks_in_section')}
+                for section in result.get('section_details') or []
+            ],
+        })
+        if result.get('standing'):
+            payload['standing'] = result['standing']
+    else:
+        payload['error'] = error or 'Could not process this answer key'
+    return payload
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_bulk_scoring(rows, score_row):
+    """
+    Scores rows concurrently and yields Server-Sent Events as rows finish.
+
+    Args:
+        rows (list): Output of parse_rows().
+        score_row (callable): (exam, url) -> result dict or None.
+
+    Yields:
+        str: 'row' events (see summarise()), a 'progress' event after each row,
+             keep-alive comments while waiting, and a final 'done' event.
+    """
+    finished = queue.Queue()
+    cancelled = threading.Event()
+
+    def work(row):
+        if cancelled.is_set():
+            return
+        started = time.perf_counter()
+        result, error = None, None
+        # Host slot first: a row waiting on a busy host holds no global slot
+        with _host_semaphore(row['url']), _global_slots:
+            if cancelled.is_set():
+                return
+            try:
+                result = score_row(row['exam'], row['url'])
+            except Exception as e:
+                error = str(e)
+        finished.put(summarise(row, result, error, (time.perf_counter() - started) * 1000))
+
+    executor = ThreadPoolExecutor(max_workers=min(BULK_CONCURRENCY, len(rows)), thread_name_prefix='bulk')
+    started = time.perf_counter()
+    done = succeeded = 0
+    try:
+        for row in rows:
+            executor.submit(work, row)
+        yield _event('start', {'total': len(rows)})
+        while done < len(rows):
+            try:
+                payload = finished.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            done += 1
+            succeeded += payload['ok']
+            yield _event('row', payload)
+            yield _event('progress', {'done': done, 'total': len(rows), 'ok': succeeded, 'failed': done - succeeded,
+                                      'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)})
+        yield _event('done', {'total': len(rows), 'ok': succeeded, 'failed': done - succeeded,
+                              'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)})
+    finally:
+        # Client went away (or finished): skip rows that have not started yet
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -5,6 +5,17 @@ import random
 from urllib.parse import urljoin, urlparse
 import base64
 
+from request_capture import note_fetch
+from proxy_only import fetch_allorigins
+
+class TextResponse:
+    """Stands in for a response when a method gets the page some other way (e.g. unwrapped from a proxy envelope)."""
+
+    status_code = 200
+
+    def __init__(self, text):
+        self.text = text
+
 class SSCBypassManager:
     """
     Advanced request manager to bypass SSC website restrictions.
@@ -78,50 +89,55 @@ class SSCBypassManager:
             print(f"Browser navigation simulation failed: {e}")
             return None
     
+    def proxy_methods(self):
+        """Proxy and cache methods as (strategy name, method) pairs, in order of preference."""
+        return [
+            ('allorigins', self.try_allorigins_proxy),
+            ('cors_anywhere', self.try_cors_anywhere_proxy),
+            ('thingproxy', self.try_thingproxy),
+            ('archive_org', self.try_archive_org),
+            ('google_cache', self.try_google_cache)
+        ]
+
+    def fetch_strategies(self, max_retries=3):
+        """
+        All methods as fetch pipeline strategies (name, url -> text or None):
+        proxies first (most reliable for SSC), then direct browser simulation,
+        then direct requests with user agent rotation.
+        """
+        strategies = [(name, _response_text(method)) for name, method in self.proxy_methods()]
+        strategies.append(('browser_navigation', _response_text(self.simulate_browser_navigation)))
+        strategies.append(('user_agent_rotation', lambda url: self.fetch_with_user_agent_rotation(url, max_retries)))
+        return strategies
+
     def try_proxy_methods(self, url):
         """
         Try alternative methods to access the content
         """
-        methods = [
-            self.try_allorigins_proxy,
-            self.try_cors_anywhere_proxy,
-            self.try_thingproxy,
-            self.try_archive_org,
-            self.try_google_cache
-        ]
-        
-        for method in methods:
+        for name, method in self.proxy_methods():
+            started = time.perf_counter()
             try:
-                print(f"🔄 Trying {method.__name__}...")
+                print(f"🔄 Trying {name}...")
                 result = method(url)
                 if result and result.status_code == 200:
-                    print(f"✅ Success with {method.__name__}")
+                    print(f"✅ Success with {name}")
+                    note_fetch(name, True, (time.perf_counter() - started) * 1000)
                     return result
                 else:
-                    print(f"❌ Failed with {method.__name__}")
+                    print(f"❌ Failed with {name}")
+                    note_fetch(name, False, (time.perf_counter() - started) * 1000)
             except Exception as e:
-                print(f"❌ {method.__name__} error: {e}")
+                print(f"❌ {name} error: {e}")
+                note_fetch(name, False, (time.perf_counter() - started) * 1000, str(e))
                 continue
         
         return None
     
     def try_allorigins_proxy(self, url):
-        """Try accessing through allorigins proxy"""
-        proxy_url = f"https://api.allorigins.win/get?url={url}"
+        """Try accessing through allorigins proxy (raw passthrough, else its JSON envelope decoded as it streams)"""
         try:
-            response = self.session.get(proxy_url, timeout=20)
-            if response.status_code == 200:
-                # AllOrigins returns JSON with contents field
-                import json
-                data = response.json()
-                if 'contents' in data:
-                    # Create a mock response object
-                    class MockResponse:
-                        def __init__(self, content):
-                            self.text = content
-                            self.status_code = 200
-                    return MockResponse(data['contents'])
-            return None
+            content = fetch_allorigins(url, session=self.session, timeout=20)
+            return TextResponse(content) if content else None
         except:
             return None
     
@@ -163,28 +179,17 @@ class SSCBypassManager:
     
     def fetch_with_all_methods(self, url, max_retries=3):
         """
-        Comprehensive fetching with proxy methods prioritized
+        Comprehensive fetching with proxy methods prioritized; every method runs at most once
         """
+        from fetch_pipeline import FetchPipeline
+
         print(f"🔄 Attempting to fetch: {url}")
-        
-        # Method 1: Try proxy methods first (most reliable for SSC)
-        print("🌐 Trying proxy methods first...")
-        proxy_response = self.try_proxy_methods(url)
-        if proxy_response and proxy_response.status_code == 200:
-            print("✅ Success: Proxy method")
-            return proxy_response.text
-        
-        # Method 2: Direct access with browser simulation
-        try:
-            print("🚀 Trying direct browser simulation...")
-            response = self.simulate_browser_navigation(url)
-            if response and response.status_code == 200:
-                print("✅ Success: Direct browser simulation")
-                return response.text
-        except Exception as e:
-            print(f"❌ Direct access failed: {e}")
-        
-        # Method 3: Multiple user agents with delays
+        return FetchPipeline(self.fetch_strategies(max_retries)).fetch(url)
+
+    def fetch_with_user_agent_rotation(self, url, max_retries=3):
+        """
+        Direct requests with rotating user agents and random delays
+        """
         user_agents = [
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/119.0',
             'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -214,9 +219,14 @@ class SSCBypassManager:
             except Exception as e:
                 print(f"❌ Attempt {attempt + 1} failed: {e}")
         
-        # If all methods fail
-        print("❌ All methods exhausted")
-        raise Exception(f"Unable to fetch {url} after trying all bypass methods")
+        return None
+
+def _response_text(method):
+    """Adapts a method returning a response (or None) to a fetch strategy returning text."""
+    def strategy(url):
+        response = method(url)
+        return response.text if response is not None and response.status_code == 200 else None
+    return strategy
 
 def make_advanced_request(url, max_retries=5):
     """
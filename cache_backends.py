@@ -0,0 +1,635 @@
+import os
+import json
+import time
+import zlib
+import socket
+import sqlite3
+import hashlib
+import argparse
+import tempfile
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs, unquote
+
+from lazy_result import compact_dict, scored_result
+from answer_key_index import shift_key_index
+
+# --- Configuration (environment overrides) ---
+# memory:// (default), file:///dir, sqlite:///file.db, redis://[:password@]host:port/db or none://
+CACHE_URL = os.environ.get('MARKSKING_CACHE_URL', 'memory://').strip()
+PAGE_TTL = int(os.environ.get('MARKSKING_CACHE_PAGE_TTL', '3600'))
+RESULT_TTL = int(os.environ.get('MARKSKING_CACHE_RESULT_TTL', '3600'))
+# How long a rendered result's question-wise breakdown stays available
+RECENT_TTL = int(os.environ.get('MARKSKING_CACHE_RECENT_TTL', '3600'))
+
+# Defaults for the local backends (override with ?max_bytes=... in the URL)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+MAX_VALUE_BYTES = 8 * 1024 * 1024
+
+# Local backends check their size limit every this many writes
+PRUNE_EVERY = 64
+
+
+class CacheBackend:
+    """
+    Byte-string cache with per-entry TTLs.
+
+    Backends never raise from get/set/delete for connectivity or storage
+    problems: a broken cache must behave like an empty one, never like a
+    failed request.
+    """
+
+    name = 'none'
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        return False
+
+    def delete(self, key):
+        return None
+
+    def clear(self):
+        return None
+
+
+class MemoryCache(CacheBackend):
+    """Per-process LRU bounded by total value size."""
+
+    name = 'memory'
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (expires_at or None, value)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        if len(value) > min(self.max_bytes, MAX_VALUE_BYTES):
+            return False
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (expires_at, value)
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+        return True
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class FileSystemCache(CacheBackend):
+    """
+    One file per key in a shared directory (e.g. a mounted volume).
+
+    Files hold the expiry time on the first line and the value after it, and
+    are written to a temporary name first so readers never see partial files.
+    """
+
+    name = 'file'
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.cache')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at = float(f.readline() or 0)
+                if expires_at and expires_at <= time.time():
+                    return None
+                return f.read()
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, value, ttl=None):
+        if len(value) > min(self.max_bytes, MAX_VALUE_BYTES):
+            return False
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(f"{time.time() + ttl if ttl else 0}\n".encode('ascii'))
+                f.write(value)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error writing file cache entry: {e}")
+            return False
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self.prune()
+        return True
+
+    def prune(self):
+        """Removes expired entries, then the least recently written until under max_bytes."""
+        entries, total, now = [], 0, time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.cache'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+                with open(path, 'rb') as f:
+                    expires_at = float(f.readline() or 0)
+            except (OSError, ValueError):
+                continue
+            if expires_at and expires_at <= now:
+                self._remove(path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def delete(self, key):
+        self._remove(self._path(key))
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.cache'):
+                self._remove(os.path.join(self.directory, name))
+
+
+class SQLiteCache(CacheBackend):
+    """Single-file cache shared by all workers on a host (WAL journaling)."""
+
+    name = 'sqlite'
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._forget_connections)
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "size INTEGER NOT NULL, expires_at REAL, stored_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS cache_stored_at ON cache (stored_at)")
+
+    def _forget_connections(self):
+        # SQLite connections must not be used across a fork
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading SQLite cache: {e}")
+            return None
+        return bytes(row[0]) if row else None
+
+    def set(self, key, value, ttl=None):
+        if len(value) > min(self.max_bytes, MAX_VALUE_BYTES):
+            return False
+        now = time.time()
+        try:
+            with self._connection() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, size, expires_at, stored_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, sqlite3.Binary(value), len(value), now + ttl if ttl else None, now),
+                )
+        except sqlite3.Error as e:
+            print(f"Error writing SQLite cache: {e}")
+            return False
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self.prune()
+        return True
+
+    def prune(self):
+        """Removes expired entries, then the oldest until under max_bytes."""
+        try:
+            with self._connection() as connection:
+                connection.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+                total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+                for stored_at, size in connection.execute("SELECT stored_at, size FROM cache ORDER BY stored_at").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    connection.execute("DELETE FROM cache WHERE stored_at <= ?", (stored_at,))
+                    total -= size
+        except sqlite3.Error as e:
+            print(f"Error pruning SQLite cache: {e}")
+
+    def delete(self, key):
+        try:
+            with self._connection() as connection:
+                connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM cache")
+
+
+class RedisCache(CacheBackend):
+    """
+    Minimal Redis client (RESP over a socket, one connection per thread).
+
+    Only GET, SET with PX, DEL and PING are used, so any Redis-protocol server
+    works (Redis, Valkey, KeyDB, or the stand-in in this module's self-test).
+    Size limits are the server's (maxmemory); values above MAX_VALUE_BYTES are
+    not sent.
+    """
+
+    name = 'redis'
+
+    def __init__(self, host='localhost', port=6379, db=0, password=None, prefix='marksking:', timeout=2.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.prefix = prefix
+        self.timeout = timeout
+        self._local = threading.local()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._forget_connections)
+
+    def _forget_connections(self):
+        # A forked worker opens its own socket; sharing the parent's would interleave replies
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock = sock
+        self._local.reader = sock.makefile('rb')
+        if self.password:
+            self._send('AUTH', self.password)
+        if self.db:
+            self._send('SELECT', str(self.db))
+
+    def _send(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        self._local.sock.sendall(b''.join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by Redis server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            raise RuntimeError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            return [self._read_reply() for _ in range(int(payload))]
+        raise RuntimeError(f"Unexpected Redis reply: {line!r}")
+
+    def command(self, *args):
+        """Sends one command, reconnecting once if the connection dropped."""
+        for attempt in range(2):
+            try:
+                if getattr(self._local, 'sock', None) is None:
+                    self._connect()
+                return self._send(*args)
+            except (OSError, ConnectionError):
+                self._close()
+                if attempt:
+                    raise
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def get(self, key):
+        try:
+            return self.command('GET', self.prefix + key)
+        except Exception as e:
+            print(f"Error reading Redis cache: {e}")
+            return None
+
+    def set(self, key, value, ttl=None):
+        if len(value) > MAX_VALUE_BYTES:
+            return False
+        try:
+            if ttl:
+                self.command('SET', self.prefix + key, value, 'PX', int(ttl * 1000))
+            else:
+                self.command('SET', self.prefix + key, value)
+            return True
+        except Exception as e:
+            print(f"Error writing Redis cache: {e}")
+            return False
+
+    def delete(self, key):
+        try:
+            self.command('DEL', self.prefix + key)
+        except Exception:
+            pass
+
+    def clear(self):
+        """Deletes this cache's keys (prefix scan, for tests and maintenance)."""
+        cursor = '0'
+        while True:
+            cursor, keys = self.command('SCAN', cursor, 'MATCH', self.prefix + '*', 'COUNT', '500')
+            cursor = cursor.decode() if isinstance(cursor, bytes) else cursor
+            if keys:
+                self.command('DEL', *keys)
+            if cursor == '0':
+                break
+
+
+def cache_from_url(url):
+    """
+    Builds a backend from a cache URL: memory://, file:///dir, sqlite:///file.db,
+    redis://[:password@]host[:port][/db] or none://. Local backends accept
+    ?max_bytes=N.
+    """
+    parsed = urlparse(url or 'none://')
+    options = {name: values[-1] for name, values in parse_qs(parsed.query).items()}
+    max_bytes = int(options.get('max_bytes', DEFAULT_MAX_BYTES))
+    if parsed.scheme == 'memory':
+        return MemoryCache(max_bytes)
+    if parsed.scheme == 'file':
+        return FileSystemCache(unquote(parsed.path), max_bytes)
+    if parsed.scheme == 'sqlite':
+        return SQLiteCache(unquote(parsed.path), max_bytes)
+    if parsed.scheme == 'redis':
+        db = int(parsed.path.strip('/') or 0)
+        return RedisCache(parsed.hostname or 'localhost', parsed.port or 6379, db,
+                          unquote(parsed.password) if parsed.password else None)
+    if parsed.scheme in ('none', ''):
+        return CacheBackend()
+    raise ValueError(f"Unsupported cache URL scheme '{parsed.scheme}'")
+
+
+try:
+    cache = cache_from_url(CACHE_URL)
+    print(f"✓ Cache backend: {cache.name}")
+except Exception as e:
+    print(f"⚠️ Cache disabled ({CACHE_URL}): {e}")
+    cache = CacheBackend()
+
+
+# --- Serialisation of cached pages and results ---
+
+def _digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def get_page(url):
+    """Cached page content for a fetched URL, or None."""
+    value = cache.get('page:' + _digest(url))
+    if value is None:
+        return None
+    try:
+        return zlib.decompress(value).decode('utf-8')
+    except (zlib.error, UnicodeDecodeError):
+        return None
+
+
+def set_page(url, html_content):
+    return cache.set('page:' + _digest(url), zlib.compress(html_content.encode('utf-8'), 6), PAGE_TTL)
+
+
+def get_result(exam, url):
+    """
+    Cached scraper result for an exam and source URL, or None. Results cached
+    before a key revision of their shift was published count as missing.
+    """
+    value = cache.get(f'result:{exam}:' + _digest(url))
+    if value is None:
+        return None
+    try:
+        data = json.loads(zlib.decompress(value))
+        result, cached_at = data['result'], data['cached_at']
+    except (zlib.error, ValueError, KeyError, TypeError):
+        return None
+    if shift_key_index.revised_after(exam, result.get('candidate_info'), cached_at):
+        return None
+    return scored_result(result)
+
+
+def set_result(exam, url, result):
+    # Entries derivable from the answer sheet are not stored (see lazy_result)
+    data = {'cached_at': time.time(), 'result': compact_dict(result)}
+    payload = json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return cache.set(f'result:{exam}:' + _digest(url), zlib.compress(payload, 6), RESULT_TTL)
+
+
+# Entries of a rendered result that its question-wise breakdown is built from
+BREAKDOWN_KEYS = ('answer_sheet', 'scoring_key', 'question_wise_data')
+
+
+def remember_result(token, exam, result):
+    """
+    Keeps what the question-wise breakdown of a rendered result needs under
+    its page token, so whichever worker the breakdown request reaches can
+    serve it (shared backends; memory:// stays per process).
+    """
+    data = compact_dict(result)
+    entry = {key: data[key] for key in BREAKDOWN_KEYS if key in data}
+    if 'answer_sheet' in entry:
+        # Derived again from the answer sheet (see lazy_result)
+        entry.pop('question_wise_data', None)
+    payload = json.dumps({'exam': exam, 'result': entry}, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return cache.set('recent:' + token, zlib.compress(payload, 6), RECENT_TTL)
+
+
+def recall_result(token):
+    """(exam, result) remembered for a results page token, or None."""
+    value = cache.get('recent:' + token)
+    if value is None:
+        return None
+    try:
+        data = json.loads(zlib.decompress(value))
+        return data['exam'], scored_result(data['result'])
+    except (zlib.error, ValueError, KeyError, TypeError):
+        return None
+
+
+def cached_result(exam, url, compute):
+    """
+    Returns the cached result for (exam, url), or computes, caches and returns it.
+    Failed computations (None) are not cached.
+    """
+    result = get_result(exam, url)
+    if result is not None:
+        print(f"⚡ Using cached {exam.upper()} result")
+        return result
+    result = compute()
+    if result:
+        set_result(exam, url, result)
+    return result
+
+
+# --- Self-test against a local Redis-protocol stand-in ---
+
+class _StandInRedisServer:
+    """Tiny in-process RESP server (GET/SET [PX|EX]/DEL/PING/SELECT/AUTH/SCAN) for tests."""
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(16)
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            conn, _ = self.listener.accept()
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    @staticmethod
+    def _bulk(value):
+        return b"$-1\r\n" if value is None else f"${len(value)}\r\n".encode() + value + b"\r\n"
+
+    def _serve(self, conn):
+        reader = conn.makefile('rb')
+        while True:
+            line = reader.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:-2])):
+                length = int(reader.readline()[1:-2])
+                args.append(reader.read(length + 2)[:-2])
+            command = args[0].upper()
+            with self.lock:
+                if command == b'GET':
+                    entry = self.data.get(args[1])
+                    if entry and entry[0] and entry[0] <= time.time():
+                        del self.data[args[1]]
+                        entry = None
+                    reply = self._bulk(entry[1] if entry else None)
+                elif command == b'SET':
+                    expires_at = None
+                    if len(args) > 3:
+                        unit = 1000 if args[3].upper() == b'PX' else 1
+                        expires_at = time.time() + int(args[4]) / unit
+                    self.data[args[1]] = (expires_at, args[2])
+                    reply = b"+OK\r\n"
+                elif command == b'DEL':
+                    reply = f":{sum(1 for key in args[1:] if self.data.pop(key, None))}\r\n".encode()
+                elif command == b'SCAN':
+                    prefix = args[3].rstrip(b'*')
+                    keys = [key for key in self.data if key.startswith(prefix)]
+                    reply = b"*2\r\n" + self._bulk(b'0') + f"*{len(keys)}\r\n".encode() + b''.join(map(self._bulk, keys))
+                elif command in (b'PING', b'SELECT', b'AUTH'):
+                    reply = b"+OK\r\n"
+                else:
+                    reply = b"-ERR unknown command\r\n"
+            conn.sendall(reply)
+
+
+def _check_backend(backend):
+    """Round trip, overwrite, TTL expiry, delete and large-value checks for one backend."""
+    backend.clear()
+    assert backend.get('missing') is None
+    assert backend.set('a', b'\x00first')
+    assert backend.get('a') == b'\x00first'
+    backend.set('a', b'second')
+    assert backend.get('a') == b'second'
+    backend.set('short', b'x', ttl=0.2)
+    assert backend.get('short') == b'x'
+    time.sleep(0.3)
+    assert backend.get('short') is None
+    backend.delete('a')
+    assert backend.get('a') is None
+    assert not backend.set('huge', b'x' * (MAX_VALUE_BYTES + 1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Self-test the cache backends (Redis against a local stand-in).")
+    parser.add_argument("--redis-url", help="Also test a real Redis-protocol server, e.g. redis://localhost:6379/15.")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    stand_in = _StandInRedisServer()
+    backends = [
+        MemoryCache(),
+        FileSystemCache(os.path.join(workdir, 'files')),
+        SQLiteCache(os.path.join(workdir, 'cache.sqlite3')),
+        RedisCache('127.0.0.1', stand_in.port),
+    ]
+    if args.redis_url:
+        backends.append(cache_from_url(args.redis_url))
+    for backend in backends:
+        _check_backend(backend)
+        print(f"✓ {backend.name} backend OK")
+
+    # Size limits of the local backends
+    memory = MemoryCache(max_bytes=1000)
+    for i in range(20):
+        memory.set(f'k{i}', b'x' * 100)
+    assert memory.get('k0') is None and memory.get('k19') == b'x' * 100
+    sqlite_cache = SQLiteCache(os.path.join(workdir, 'small.sqlite3'), max_bytes=1000)
+    for i in range(PRUNE_EVERY):
+        sqlite_cache.set(f'k{i}', b'x' * 100)
+    assert sqlite_cache.get('k0') is None and sqlite_cache.get(f'k{PRUNE_EVERY - 1}') == b'x' * 100
+    print("✓ size limits OK")
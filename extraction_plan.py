@@ -0,0 +1,196 @@
+import threading
+from collections import OrderedDict
+
+from answer_sheet import UNREAD, AnswerSheet
+
+# How many compiled plans to keep (one per scraper profile and page layout)
+MAX_CACHED_PLANS = 128
+
+# Fixed-position candidate table: value cells follow their label cells
+INDEXED_INFO_CELLS = (
+    ('roll_no', 1),
+    ('cand_name', 3),
+    ('venue_name', 5),
+    ('exam_date', 7),
+    ('exam_time', 9),
+    ('subject', 11),
+)
+
+
+class LayoutProfile:
+    """
+    A scraper's conventions for reading TCS-format pages.
+
+    Args:
+        name (str): Profile name, part of the plan cache key.
+        info_mode (str): 'indexed' (cells[1], [3], ...), 'labelled' (label/value rows)
+                         or 'auto' (indexed when the table has >= 12 cells).
+        info_labels (tuple): (substring, field) pairs tried in order for labelled rows.
+        info_row_cells (int): Exact cell count of a labelled row, or None for ">= 2".
+        section_label (tuple): (tag, class) of the section name element.
+        skip_short_ids (bool): Use the second bold cell as question ID when the
+                               first one is shorter than 5 characters.
+    """
+
+    def __init__(self, name, info_mode, info_labels=(), info_row_cells=None,
+                 section_label=('span', 'section-lbl-text'), skip_short_ids=True):
+        self.name = name
+        self.info_mode = info_mode
+        self.info_labels = info_labels
+        self.info_row_cells = info_row_cells
+        self.section_label = section_label
+        self.skip_short_ids = skip_short_ids
+
+
+class ExtractionPlan:
+    """Exact cell positions and selectors for one page layout, compiled once."""
+
+    def __init__(self, fingerprint, info_cells, info_rows, section_label, question_id_cell):
+        self.fingerprint = fingerprint
+        self.info_cells = info_cells          # ((field, cell index), ...) or None
+        self.info_rows = info_rows            # ((row index, field), ...) or None
+        self.section_label = section_label    # (tag, class) or None when absent on the page
+        self.question_id_cell = question_id_cell
+
+    def candidate_info(self, soup):
+        """Reads the candidate details straight from the compiled positions."""
+        info_table = soup.find('table')
+        candidate_info = {}
+        if self.info_cells is not None:
+            cells = info_table.find_all('td')
+            for field, index in self.info_cells:
+                candidate_info[field] = cells[index].text.strip()
+        elif self.info_rows:
+            rows = info_table.find_all('tr')
+            for index, field in self.info_rows:
+                candidate_info[field] = rows[index].find_all('td')[1].text.strip()
+        return candidate_info
+
+    def extract_sheet(self, wrapper, unknown_section="Unknown Section", read_key=True):
+        """
+        Walks groups, sections and question panels into an AnswerSheet. Without
+        read_key the rightAns cells are not looked up and every key code is UNREAD.
+        """
+        sheet = AnswerSheet()
+        label_tag, label_class = self.section_label or (None, None)
+        question_id_cell = self.question_id_cell
+
+        for group_index, group in enumerate(wrapper.find_all('div', class_='grp-cntnr')):
+            for section in group.find_all('div', class_='section-cntnr'):
+                section_name = unknown_section
+                if label_tag:
+                    section_name_element = section.find(label_tag, class_=label_class)
+                    if section_name_element:
+                        section_name = section_name_element.text.strip()
+                sheet.begin_section(section_name, group_index)
+
+                for question in section.find_all('div', class_='question-pnl'):
+                    bold_elements = question.find('table', class_='menu-tbl').find_all('td', class_='bold')
+                    right_opt = UNREAD
+                    if read_key:
+                        right_ans_element = question.find('td', class_='rightAns')
+                        right_opt = right_ans_element.text.strip()[0] if right_ans_element else None
+                    sheet.add_question(
+                        bold_elements[question_id_cell].text.strip(),
+                        bold_elements[-1].text.strip(),
+                        right_opt,
+                    )
+        return sheet
+
+
+def _info_labels(info_table, profile):
+    """Returns the lower-cased label cell of every qualifying row, None for other rows."""
+    labels = []
+    for row in info_table.find_all('tr'):
+        cells = row.find_all('td')
+        if (len(cells) == profile.info_row_cells) if profile.info_row_cells else (len(cells) >= 2):
+            labels.append(cells[0].text.lower().strip())
+        else:
+            labels.append(None)
+    return tuple(labels)
+
+
+def fingerprint_layout(soup, wrapper, profile):
+    """
+    Cheap structural signature of a page: candidate table shape (and row labels
+    when the profile reads them), whether the profile's section label exists,
+    and the shape of the first question's menu-tbl.
+    """
+    info_table = soup.find('table')
+    info_cell_count = len(info_table.find_all('td')) if info_table else 0
+    use_indexed = profile.info_mode == 'indexed' or (profile.info_mode == 'auto' and info_cell_count >= 12)
+    info_labels = None if (use_indexed or not info_table) else _info_labels(info_table, profile)
+
+    has_section_label = wrapper.find(profile.section_label[0], class_=profile.section_label[1]) is not None
+
+    first_menu = wrapper.find('table', class_='menu-tbl')
+    bold_count, short_first_id = 0, False
+    if first_menu is not None:
+        bold_elements = first_menu.find_all('td', class_='bold')
+        bold_count = len(bold_elements)
+        short_first_id = bool(bold_elements) and len(bold_elements[0].text.strip()) < 5
+
+    return (use_indexed, info_cell_count if use_indexed else None, info_labels,
+            has_section_label, bold_count, short_first_id)
+
+
+def compile_plan(fingerprint, profile):
+    """Turns a layout fingerprint into fixed positions for the given profile."""
+    use_indexed, _, info_labels, has_section_label, bold_count, short_first_id = fingerprint
+
+    info_cells, info_rows = None, None
+    if use_indexed:
+        info_cells = INDEXED_INFO_CELLS
+    elif info_labels:
+        rows = []
+        for index, label in enumerate(info_labels):
+            if label is None:
+                continue
+            for needle, field in profile.info_labels:
+                if needle in label:
+                    rows.append((index, field))
+                    break
+        info_rows = tuple(rows)
+
+    question_id_cell = 0
+    if profile.skip_short_ids and short_first_id and bold_count > 1:
+        question_id_cell = 1
+
+    return ExtractionPlan(
+        fingerprint,
+        info_cells,
+        info_rows,
+        profile.section_label if has_section_label else None,
+        question_id_cell,
+    )
+
+
+class PlanCache:
+    """Bounded cache of compiled plans keyed by (profile, layout fingerprint)."""
+
+    def __init__(self, max_plans=MAX_CACHED_PLANS):
+        self.max_plans = max_plans
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_plan(self, soup, wrapper, profile):
+        fingerprint = fingerprint_layout(soup, wrapper, profile)
+        cache_key = (profile.name, fingerprint)
+        with self._lock:
+            plan = self._plans.get(cache_key)
+            if plan is not None:
+                self._plans.move_to_end(cache_key)
+                return plan
+        plan = compile_plan(fingerprint, profile)
+        with self._lock:
+            self._plans[cache_key] = plan
+            while len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+        return plan
+
+    def __len__(self):
+        return len(self._plans)
+
+
+# Process-wide plan cache shared by all scrapers
+plan_cache = PlanCache()
@@ -0,0 +1,241 @@
+import time
+import random
+from collections import OrderedDict
+from contextvars import ContextVar
+
+import requests
+
+from request_capture import note_fetch
+from cache_backends import get_page, set_page
+from admission import admission, backend_limits
+from memory_budget import PageTooLarge, check_page_size
+
+# Try to import proxy-only utilities
+try:
+    from proxy_only import PROXY_STRATEGIES
+    PROXY_ONLY_AVAILABLE = True
+    print("✓ Proxy-only utilities loaded")
+except ImportError:
+    PROXY_ONLY_AVAILABLE = False
+    print("⚠️ Proxy-only utilities not available")
+
+# Try to import advanced bypass utilities
+try:
+    from bypass_utils import SSCBypassManager
+    ADVANCED_BYPASS_AVAILABLE = True
+    print("✓ Advanced bypass utilities loaded")
+except ImportError:
+    ADVANCED_BYPASS_AVAILABLE = False
+    print("⚠️ Advanced bypass utilities not available, using basic method")
+
+
+# Pages the ASGI entry point has already fetched for the current request:
+# {url: Prefetched}. fetch_html() uses them instead of fetching again.
+prefetched_pages = ContextVar('prefetched_pages', default=None)
+
+
+class Prefetched:
+    """Outcome of a fetch done ahead of the view: the page (or None), or the error to raise, and its attempts."""
+
+    __slots__ = ('html_content', 'error', 'attempts')
+
+    def __init__(self, html_content=None, error=None, attempts=None):
+        self.html_content = html_content
+        self.error = error
+        self.attempts = attempts or {}
+
+
+class FetchError(Exception):
+    """Raised when every strategy of a pipeline has failed."""
+
+
+class FetchPipeline:
+    """
+    Ordered fetch strategies for one request.
+
+    A strategy is a (name, function) pair; the function takes the URL and
+    returns the page text, or None/raises on failure. Each name runs at most
+    once per pipeline, so a proxy that is part of several strategy sources (or
+    a second fetch() call) is never hit again after it has failed. A strategy
+    whose backend is already at its concurrency limit is skipped. Every
+    attempt is recorded in `attempts` and in the active request capture.
+    """
+
+    def __init__(self, strategies=()):
+        self.strategies = []
+        self.attempts = OrderedDict()
+        self.extend(strategies)
+
+    def add(self, name, function):
+        """Appends a strategy unless one with the same name is already queued."""
+        if all(existing != name for existing, _ in self.strategies):
+            self.strategies.append((name, function))
+        return self
+
+    def extend(self, strategies):
+        for name, function in strategies:
+            self.add(name, function)
+        return self
+
+    def fetch(self, url):
+        """
+        Runs the strategies not yet attempted, in order, until one returns content.
+
+        Returns:
+            str: The page content.
+
+        Raises:
+            FetchError: If every strategy has failed.
+            PageTooLarge: If a strategy found the page above the size budget.
+        """
+        for name, function in self.strategies:
+            if name in self.attempts:
+                continue
+            if not backend_limits.try_acquire(name):
+                print(f"⏭️ Skipping {name}: backend busy")
+                self.attempts[name] = {'ok': False, 'ms': 0.0, 'detail': 'backend busy'}
+                note_fetch(name, False, 0.0, 'backend busy')
+                continue
+            print(f"🔄 Trying {name}...")
+            started = time.perf_counter()
+            detail = error = None
+            try:
+                content = function(url)
+            except Exception as e:
+                content, detail, error = None, str(e), e
+            finally:
+                backend_limits.release(name)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            ok = bool(content)
+            self.attempts[name] = {'ok': ok, 'ms': round(elapsed_ms, 1), 'detail': detail}
+            note_fetch(name, ok, elapsed_ms, detail)
+            if ok:
+                print(f"✅ Success with {name}")
+                return content
+            print(f"❌ Failed with {name}" + (f": {detail}" if detail else ""))
+            if isinstance(error, PageTooLarge):
+                # Every other route would bring back the same page
+                raise error
+        raise FetchError(f"Unable to fetch {url} (tried: {', '.join(self.attempts) or 'nothing'})")
+
+
+def make_request_with_retry(url, max_retries=3):
+    """
+    Make HTTP request with enhanced headers and retry logic to bypass restrictions.
+    """
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'DNT': '1',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1',
+        'Sec-Fetch-Dest': 'document',
+        'Sec-Fetch-Mode': 'navigate',
+        'Sec-Fetch-Site': 'none',
+        'Sec-Fetch-User': '?1',
+        'sec-ch-ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
+        'sec-ch-ua-mobile': '?0',
+        'sec-ch-ua-platform': '"Windows"'
+    }
+
+    session = requests.Session()
+    session.headers.update(headers)
+
+    for attempt in range(max_retries):
+        try:
+            # Add random delay to avoid rate limiting
+            if attempt > 0:
+                delay = random.uniform(1, 3)
+                print(f"Retrying in {delay:.1f} seconds... (attempt {attempt + 1})")
+                time.sleep(delay)
+
+            print(f"Attempting to fetch URL (attempt {attempt + 1}): {url}")
+            response = session.get(url, timeout=30)
+
+            if response.status_code == 200:
+                print("✓ Successfully fetched content")
+                return response.text
+            elif response.status_code == 403:
+                print(f"✗ 403 Forbidden - Server blocking request (attempt {attempt + 1})")
+                if attempt < max_retries - 1:
+                    # Try with different User-Agent
+                    user_agents = [
+                        'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/119.0',
+                        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+                    ]
+                    session.headers['User-Agent'] = random.choice(user_agents)
+                continue
+            else:
+                print(f"✗ HTTP {response.status_code}: {response.reason}")
+                response.raise_for_status()
+
+        except requests.exceptions.Timeout:
+            print(f"✗ Timeout error (attempt {attempt + 1})")
+        except requests.exceptions.ConnectionError:
+            print(f"✗ Connection error (attempt {attempt + 1})")
+        except requests.RequestException as e:
+            print(f"✗ Request error (attempt {attempt + 1}): {e}")
+
+        if attempt == max_retries - 1:
+            raise Exception(f"Failed to fetch URL after {max_retries} attempts. Server may be blocking requests.")
+
+    return None
+
+
+def default_pipeline():
+    """
+    The scrapers' fetch order: the proxy-only services when available, else the
+    bypass manager (proxies, then direct browser-like access), else plain
+    direct requests with retries.
+    """
+    if PROXY_ONLY_AVAILABLE:
+        print("🌐 Using proxy-only method...")
+        return FetchPipeline(PROXY_STRATEGIES)
+    if ADVANCED_BYPASS_AVAILABLE:
+        print("🔄 Using advanced bypass with proxy priority...")
+        return FetchPipeline(SSCBypassManager().fetch_strategies(max_retries=5))
+    print("📡 Using basic bypass method...")
+    return FetchPipeline([('direct', make_request_with_retry)])
+
+
+def fetch_html(url, pipeline=None):
+    """
+    Fetches an answer key page for a scraper, from the shared cache when
+    another request (or worker) has fetched it recently. Outbound fetches go
+    through admission control.
+
+    Returns:
+        str: The page content, or None if every strategy failed.
+
+    Raises:
+        Saturated: If the fetch could not be admitted (see admission.py).
+        PageTooLarge: If the page is above the page size budget.
+    """
+    prefetched = (prefetched_pages.get() or {}).get(url)
+    if prefetched is not None:
+        for name, attempt in prefetched.attempts.items():
+            note_fetch(name, attempt['ok'], attempt['ms'], attempt['detail'])
+        if prefetched.error is not None:
+            raise prefetched.error
+        return prefetched.html_content
+
+    started = time.perf_counter()
+    html_content = get_page(url)
+    if html_content is not None:
+        print("⚡ Using cached page")
+        note_fetch('cache', True, (time.perf_counter() - started) * 1000)
+        return html_content
+
+    pipeline = pipeline or default_pipeline()
+    try:
+        with admission.admit(url):
+            html_content = pipeline.fetch(url)
+    except FetchError as e:
+        print(f"Error fetching URL: {e}")
+        return None
+    check_page_size(len(html_content))
+    set_page(url, html_content)
+    return html_content
@@ -0,0 +1,28 @@
+import os
+
+# gunicorn -c gunicorn.conf.py wsgi:app
+#
+# The app is loaded and warmed up once in the master (wsgi.py), then forked:
+# workers start with the scrapers and templates already loaded and share
+# that memory copy-on-write.
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', min(os.cpu_count() or 1, 4)))
+# Read by the preloaded app: parse pools share the host's CPUs between workers
+os.environ['WEB_CONCURRENCY'] = str(workers)
+# Request threads per worker; admission control sizes its budget from the same setting
+worker_class = 'gthread'
+threads = int(os.environ.get('MARKSKING_WORKER_THREADS', '64'))
+preload_app = True
+# URL submissions may wait on slow answer key hosts and proxies
+timeout = int(os.environ.get('MARKSKING_WORKER_TIMEOUT', '120'))
+graceful_timeout = 30
+# Replace workers now and then (staggered) to return fragmented memory
+max_requests = int(os.environ.get('MARKSKING_MAX_REQUESTS', '5000'))
+max_requests_jitter = max_requests // 10
+
+
+def post_fork(server, worker):
+    # Start this worker's parse processes before it accepts requests
+    from parse_pool import parse_pool
+    parse_pool.warm()
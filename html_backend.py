@@ -0,0 +1,161 @@
+import os
+import io
+import json
+import argparse
+import contextlib
+from bs4 import BeautifulSoup
+
+# Try to import the C-accelerated lxml tree builder
+try:
+    import lxml  # noqa: F401
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+# Backends in order of preference; html.parser is pure Python and always present
+BACKEND_PREFERENCE = ['lxml', 'html.parser']
+FALLBACK_BACKEND = 'html.parser'
+
+# Deployment override, e.g. MARKSKING_HTML_PARSER=html.parser
+PARSER_ENV_VAR = 'MARKSKING_HTML_PARSER'
+
+# Result keys every backend must reproduce exactly
+CONFORMANCE_KEYS = ('candidate_info', 'section_details', 'question_wise_data')
+
+_active_backend = None
+
+
+def available_backends():
+    """Returns the tree builders installed in this deployment, fastest first."""
+    available = []
+    for name in BACKEND_PREFERENCE:
+        if name == 'lxml' and not LXML_AVAILABLE:
+            continue
+        available.append(name)
+    return available
+
+
+def resolve_backend(requested=None):
+    """
+    Picks the tree builder to use for parsing.
+
+    An explicit request (argument or MARKSKING_HTML_PARSER) wins when that backend
+    is installed; otherwise the fastest available backend is used, falling back
+    to html.parser.
+    """
+    requested = requested or os.environ.get(PARSER_ENV_VAR, '').strip()
+    available = available_backends()
+    if requested:
+        if requested in available:
+            return requested
+        print(f"⚠️ HTML parser '{requested}' not available, falling back")
+    return available[0] if available else FALLBACK_BACKEND
+
+
+def get_parser_backend():
+    """Returns the tree builder selected for this process."""
+    global _active_backend
+    if _active_backend is None:
+        _active_backend = resolve_backend()
+    return _active_backend
+
+
+def set_parser_backend(name=None):
+    """Overrides the tree builder for this process. Pass None to re-detect."""
+    global _active_backend
+    _active_backend = resolve_backend(name) if name else None
+    return get_parser_backend()
+
+
+def make_soup(html_content, backend=None):
+    """Builds a BeautifulSoup tree with the selected (or given) backend."""
+    return BeautifulSoup(html_content, backend or get_parser_backend())
+
+
+@contextlib.contextmanager
+def use_backend(name):
+    """Temporarily forces a specific tree builder (used by the conformance check)."""
+    global _active_backend
+    previous = _active_backend
+    _active_backend = name
+    try:
+        yield name
+    finally:
+        _active_backend = previous
+
+
+def _conformance_view(result):
+    """Reduces a scraper result to the keys that must match across backends."""
+    if not result:
+        return None
+    return json.loads(json.dumps({key: result.get(key) for key in CONFORMANCE_KEYS}, sort_keys=True))
+
+
+def check_conformance(corpus_dir, backends=None, verbose=False):
+    """
+    Runs every scraper over a reference corpus with each backend and compares
+    candidate_info, section_details and question_wise_data against html.parser.
+
+    Args:
+        corpus_dir (str): Directory containing saved answer key .html/.htm files.
+        backends (list): Backends to check. Defaults to all installed ones.
+        verbose (bool): Keep the scrapers' progress output.
+
+    Returns:
+        list: One dict per mismatch (file, scraper, backend, differing keys).
+    """
+    from scraper import scrape_answer_key
+    from scraper_je import scrape_je_answer_key
+    from scraper_chsl import scrape_chsl_answer_key
+
+    scrapers = {
+        'mts': scrape_answer_key,
+        'je': scrape_je_answer_key,
+        'chsl': scrape_chsl_answer_key,
+    }
+    backends = backends or available_backends()
+    files = sorted(
+        os.path.join(corpus_dir, name) for name in os.listdir(corpus_dir)
+        if name.lower().endswith(('.html', '.htm'))
+    )
+
+    def run(scraper, path, backend):
+        output = None if verbose else io.StringIO()
+        with use_backend(backend), contextlib.redirect_stdout(output) if output else contextlib.nullcontext():
+            try:
+                return _conformance_view(scraper(path, is_file=True))
+            except Exception as e:
+                return {'error': type(e).__name__}
+
+    mismatches = []
+    for path in files:
+        for exam, scraper in scrapers.items():
+            reference = run(scraper, path, FALLBACK_BACKEND)
+            for backend in backends:
+                if backend == FALLBACK_BACKEND:
+                    continue
+                candidate = run(scraper, path, backend)
+                if candidate != reference:
+                    keys = [key for key in CONFORMANCE_KEYS
+                            if (reference or {}).get(key) != (candidate or {}).get(key)]
+                    mismatches.append({'file': path, 'scraper': exam, 'backend': backend, 'keys': keys or ['result']})
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that every installed HTML tree builder yields identical scraper output on a reference corpus."
+    )
+    parser.add_argument("corpus", help="Directory of saved answer key HTML files.")
+    parser.add_argument("-b", "--backend", action="append", help="Backend to check (repeatable). Defaults to all installed.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show scraper output while checking.")
+
+    args = parser.parse_args()
+
+    print(f"Installed backends: {', '.join(available_backends())} (selected: {get_parser_backend()})")
+    mismatches = check_conformance(args.corpus, backends=args.backend, verbose=args.verbose)
+    if mismatches:
+        for mismatch in mismatches:
+            print(f"✗ {mismatch['file']} [{mismatch['scraper']}] {mismatch['backend']}: {', '.join(mismatch['keys'])}")
+        raise SystemExit(1)
+    print("✓ All backends conform")
@@ -0,0 +1,135 @@
+import os
+import re
+import argparse
+
+# Set MARKSKING_PREFILTER=0 to hand the raw page straight to BeautifulSoup
+PREFILTER_ENV_VAR = 'MARKSKING_PREFILTER'
+
+# Subtrees no scraper ever reads: dropped wholesale before tree construction
+_DROP_BLOCKS = re.compile(
+    r'<!--.*?-->|<script\b.*?</script\s*>|<style\b.*?</style\s*>|<head\b.*?</head\s*>',
+    re.IGNORECASE | re.DOTALL,
+)
+# Void/empty elements that only add nodes (option images, stylesheet links, meta)
+_DROP_TAGS = re.compile(r'<(?:img|link|meta|input|br)\b[^>]*>', re.IGNORECASE)
+
+# TCS (digialm) question panel; only its menu-tbl bold cells and rightAns cell are read
+_QUESTION_PANEL = re.compile(
+    r'<div\b[^>]*class\s*=\s*["\']?[^"\'>]*(?<![\w-])question-pnl(?![\w-])[^>]*>', re.IGNORECASE
+)
+_MENU_TABLE = re.compile(
+    r'<table\b[^>]*class\s*=\s*["\']?[^"\'>]*(?<![\w-])menu-tbl(?![\w-])[^>]*>', re.IGNORECASE
+)
+_DIV_TAG = re.compile(r'<(/?)div\b[^>]*>', re.IGNORECASE)
+_TABLE_TAG = re.compile(r'<(/?)table\b[^>]*>', re.IGNORECASE)
+_BOLD_CELL = re.compile(
+    r'<td\b[^>]*class\s*=\s*["\']?[^"\'>]*(?<![\w-])bold(?![\w-])[^>]*>(.*?)</td\s*>', re.IGNORECASE | re.DOTALL
+)
+_RIGHT_ANS_CELL = re.compile(
+    r'<td\b[^>]*class\s*=\s*["\']?[^"\'>]*(?<![\w-])rightAns(?![\w-])[^>]*>(.*?)</td\s*>', re.IGNORECASE | re.DOTALL
+)
+_ANY_TAG = re.compile(r'<[^>]*>')
+
+
+def prefilter_enabled():
+    """Returns False when the pre-filter has been switched off for this deployment."""
+    return os.environ.get(PREFILTER_ENV_VAR, '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def _find_element_end(html_content, start, tag_pattern):
+    """Returns the index just past the closing tag matching the element opened at `start`."""
+    depth = 0
+    for match in tag_pattern.finditer(html_content, start):
+        depth += -1 if match.group(1) else 1
+        if depth == 0:
+            return match.end()
+    return len(html_content)
+
+
+def _cells(pattern, css_class, html_content, start, end, keep_ends=False):
+    """
+    Returns the matching cells in html_content[start:end], reduced to their text.
+    With keep_ends, only the first two and the last cell are kept (question ID
+    candidates and the chosen option).
+    """
+    contents = pattern.findall(html_content, start, end)
+    if keep_ends and len(contents) > 3:
+        contents = contents[:2] + contents[-1:]
+    return ''.join(f'<td class="{css_class}">{_ANY_TAG.sub("", content)}</td>' for content in contents)
+
+
+def _collapse_question_panels(html_content):
+    """
+    Rebuilds every question-pnl with only the cells the scrapers read: the first
+    two and the last bold cell of its menu-tbl and its rightAns cell(s). Question stems,
+    option rows, images and nested tables never reach the tree builder, while
+    `question.find('td', class_='rightAns')` still returns None for bonus questions.
+    """
+    pieces = []
+    cursor = 0
+    for match in _QUESTION_PANEL.finditer(html_content):
+        if match.start() < cursor:
+            continue
+        end = _find_element_end(html_content, match.start(), _DIV_TAG)
+        pieces.append(html_content[cursor:match.start()])
+        pieces.append('<div class="question-pnl">')
+        menu = _MENU_TABLE.search(html_content, match.start(), end)
+        if menu:
+            menu_end = _find_element_end(html_content, menu.start(), _TABLE_TAG)
+            bold_cells = _cells(_BOLD_CELL, 'bold', html_content, menu.start(), menu_end, keep_ends=True)
+            pieces.append(f'<table class="menu-tbl"><tr>{bold_cells}</tr></table>')
+        answers = _cells(_RIGHT_ANS_CELL, 'rightAns', html_content, match.start(), end)
+        if answers:
+            pieces.append(f'<table><tr>{answers}</tr></table>')
+        pieces.append('</div>')
+        cursor = end
+    if not pieces:
+        return html_content
+    pieces.append(html_content[cursor:])
+    return ''.join(pieces)
+
+
+def prefilter_html(html_content):
+    """
+    Strips the parts of an answer key page the scrapers never read before the
+    page is handed to BeautifulSoup.
+
+    Comments, <head>, scripts, styles and images are removed from every page. On
+    TCS-format pages each question panel is reduced to its menu-tbl bold cells
+    and rightAns cell, while the candidate-info table and section labels are
+    left untouched. Format detection that looks at the raw page should be done on
+    the original string, not the filtered one.
+
+    Args:
+        html_content (str): The raw answer key HTML.
+
+    Returns:
+        str: The reduced HTML (or the original when the pre-filter is disabled).
+    """
+    if not html_content or not prefilter_enabled():
+        return html_content
+    html_content = _DROP_BLOCKS.sub('', html_content)
+    html_content = _DROP_TAGS.sub('', html_content)
+    if 'question-pnl' in html_content:
+        html_content = _collapse_question_panels(html_content)
+    return html_content
+
+
+if __name__ == "__main__":
+    from html_backend import make_soup
+
+    parser = argparse.ArgumentParser(description="Show how much of an answer key page the pre-filter removes.")
+    parser.add_argument("file", help="Local answer key HTML file.")
+
+    args = parser.parse_args()
+
+    with open(args.file, 'r', encoding='utf-8') as f:
+        raw = f.read()
+    filtered = prefilter_html(raw)
+
+    def count_nodes(html):
+        return sum(1 for _ in make_soup(html).descendants)
+
+    raw_nodes, filtered_nodes = count_nodes(raw), count_nodes(filtered)
+    print(f"Bytes: {len(raw):,} -> {len(filtered):,}")
+    print(f"Nodes: {raw_nodes:,} -> {filtered_nodes:,} ({raw_nodes / max(filtered_nodes, 1):.1f}x fewer)")
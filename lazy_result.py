@@ -0,0 +1,152 @@
+import threading
+from collections.abc import MutableMapping
+
+from answer_sheet import AnswerSheet
+
+# Questions per page of the question-wise endpoint
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 200
+
+
+class LazyResult(MutableMapping):
+    """
+    A scraper result whose costly entries are computed on first access.
+
+    Behaves like the plain result dict it replaces (templates, .get(), item
+    assignment, deepcopy, pickling), but entries registered as lazy are only
+    built when something reads them. A lazy entry is a function of the
+    result itself, so it can always be rebuilt from the eager entries; that is
+    what keeps the cached and pickled forms small (see to_dict()).
+
+    Results are shared between request threads (single-flight followers,
+    the result cache), so an entry is computed under a lock, once, and only
+    leaves the lazy table after its value is stored.
+    """
+
+    def __init__(self, values=(), lazy=None):
+        self._values = dict(values)
+        self._lazy = {key: function for key, function in (lazy or {}).items() if key not in self._values}
+        # Re-entrant: a lazy entry reads the other entries of the result
+        self._lock = threading.RLock()
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+            function = self._lazy[key]
+            value = self._values[key] = function(self)
+            del self._lazy[key]
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._values[key] = value
+            self._lazy.pop(key, None)
+
+    def __delitem__(self, key):
+        with self._lock:
+            if key in self._lazy:
+                del self._lazy[key]
+            else:
+                del self._values[key]
+
+    def __contains__(self, key):
+        return key in self._values or key in self._lazy
+
+    def __iter__(self):
+        yield from list(self._values)
+        yield from [key for key in self._lazy if key not in self._values]
+
+    def __len__(self):
+        return len(self._values) + sum(1 for key in list(self._lazy) if key not in self._values)
+
+    def __reduce__(self):
+        # Copies and pickles carry the entries, not the lock
+        with self._lock:
+            return type(self), (dict(self._values), dict(self._lazy))
+
+    def __repr__(self):
+        return f"LazyResult({self._values!r}, pending={sorted(self._lazy)!r})"
+
+    def pending(self):
+        """Keys not computed yet."""
+        return list(self._lazy)
+
+    def to_dict(self, materialise=True):
+        """
+        Plain dict of the result (for JSON). With materialise=False, entries not
+        computed yet are left out; scored_result() restores them lazily.
+        """
+        if materialise:
+            return {key: self[key] for key in self}
+        return dict(self._values)
+
+
+def question_breakdown(result):
+    """{question_id: outcome} of a result, from its answer sheet and the key it was scored with."""
+    answer_sheet = result['answer_sheet']
+    key = result.get('scoring_key') or answer_sheet['key']
+    return AnswerSheet(answer_sheet['question_ids'], answer_sheet['chosen'], key).question_outcomes()
+
+
+# Lazy entries and the eager entries they are derived from
+RESULT_DERIVATIONS = {
+    'question_wise_data': (question_breakdown, ('answer_sheet',)),
+}
+
+
+def scored_result(data):
+    """
+    Wraps a result's eager entries (summary, section table, answer sheet and,
+    when it differs from the page's, the scoring key) in a LazyResult that
+    derives the per-question breakdown on demand. Also used to restore
+    results stored by compact_dict().
+    """
+    lazy = {key: function for key, (function, needs) in RESULT_DERIVATIONS.items()
+            if key not in data and all(data.get(name) for name in needs)}
+    return LazyResult(data, lazy)
+
+
+def compact_dict(result):
+    """JSON-ready form of any result: LazyResults without their derivable entries."""
+    return result.to_dict(materialise=False) if isinstance(result, LazyResult) else result
+
+
+def question_page(result, page=1, per_page=DEFAULT_PAGE_SIZE):
+    """
+    One page of a result's question-wise breakdown, in page order.
+
+    Returns:
+        dict: page, per_page, total and questions [{number, question_id,
+              section, chosen, outcome}] (chosen is the option code or None).
+    """
+    outcomes = result.get('question_wise_data') or {}
+    answer_sheet = result.get('answer_sheet')
+    question_ids = answer_sheet['question_ids'] if answer_sheet else list(outcomes)
+    per_page = min(max(per_page, 1), MAX_PAGE_SIZE)
+    pages = max((len(question_ids) + per_page - 1) // per_page, 1)
+    page = min(max(page, 1), pages)
+    start = (page - 1) * per_page
+
+    section_of = {}
+    for section in (answer_sheet or {}).get('sections') or []:
+        for index in range(max(section['start'], start), min(section['end'], start + per_page)):
+            section_of[index] = section['name']
+
+    questions = []
+    for index in range(start, min(start + per_page, len(question_ids))):
+        question_id = question_ids[index]
+        chosen = answer_sheet['chosen'][index] if answer_sheet else None
+        questions.append({
+            'number': index + 1,
+            'question_id': question_id,
+            'section': section_of.get(index),
+            'chosen': None if chosen in (None, '-', '?') else chosen,
+            'outcome': outcomes.get(question_id),
+        })
+    return {'page': page, 'per_page': per_page, 'pages': pages, 'total': len(question_ids), 'questions': questions}
+
@@ -1,49 +1,183 @@
-from flask import Flask, render_template, request, flash, redirect, url_for, make_response
+from flask import Blueprint, Flask, Response, render_template, request, flash, redirect, url_for, make_response
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
+import gzip
 import uuid
+import secrets
 import tempfile
 import traceback
 
-# Import both scraper functions, renaming the first one for clarity
-try:
-    from scraper import scrape_answer_key as scrape_mts_key
-    print("✓ MTS scraper imported successfully")
-except Exception as e:
-    print(f"✗ Error importing MTS scraper: {e}")
-
-try:
-    from scraper_je import scrape_je_answer_key
-    print("✓ JE scraper imported successfully")
-except Exception as e:
-    print(f"✗ Error importing JE scraper: {e}")
-
-try:
-    from scraper_chsl import scrape_chsl_answer_key
-    print("✓ CHSL scraper imported successfully")
-except Exception as e:
-    print(f"✗ Error importing CHSL scraper: {e}")
+from request_capture import capture_slow_requests, note_result
+from rank_index import attach_standing
+from answer_key_index import shift_key_index
+from normalization import attach_normalisation
+from question_stats import QUESTION_STATS_ENABLED, question_stats, record_question_stats
+from result_store import result_store, store_result
+from cache_backends import cached_result, recall_result, remember_result
+from singleflight import coalesce, upload_key, url_key
+from admission import Saturated
+from rate_limit import BUDGETS, check_rate, rate_limited, row_budget
+from memory_budget import MAX_PAGE_BYTES, PageTooLarge, memory_monitor, read_upload
+from lazy_result import DEFAULT_PAGE_SIZE, question_page
+from parse_pool import ParseTimeout
+from bulk_scoring import BulkInputError, parse_rows, stream_bulk_scoring
+from preflight import InvalidSubmission, check_upload, check_url
+from static_assets import ASSET_MAX_AGE, PREVIOUS_ASSET_MAX_AGE, asset_manifest
+
+from answer_sheet import AnswerSheet
+from scraper import scrape_answer_key as scrape_mts_key, score_answer_key as score_mts_key
+from scraper_je import scrape_je_answer_key, score_je_answer_key
+from scraper_chsl import scrape_chsl_answer_key, score_chsl_answer_key
 
 # --- Configuration ---
 ALLOWED_EXTENSIONS = {'html', 'htm'}
-SECRET_KEY = 'a-very-secret-key-for-dev' # Change for production!
+RESULT_TEMPLATES = {'mts': 'results.html', 'je': 'results_je.html', 'chsl': 'results_chsl.html'}
+# Browser cache lifetime of a versioned permalink page (a key revision gives it a new version)
+PERMALINK_MAX_AGE = int(os.environ.get('MARKSKING_PERMALINK_MAX_AGE', str(30 * 24 * 3600)))
+# Set MARKSKING_SECRET_KEY in production (flash messages are signed with it)
+SECRET_KEY = os.environ.get('MARKSKING_SECRET_KEY', 'a-very-secret-key-for-dev')
+
+# All routes and error handlers; create_app() registers them on an application
+bp = Blueprint('main', __name__)
+
+
+def create_app(config=None):
+    """
+    Application factory.
+
+    Args:
+        config (dict, optional): Settings applied over the defaults.
+
+    Returns:
+        Flask: The application with all routes registered.
+    """
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = SECRET_KEY
+    # Reject oversized uploads before they are read (page budget plus form overhead)
+    app.config['MAX_CONTENT_LENGTH'] = MAX_PAGE_BYTES + 64 * 1024
+    if config:
+        app.config.update(config)
+    app.jinja_env.globals['asset_url'] = asset_manifest.url
+    app.jinja_env.globals['inline_asset'] = asset_manifest.inline
+    app.register_blueprint(bp)
+    return app
 
-# --- App Setup ---
-app = Flask(__name__)
-app.config['SECRET_KEY'] = SECRET_KEY
 
 def allowed_file(filename):
     """Checks if the uploaded file has an allowed extension."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def finish_result(exam, result, trusted):
+    """Shift standing, normalisation, question statistics and persistence for a scored result."""
+    attach_standing(exam, result, trusted=trusted)
+    attach_normalisation(exam, result)
+    record_question_stats(exam, result, trusted=trusted)
+    store_result(exam, result, trusted=trusted)
+
+def scrape_url(exam, url):
+    """Scores an answer key URL, sharing the work with identical in-flight requests and recent results."""
+    check_url(url)
+    scrapers = {'mts': scrape_mts_key, 'je': scrape_je_answer_key, 'chsl': scrape_chsl_answer_key}
+    return coalesce(url_key(exam, url), lambda: cached_result(exam, url, lambda: scrapers[exam](source=url, is_file=False, offload=True)))
+
+def score_url(exam, url):
+    """Scores one answer key URL (bulk rows); returns the result or None."""
+    result = scrape_url(exam, url)
+    if result:
+        finish_result(exam, result, trusted=True)
+    return result
+
+def service_busy(template, error):
+    """503 for a URL submission that was not admitted (the form is shown again)."""
+    flash(f'The server is busy fetching other answer keys. Please try again in {error.retry_after} seconds, '
+          'or upload the saved answer key page instead.', 'warning')
+    return render_template(template), 503, {'Retry-After': str(error.retry_after)}
+
+def invalid_submission(template, error):
+    """422 for a URL or page that fails the pre-flight checks (the form is shown again)."""
+    flash(str(error), 'danger')
+    return render_template(template), 422
+
+def page_too_large(template, error):
+    """413 for an answer key page above the page size budget (the form is shown again)."""
+    flash(f'{error} Please check that this is an answer key page.', 'danger')
+    return render_template(template), 413
+
+def parse_timed_out(template, error):
+    """503 for a page the parse workers could not read in time (the form is shown again)."""
+    flash(f'{error} Please try again in a minute, or upload the saved answer key page if this keeps happening.', 'warning')
+    return render_template(template), 503, {'Retry-After': '60'}
+
+def render_result(exam, template, result):
+    """
+    Renders a results page. The result is kept for a while so the page can load
+    its question-wise breakdown on demand. When the result store is configured,
+    the page also gets a permalink and is stored as a gzipped snapshot that
+    /r/<token> redirects to the current version of.
+    """
+    token = secrets.token_urlsafe(16)
+    remember_result(token, exam, result)
+    if result_store is None:
+        result['questions_url'] = url_for('main.question_wise_breakdown', token=token)
+        return render_template(template, data=result)
+    page = render_snapshot(template, result, token)
+    try:
+        result_store.save_snapshot(token, exam, result, gzip.compress(page.encode('utf-8'), compresslevel=6))
+    except Exception as e:
+        print(f"Error saving result snapshot: {e}")
+        result.pop('permalink', None)
+        page = render_template(template, data=result)
+    return page
+
+def render_snapshot(template, result, token):
+    """Renders a results page with its permalink."""
+    result['questions_url'] = url_for('main.question_wise_breakdown', token=token)
+    result['permalink'] = url_for('main.result_permalink', token=token, _external=True)
+    return render_template(template, data=result)
+
+def rescore_result(exam, result):
+    """
+    Scores a result's answer sheet again, against the key it was scored with
+    as revised since (see ShiftKeyIndex); None for results without one
+    (Eduquity CHSL pages).
+    """
+    answer_sheet = result.get('answer_sheet')
+    if not answer_sheet:
+        return None
+    sheet = AnswerSheet(answer_sheet['question_ids'], answer_sheet['chosen'],
+                        result.get('scoring_key') or answer_sheet['key'], answer_sheet['sections'])
+    extracted = (result.get('candidate_info') or {}, sheet)
+    if exam == 'chsl':
+        return score_chsl_answer_key(('tcs', extracted))
+    return (score_mts_key if exam == 'mts' else score_je_answer_key)(extracted)
+
+def refresh_snapshot(token):
+    """
+    Re-renders a permalinked page from the result kept with it, re-scored for
+    a key revision published since the snapshot was taken; returns the
+    gzipped page or None.
+    """
+    stored = result_store.snapshot_result(token)
+    result = rescore_result(*stored) if stored else None
+    if result is None:
+        return None
+    exam = stored[0]
+    attach_standing(exam, result)
+    attach_normalisation(exam, result)
+    remember_result(token, exam, result)
+    page_gzip = gzip.compress(render_snapshot(RESULT_TEMPLATES[exam], result, token).encode('utf-8'), compresslevel=6)
+    result_store.replace_snapshot(token, page_gzip, result)
+    return page_gzip
+
 # --- DEBUG ROUTE ---
-@app.route('/test')
+@bp.route('/test')
 def test():
     """Simple test route to verify the app is working."""
     return {"status": "success", "message": "Flask app is running on Vercel!", "routes": ["Home: /", "MTS: /mts", "JE: /ssc-je", "CHSL: /chsl"]}
 
 # --- SITEMAP ROUTE ---
-@app.route('/sitemap.xml')
+@bp.route('/sitemap.xml')
 def sitemap():
     """Generate XML sitemap for SEO"""
     try:
@@ -58,7 +192,7 @@ def sitemap():
         return "Sitemap generation failed", 500
 
 # --- ROBOTS.TXT ROUTE ---
-@app.route('/robots.txt')
+@bp.route('/robots.txt')
 def robots():
     """Generate robots.txt for SEO"""
     robots_content = """User-agent: *
@@ -75,14 +209,176 @@ Sitemap: https://marksking.vercel.app/sitemap.xml
     response.headers['Content-Type'] = 'text/plain'
     return response
 
+# --- QUESTION STATISTICS ROUTE ---
+@bp.route('/stats/<exam>/questions')
+def question_statistics(exam):
+    """Hardest or most disputed questions per shift (?by=hardest|disputed&k=10), when enabled."""
+    if not QUESTION_STATS_ENABLED or exam not in ('mts', 'je', 'chsl'):
+        return {"status": "error", "message": "Question statistics are not available."}, 404
+    by = request.args.get('by', 'hardest')
+    if by not in ('hardest', 'disputed'):
+        return {"status": "error", "message": "by must be 'hardest' or 'disputed'."}, 400
+    k = min(max(request.args.get('k', 10, type=int), 1), 100)
+    return {"status": "success", "exam": exam, "by": by, "shifts": question_stats.summary(exam, k, by)}
+
+# --- MEMORY METRIC ROUTE ---
+@bp.route('/stats/memory')
+def memory_statistics():
+    """Peak memory per scoring request (recent requests, per exam)."""
+    return {"status": "success", **memory_monitor.stats()}
+
+@bp.app_errorhandler(RequestEntityTooLarge)
+def request_too_large(error):
+    """Uploads above MAX_CONTENT_LENGTH are refused before they are read."""
+    flash(f'The uploaded file is too large. The limit is {MAX_PAGE_BYTES // 1048576} MB.', 'danger')
+    return redirect(request.path)
+
+# --- FINGERPRINTED STATIC ASSETS ---
+@bp.route('/assets/<path:filename>')
+def static_asset(filename):
+    """Serves a static file by its fingerprinted name (see static_assets.py)."""
+    asset = asset_manifest.get(filename)
+    if asset is None:
+        return render_template('404.html'), 404
+    if request.if_none_match.contains(asset.etag):
+        response = make_response('', 304)
+    elif asset.gzip_data is not None and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = make_response(asset.gzip_data)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = make_response(asset.data)
+    response.headers['Content-Type'] = asset.mimetype
+    if asset.hashed_name == filename:
+        # The name changes with the content, so any copy is good for a year
+        response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = f'public, max-age={PREVIOUS_ASSET_MAX_AGE}'
+    response.headers['ETag'] = f'"{asset.etag}"'
+    if asset.gzip_data is not None:
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+# --- QUESTION-WISE BREAKDOWN ROUTE ---
+@bp.route('/results/<token>/questions')
+def question_wise_breakdown(token):
+    """One page of a rendered result's question-wise breakdown (?page=1&per_page=25)."""
+    entry = recall_result(token)
+    if entry is None and result_store is not None:
+        # Permalinked results outlive the cached breakdown: use the result kept with the snapshot
+        entry = result_store.snapshot_result(token)
+    if entry is None:
+        return {"status": "error", "message": "This result is no longer available."}, 404
+    exam, result = entry
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int)
+    return {"status": "success", "exam": exam, **question_page(result, page, per_page)}
+
+def snapshot_version(created_at):
+    """Version of a stored snapshot in its URL (changes whenever it is re-rendered)."""
+    return int(created_at * 1000)
+
+# --- RESULT PERMALINK ROUTES ---
+@bp.route('/r/<token>')
+def result_permalink(token):
+    """
+    The shared link: re-renders the snapshot if a key revision has changed its
+    result, then redirects to the snapshot's current version.
+    """
+    snapshot = result_store.snapshot(token) if result_store is not None else None
+    if snapshot is None:
+        return render_template('404.html'), 404
+    exam, _, created_at, candidate_info = snapshot
+    if shift_key_index.revised_after(exam, candidate_info, created_at):
+        if refresh_snapshot(token) is not None:
+            created_at = result_store.snapshot(token)[2]
+    response = redirect(url_for('main.result_snapshot', token=token, version=snapshot_version(created_at)))
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['X-Robots-Tag'] = 'noindex'
+    return response
+
+@bp.route('/r/<token>/<int:version>')
+def result_snapshot(token, version):
+    """Serves one version of a stored results page snapshot without touching the scrapers."""
+    snapshot = result_store.snapshot(token) if result_store is not None else None
+    if snapshot is None:
+        return render_template('404.html'), 404
+    exam, page_gzip, created_at, candidate_info = snapshot
+    if snapshot_version(created_at) != version:
+        # Re-rendered since: the shared link leads to the current version
+        response = redirect(url_for('main.result_permalink', token=token))
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    etag = f"{token}.{version}"
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = make_response(page_gzip)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = make_response(gzip.decompress(page_gzip))
+    response.headers['Content-Type'] = 'text/html; charset=utf-8'
+    # A version never changes; only the candidate's browser may keep it
+    response.headers['Cache-Control'] = f'private, max-age={PERMALINK_MAX_AGE}, immutable'
+    response.headers['ETag'] = f'"{etag}"'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['X-Robots-Tag'] = 'noindex'
+    return response
+
+# --- BULK SCORING ROUTE ---
+@bp.route('/bulk', methods=['POST'])
+def bulk_score():
+    """
+    Scores many answer key URLs at once and streams per-row results and progress
+    as Server-Sent Events. Body: JSON {"rows": [{"exam": "mts", "url": "..."}]},
+    or a form with a CSV file 'urls_file' (or text 'urls') of exam,url lines and
+    an optional default 'exam'.
+
+    The request is rate limited before its body is read, then each row is
+    charged as one URL submission.
+    """
+    decision = check_rate(request, 'bulk')
+    if not decision:
+        return ({"status": "error", "message": "Too many bulk requests. Please try again later."}, 429,
+                {'Retry-After': str(decision.retry_after)})
+
+    try:
+        if request.is_json:
+            rows = parse_rows(json_data=request.get_json(silent=True), default_exam=request.args.get('exam'))
+        else:
+            csv_file = request.files.get('urls_file')
+            csv_text = csv_file.read().decode('utf-8-sig') if csv_file else request.form.get('urls')
+            rows = parse_rows(csv_text=csv_text, default_exam=request.form.get('exam'))
+    except (BulkInputError, UnicodeDecodeError) as e:
+        return {"status": "error", "message": str(e)}, 400
+
+    budget = row_budget(request)
+    capacity = BUDGETS[budget][0]
+    if len(rows) > capacity:
+        return {"status": "error", "message": f"At most {capacity} rows per request"
+                + (" without an API key" if budget == 'url' else "")}, 400
+    decision = check_rate(request, budget, cost=len(rows))
+    if not decision:
+        return ({"status": "error", "message": f"Too many answer key links. Please try again in "
+                                               f"{decision.retry_after} seconds."}, 429,
+                {'Retry-After': str(decision.retry_after)})
+
+    print(f"Bulk scoring {len(rows)} URL(s)")
+    response = Response(stream_bulk_scoring(rows, score_url), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # --- ROOT ROUTE (Landing Page) ---
-@app.route('/', methods=['GET'])
+@bp.route('/', methods=['GET'])
 def home():
     """Landing page with links to all calculators."""
     return render_template('main_index.html')
 
 # --- SSC MTS ROUTE ---
-@app.route('/mts', methods=['GET', 'POST'])
+@bp.route('/mts', methods=['GET', 'POST'])
+@rate_limited('mts_index.html')
+@memory_monitor.measure('mts')
+@capture_slow_requests('mts')
 def calculate_mts_score():
     try:
         if request.method == 'POST':
@@ -92,17 +388,18 @@ def calculate_mts_score():
 
             if ans_key_url:
                 print(f"Processing MTS URL: {ans_key_url}")
-                result = scrape_mts_key(source=ans_key_url, is_file=False)
+                result = scrape_url('mts', ans_key_url)
             elif file and file.filename != '':
                 if allowed_file(file.filename):
+                    check_upload('mts', file)
                     # Use temporary file instead of uploads directory
                     with tempfile.NamedTemporaryFile(mode='w+', suffix='.html', delete=False, encoding='utf-8') as temp_file:
-                        content = file.read().decode('utf-8')
+                        content = read_upload(file)
                         temp_file.write(content)
                         filepath = temp_file.name
                     
                     print(f"Processing MTS file: {filepath}")
-                    result = scrape_mts_key(source=filepath, is_file=True)
+                    result = coalesce(upload_key('mts', content), lambda: scrape_mts_key(source=filepath, is_file=True, offload=True))
                     
                     # Clean up temporary file
                     try:
@@ -116,14 +413,24 @@ def calculate_mts_score():
                 flash('Please provide a URL or upload a file.', 'warning')
                 return redirect(request.url)
 
+            note_result(result)
             if result:
-                return render_template('results.html', data=result)
+                finish_result('mts', result, trusted=bool(ans_key_url))
+                return render_result('mts', 'results.html', result)
             else:
                 flash('Could not process the MTS answer key. The URL may be invalid or the HTML structure might not be supported.', 'danger')
                 return redirect(request.url)
                 
         # For GET request, show the MTS form
         return render_template('mts_index.html')
+    except Saturated as e:
+        return service_busy('mts_index.html', e)
+    except InvalidSubmission as e:
+        return invalid_submission('mts_index.html', e)
+    except PageTooLarge as e:
+        return page_too_large('mts_index.html', e)
+    except ParseTimeout as e:
+        return parse_timed_out('mts_index.html', e)
     except Exception as e:
         print(f"Error in MTS route: {str(e)}")
         print(f"Traceback: {traceback.format_exc()}")
@@ -131,7 +438,10 @@ def calculate_mts_score():
         return render_template('mts_index.html')
 
 # --- SSC JE ROUTE (Fixed and Fully Implemented) ---
-@app.route('/ssc-je', methods=['GET', 'POST'])
+@bp.route('/ssc-je', methods=['GET', 'POST'])
+@rate_limited('je_index.html')
+@memory_monitor.measure('je')
+@capture_slow_requests('je')
 def calculate_je_score():
     try:
         if request.method == 'POST':
@@ -150,9 +460,10 @@ def calculate_je_score():
             elif file and file.filename != '':
                 # --- Process File ---
                 if allowed_file(file.filename):
+                    check_upload('je', file)
                     # Use temporary file instead of uploads directory
                     with tempfile.NamedTemporaryFile(mode='w+', suffix='.html', delete=False, encoding='utf-8') as temp_file:
-                        content = file.read().decode('utf-8')
+                        content = read_upload(file)
                         temp_file.write(content)
                         filepath = temp_file.name
                     
@@ -168,7 +479,10 @@ def calculate_je_score():
             
             # --- Call the specific JE scraper ---
             print(f"Calling JE scraper with source: {source}, is_file: {is_file}")
-            result = scrape_je_answer_key(source=source, is_file=is_file)
+            if is_file:
+                result = coalesce(upload_key('je', content), lambda: scrape_je_answer_key(source=source, is_file=True, offload=True))
+            else:
+                result = scrape_url('je', source)
             print(f"JE scraper result: {result is not None}")
 
             # --- Clean up file if it exists ---
@@ -179,15 +493,25 @@ def calculate_je_score():
                     pass
 
             # --- Handle Result ---
+            note_result(result)
             if result:
+                finish_result('je', result, trusted=not is_file)
                 # Render the specific JE results page
-                return render_template('results_je.html', data=result)
+                return render_result('je', 'results_je.html', result)
             else:
                 flash('Could not process the JE answer key. The URL may be invalid or the HTML structure might not be supported.', 'danger')
                 return redirect(request.url)
                 
         # For GET request, show the JE form
         return render_template('je_index.html')
+    except Saturated as e:
+        return service_busy('je_index.html', e)
+    except InvalidSubmission as e:
+        return invalid_submission('je_index.html', e)
+    except PageTooLarge as e:
+        return page_too_large('je_index.html', e)
+    except ParseTimeout as e:
+        return parse_timed_out('je_index.html', e)
     except Exception as e:
         print(f"Error in JE route: {str(e)}")
         print(f"Traceback: {traceback.format_exc()}")
@@ -195,7 +519,10 @@ def calculate_je_score():
         return render_template('je_index.html')
 
 # --- NEW: SSC CHSL Calculator Route ---
-@app.route('/chsl', methods=['GET', 'POST'])
+@bp.route('/chsl', methods=['GET', 'POST'])
+@rate_limited('chsl_index.html')
+@memory_monitor.measure('chsl')
+@capture_slow_requests('chsl')
 def calculate_chsl_score():
     """Handles logic for the universal SSC CHSL calculator."""
     try:
@@ -211,23 +538,27 @@ def calculate_chsl_score():
                 source, is_file = ans_key_url, False
             elif file and file.filename != '':
                 if allowed_file(file.filename):
+                    check_upload('chsl', file)
                     # Use temporary file instead of uploads directory
                     with tempfile.NamedTemporaryFile(mode='w+', suffix='.html', delete=False, encoding='utf-8') as temp_file:
-                        content = file.read().decode('utf-8')
+                        content = read_upload(file)
                         temp_file.write(content)
                         filepath = temp_file.name
                     print(f"Processing CHSL file: {filepath}")
                     source, is_file = filepath, True
                 else:
                     flash('Invalid file type. Please upload an HTML file.', 'danger')
-                    return redirect(url_for('calculate_chsl_score'))
+                    return redirect(url_for('main.calculate_chsl_score'))
             else:
                 flash('Please provide a URL or upload a file.', 'warning')
-                return redirect(url_for('calculate_chsl_score'))
+                return redirect(url_for('main.calculate_chsl_score'))
             
             # Call the specific CHSL scraper
             print(f"Calling CHSL scraper with source: {source}, is_file: {is_file}")
-            result = scrape_chsl_answer_key(source=source, is_file=is_file)
+            if is_file:
+                result = coalesce(upload_key('chsl', content), lambda: scrape_chsl_answer_key(source=source, is_file=True, offload=True))
+            else:
+                result = scrape_url('chsl', source)
             print(f"CHSL scraper result: {result is not None}")
 
             if is_file and source and os.path.exists(source):
@@ -236,15 +567,25 @@ def calculate_chsl_score():
                 except:
                     pass
 
+            note_result(result)
             if result:
+                finish_result('chsl', result, trusted=not is_file)
                 # Render the specific CHSL results page
-                return render_template('results_chsl.html', data=result)
+                return render_result('chsl', 'results_chsl.html', result)
             else:
                 flash('Could not process the CHSL answer key. The URL may be invalid or the format is not supported.', 'danger')
-                return redirect(url_for('calculate_chsl_score'))
+                return redirect(url_for('main.calculate_chsl_score'))
                 
         # For GET request, show the CHSL form
         return render_template('chsl_index.html')
+    except Saturated as e:
+        return service_busy('chsl_index.html', e)
+    except InvalidSubmission as e:
+        return invalid_submission('chsl_index.html', e)
+    except PageTooLarge as e:
+        return page_too_large('chsl_index.html', e)
+    except ParseTimeout as e:
+        return parse_timed_out('chsl_index.html', e)
     except Exception as e:
         print(f"Error in CHSL route: {str(e)}")
         print(f"Traceback: {traceback.format_exc()}")
@@ -252,18 +593,20 @@ def calculate_chsl_score():
         return render_template('chsl_index.html')
 
 # --- ERROR HANDLERS ---
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def page_not_found(error):
     """Handle 404 errors with custom page"""
     return render_template('404.html'), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_server_error(error):
     """Handle 500 errors gracefully"""
     return render_template('404.html'), 500
 
-if __name__ == '__main__':
-    app.run()
-
 # Vercel entry point - the app object itself is the WSGI application
-# No additional handler needed when using @vercel/python
\ No newline at end of file
+# No additional handler needed when using @vercel/python. Pre-fork servers
+# should use wsgi:app instead (see wsgi.py).
+app = create_app()
+
+if __name__ == '__main__':
+    app.run()
\ No newline at end of file
@@ -0,0 +1,237 @@
+import os
+import gc
+import time
+import threading
+import functools
+import tracemalloc
+from collections import deque
+
+# --- Configuration (environment overrides) ---
+# Largest answer key page accepted (bytes); real pages are well under 2 MB
+MAX_PAGE_BYTES = int(os.environ.get('MARKSKING_MAX_PAGE_BYTES', str(8 * 1024 * 1024)))
+# Per-request memory measurement: 'rss' (sampled resident set), 'tracemalloc'
+# (exact Python allocations, slows every request) or 'off'
+MEMORY_TRACE = os.environ.get('MARKSKING_MEMORY_TRACE', 'rss').strip().lower()
+
+# RSS sampling interval while a measured request is running (seconds)
+RSS_SAMPLE_SECONDS = 0.02
+# Measurements kept per exam for the metric
+SAMPLES_PER_EXAM = 256
+
+
+class PageTooLarge(ValueError):
+    """Raised for answer key pages above MAX_PAGE_BYTES (routes answer 413)."""
+
+
+def check_page_size(size):
+    """Raises PageTooLarge when a page of `size` bytes exceeds the budget."""
+    if size > MAX_PAGE_BYTES:
+        raise PageTooLarge(f"Answer key page is {size / 1048576:.1f} MB; the limit is "
+                           f"{MAX_PAGE_BYTES / 1048576:.1f} MB")
+
+
+def read_page_file(path):
+    """Reads a saved answer key page, checking its size before reading and decoding it."""
+    check_page_size(os.path.getsize(path))
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def read_upload(file):
+    """Reads an uploaded page (werkzeug FileStorage), at most MAX_PAGE_BYTES + 1 bytes, then decodes it."""
+    data = file.read(MAX_PAGE_BYTES + 1)
+    check_page_size(len(data))
+    return data.decode('utf-8')
+
+
+def release_soup(soup):
+    """
+    Frees a parse tree as soon as extraction is done. BeautifulSoup nodes
+    reference each other (parent, siblings, next/previous element), so a
+    dropped tree otherwise lingers until the cyclic garbage collector runs;
+    decompose() breaks those links and lets reference counting free it now.
+    """
+    if soup is not None:
+        # decompose() on the BeautifulSoup object itself leaves its children linked
+        for child in list(soup.contents):
+            child.decompose()
+        soup.decompose()
+
+
+def _current_rss():
+    """Resident set size of this process in bytes (0 where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class MemoryMonitor:
+    """
+    Per-request memory measurement, kept as a rolling metric per exam.
+
+    In 'rss' mode a sampler thread reads the resident set size while requests
+    are running; a request's peak is the highest RSS seen during it minus the
+    RSS at its start. In 'tracemalloc' mode the peak comes from Python's own
+    allocation tracing. Both are process-wide, so concurrent requests inflate
+    each other's numbers; the metric is meant for trends and outliers.
+    """
+
+    def __init__(self, mode=MEMORY_TRACE):
+        self.mode = mode if mode in ('rss', 'tracemalloc') else 'off'
+        if self.mode == 'rss' and not _current_rss():
+            self.mode = 'off'
+        self._lock = threading.Lock()
+        self._active = {}
+        self._samples = {}
+        self._sampler = None
+        if self.mode == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _sample(self):
+        while True:
+            time.sleep(RSS_SAMPLE_SECONDS)
+            rss = _current_rss()
+            with self._lock:
+                if not self._active:
+                    self._sampler = None
+                    return
+                for window in self._active.values():
+                    window['peak'] = max(window['peak'], rss)
+
+    def _start(self):
+        token = object()
+        if self.mode == 'tracemalloc':
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            window = {'start': current, 'peak': current}
+        else:
+            rss = _current_rss()
+            window = {'start': rss, 'peak': rss}
+        with self._lock:
+            self._active[token] = window
+            if self.mode == 'rss' and self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name='rss-sampler', daemon=True)
+                self._sampler.start()
+        return token
+
+    def _finish(self, token, exam):
+        if self.mode == 'tracemalloc':
+            end, peak = tracemalloc.get_traced_memory()
+        else:
+            end = peak = _current_rss()
+        with self._lock:
+            window = self._active.pop(token)
+            for other in self._active.values():
+                other['peak'] = max(other['peak'], peak)
+            peak = max(window['peak'], peak)
+            samples = self._samples.get(exam)
+            if samples is None:
+                samples = self._samples[exam] = deque(maxlen=SAMPLES_PER_EXAM)
+            samples.append((peak - window['start'], end - window['start']))
+        return peak - window['start']
+
+    def measure(self, exam):
+        """Route decorator recording the memory used by each POST to a scoring route."""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                from flask import request
+
+                if self.mode == 'off' or request.method != 'POST':
+                    return view(*args, **kwargs)
+                token = self._start()
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    peak = self._finish(token, exam)
+                    print(f"🧠 {exam.upper()} request peak memory +{peak / 1048576:.1f} MB ({self.mode})")
+            return wrapper
+        return decorator
+
+    def stats(self):
+        """Peak and retained bytes per exam over the recent requests."""
+        with self._lock:
+            snapshot = {exam: list(samples) for exam, samples in self._samples.items()}
+        stats = {}
+        for exam, samples in snapshot.items():
+            peaks = sorted(peak for peak, _ in samples)
+            stats[exam] = {
+                'requests': len(peaks),
+                'peak_bytes_max': peaks[-1],
+                'peak_bytes_p50': peaks[len(peaks) // 2],
+                'peak_bytes_p95': peaks[min(int(len(peaks) * 0.95), len(peaks) - 1)],
+                'retained_bytes_last': samples[-1][1],
+            }
+        return {'mode': self.mode, 'max_page_bytes': MAX_PAGE_BYTES, 'exams': stats}
+
+
+# Process-wide monitor shared by the scoring routes
+memory_monitor = MemoryMonitor()
+
+
+def benchmark(paths, repeat=3):
+    """
+    Peak traced bytes per request for each scraper that accepts each page, and
+    the bytes still held once it returns (result included) with the garbage
+    collector paused, i.e. what reference counting alone gives back.
+
+    Returns:
+        list: One dict per (file, exam) with page, peak and retained bytes.
+    """
+    import io
+    import contextlib
+    from scraper import scrape_answer_key
+    from scraper_je import scrape_je_answer_key
+    from scraper_chsl import scrape_chsl_answer_key
+
+    scrapers = {'mts': scrape_answer_key, 'je': scrape_je_answer_key, 'chsl': scrape_chsl_answer_key}
+    rows = []
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    gc.disable()
+    try:
+        for path in paths:
+            for exam, scraper in scrapers.items():
+                peak = retained = None
+                ok = False
+                for _ in range(repeat):
+                    gc.collect()
+                    start, _ = tracemalloc.get_traced_memory()
+                    tracemalloc.reset_peak()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        try:
+                            result = scraper(path, is_file=True)
+                        except Exception:
+                            result = None
+                    current, run_peak = tracemalloc.get_traced_memory()
+                    ok = bool(result)
+                    # The first run also fills the layout and key caches: keep the lowest figures
+                    peak = run_peak - start if peak is None else min(peak, run_peak - start)
+                    retained = current - start if retained is None else min(retained, current - start)
+                    del result
+                    gc.collect()
+                if ok:
+                    rows.append({'file': os.path.basename(path), 'exam': exam, 'page_bytes': os.path.getsize(path),
+                                 'peak_bytes': peak, 'retained_bytes': retained})
+    finally:
+        gc.enable()
+        if not was_tracing:
+            tracemalloc.stop()
+    return rows
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure peak memory per request for each scraper")
+    parser.add_argument('pages', nargs='+', help="Saved answer key HTML files")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'file':<24} {'exam':<5} {'page MB':>8} {'peak MB':>8} {'held MB':>8}")
+    for row in benchmark(args.pages, args.repeat):
+        print(f"{row['file']:<24} {row['exam']:<5} {row['page_bytes'] / 1048576:>8.2f} "
+              f"{row['peak_bytes'] / 1048576:>8.2f} {row['retained_bytes'] / 1048576:>8.2f}")
@@ -0,0 +1,234 @@
+import os
+import time
+import bisect
+import argparse
+import threading
+from collections import OrderedDict
+
+from rank_index import RANK_INDEX_ENABLED, MIN_SCORE, SCORE_STEP, ScoreHistogram, ShiftRankIndex, rank_index
+from result_store import result_store
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Below these sizes a shift's distribution says too little to normalise against
+MIN_SHIFT_SCORES = 30
+MIN_SHIFTS = 2
+
+# Normalisation tables kept for bulk lookups (one per shift)
+MAX_CACHED_TABLES = 256
+
+# Seconds a process reuses the score distributions it last read from the result store
+STORE_REFRESH = float(os.environ.get('MARKSKING_NORMALISATION_REFRESH', '60'))
+
+# The rank index's score grid (stored scores are bucketed onto it)
+_GRID = ScoreHistogram()
+
+
+def _running_totals(counts):
+    running, totals = 0, []
+    for count in counts:
+        running += count
+        totals.append(running)
+    return totals
+
+
+def equipercentile_table(shift_counts, pooled_counts, min_score=MIN_SCORE, step=SCORE_STEP):
+    """
+    Equipercentile mapping of every grid score of one shift onto the pooled
+    distribution of its exam: score s maps to the smallest pooled score whose
+    cumulative share reaches the share of the shift at or below s.
+
+    Args:
+        shift_counts (list): Per-bucket counts of the shift.
+        pooled_counts (list): Per-bucket counts of all shifts of the exam.
+
+    Returns:
+        list: Normalised score for every grid bucket (same length as the counts).
+    """
+    # Shares are compared as integer counts (ceil(k * N / n), at least 1) so the
+    # table agrees exactly with ShiftRankIndex.equipercentile()
+    if NUMPY_AVAILABLE:
+        shift_running = np.cumsum(np.asarray(shift_counts, dtype=np.int64))
+        pooled_running = np.cumsum(np.asarray(pooled_counts, dtype=np.int64))
+        targets = np.maximum(-(-shift_running * pooled_running[-1] // shift_running[-1]), 1)
+        buckets = np.minimum(np.searchsorted(pooled_running, targets, side='left'), len(pooled_counts) - 1)
+        return np.round(min_score + buckets * step, 2).tolist()
+
+    shift_running = _running_totals(shift_counts)
+    pooled_running = _running_totals(pooled_counts)
+    shift_total, pooled_total, last = shift_running[-1], pooled_running[-1], len(pooled_counts) - 1
+    return [
+        round(min_score + min(bisect.bisect_left(pooled_running, max(1, -(-k * pooled_total // shift_total))), last) * step, 2)
+        for k in shift_running
+    ]
+
+
+class NormalisationEngine:
+    """
+    Cross-shift normalisation of an exam's shifts.
+
+    With the result store configured, the distributions are every stored
+    score of each shift (see ResultStore.score_counts()), read in one grouped
+    query per exam and reused for STORE_REFRESH seconds, so every serving
+    process normalises against the same cohort. A score is mapped through its
+    shift's whole-grid table, computed with array operations.
+
+    Without a store, the shift rank index of this process is used instead:
+    single candidates are mapped in O(log B) straight from its Fenwick trees
+    (shift percentile -> pooled quantile), so every new score is reflected
+    immediately. Either way, bulk callers get a table per shift, recomputed
+    only when the distributions have changed.
+    """
+
+    def __init__(self, index=rank_index, store=result_store, max_tables=MAX_CACHED_TABLES, refresh=STORE_REFRESH):
+        self.index = index
+        self.store = store
+        self.max_tables = max_tables
+        self.refresh = refresh
+        self._tables = OrderedDict()
+        self._distributions = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.store is not None or RANK_INDEX_ENABLED
+
+    def _stored_distributions(self, exam):
+        """
+        (loaded_at, {shift: counts}, pooled counts) of an exam's stored scores on
+        the rank index grid, read again once older than `refresh` seconds.
+        """
+        with self._lock:
+            cached = self._distributions.get(exam)
+        if cached is not None and time.monotonic() - cached[0] < self.refresh:
+            return cached
+        shifts, pooled = {}, [0] * _GRID.size
+        for exam_date, exam_time, marks, count in self.store.score_counts(exam):
+            shift = ShiftRankIndex.shift_key(exam, {'exam_date': exam_date, 'exam_time': exam_time})
+            if shift is None or marks is None:
+                continue
+            bucket = _GRID.bucket(marks)
+            shifts.setdefault(shift, [0] * _GRID.size)[bucket] += count
+            pooled[bucket] += count
+        loaded = (time.monotonic(), shifts, pooled)
+        with self._lock:
+            self._distributions[exam] = loaded
+        return loaded
+
+    def _bucket_counts(self, shift):
+        """(shift counts, pooled counts, version) of a shift, or None if it has no scores."""
+        if self.store is None:
+            counts = self.index.bucket_counts(shift)
+            if counts is None:
+                return None
+            return counts[0], counts[1], (sum(counts[0]), sum(counts[1]))
+        loaded_at, shifts, pooled = self._stored_distributions(shift[0])
+        shift_counts = shifts.get(shift)
+        return None if shift_counts is None else (shift_counts, pooled, loaded_at)
+
+    def normalise(self, exam, candidate_info, score):
+        """
+        Returns:
+            dict: {'normalised_marks', 'delta', 'shift_total', 'pooled_total', 'shift_count'}
+                  or None while the shift or exam has too few scores.
+        """
+        if self.store is None:
+            mapping = self.index.equipercentile(exam, candidate_info, score)
+        else:
+            mapping = self._stored_equipercentile(exam, candidate_info, score)
+        if mapping is None or mapping['shift_total'] < MIN_SHIFT_SCORES or mapping['shift_count'] < MIN_SHIFTS:
+            return None
+        mapping['delta'] = round(mapping['normalised_marks'] - score, 2)
+        return mapping
+
+    def _stored_equipercentile(self, exam, candidate_info, score):
+        # Same mapping as ShiftRankIndex.equipercentile(), through the shift's table
+        shift = ShiftRankIndex.shift_key(exam, candidate_info)
+        if shift is None:
+            return None
+        _, shifts, pooled = self._stored_distributions(exam)
+        table = self.table(shift)
+        if table is None or shift not in shifts:
+            return None
+        return {
+            'normalised_marks': table[_GRID.bucket(score)],
+            'shift_total': sum(shifts[shift]),
+            'pooled_total': sum(pooled),
+            'shift_count': len(shifts),
+        }
+
+    def table(self, shift):
+        """Whole-grid normalisation table of a shift, or None if it has no scores."""
+        counts = self._bucket_counts(shift)
+        if counts is None:
+            return None
+        shift_counts, pooled_counts, version = counts
+        if not sum(shift_counts):
+            return None
+        with self._lock:
+            cached = self._tables.get(shift)
+            if cached is not None and cached[0] == version:
+                self._tables.move_to_end(shift)
+                return cached[1]
+        table = equipercentile_table(shift_counts, pooled_counts)
+        with self._lock:
+            self._tables[shift] = (version, table)
+            while len(self._tables) > self.max_tables:
+                self._tables.popitem(last=False)
+        return table
+
+    def normalise_many(self, shift, scores):
+        """Normalised marks for many raw scores of one shift (None if not indexed)."""
+        table = self.table(shift)
+        if table is None:
+            return None
+        size = len(table)
+        if NUMPY_AVAILABLE:
+            buckets = np.clip(np.rint((np.asarray(scores, dtype=np.float64) - MIN_SCORE) / SCORE_STEP), 0, size - 1)
+            return np.asarray(table)[buckets.astype(np.int64)].tolist()
+        return [table[min(max(int(round((score - MIN_SCORE) / SCORE_STEP)), 0), size - 1)] for score in scores]
+
+
+# Process-wide engine over the result store, else the shared rank index
+normalisation_engine = NormalisationEngine()
+
+
+def attach_normalisation(exam, result):
+    """
+    Stores the expected normalised marks in result['normalisation'] when the
+    result store is configured or the rank index is enabled, and the exam has
+    enough scores. Call after attach_standing().
+    """
+    if not normalisation_engine.enabled or not result:
+        return None
+    normalisation = normalisation_engine.normalise(
+        exam, result.get('candidate_info'), result['exam_summary']['total_marks']
+    )
+    result['normalisation'] = normalisation
+    return normalisation
+
+
+if __name__ == "__main__":
+    import random
+
+    parser = argparse.ArgumentParser(description="Simulate shifts of different difficulty and show their normalisation.")
+    parser.add_argument("--shifts", type=int, default=6, help="Number of shifts.")
+    parser.add_argument("--candidates", type=int, default=20000, help="Candidates per shift.")
+    args = parser.parse_args()
+
+    index = ShiftRankIndex()
+    engine = NormalisationEngine(index, store=None)
+    for shift_no in range(args.shifts):
+        info = {'exam_date': '01/01/2025', 'exam_time': f'shift-{shift_no}'}
+        mean = 120 + 12 * shift_no
+        for _ in range(args.candidates):
+            index.record('sim', info, round(random.gauss(mean, 30) * 4) / 4)
+
+    print(f"numpy: {'yes' if NUMPY_AVAILABLE else 'no (pure Python fallback)'}")
+    for shift in index.shifts('sim'):
+        mapped = engine.normalise_many(shift, [100, 150, 200])
+        print(f"{shift[2]:<8} raw 100/150/200 -> normalised {mapped}")
@@ -0,0 +1,256 @@
+import os
+import time
+import importlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from concurrent.futures.process import BrokenProcessPool
+
+
+def _default_workers():
+    # Serverless functions (Vercel, Lambda) cannot run process pools: parse in-process there
+    if os.environ.get('VERCEL') or os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+        return 0
+    cpus = os.cpu_count() or 1
+    if cpus == 1:
+        return 0
+    # One parse process per CPU for the whole host, shared out between the
+    # web server's worker processes (WEB_CONCURRENCY, set by gunicorn.conf.py)
+    web_workers = max(int(os.environ.get('WEB_CONCURRENCY', '1')), 1)
+    return max(cpus // web_workers, 1)
+
+
+# --- Configuration (environment overrides) ---
+# Parse worker processes per serving process (0 parses in the request thread)
+PARSE_WORKERS = int(os.environ.get('MARKSKING_PARSE_WORKERS', _default_workers()))
+# Pages a worker parses before it is replaced (caps memory growth)
+PARSE_MAX_TASKS = int(os.environ.get('MARKSKING_PARSE_MAX_TASKS', '200'))
+# Longest a page may take to parse in a worker (seconds)
+PARSE_TIMEOUT = float(os.environ.get('MARKSKING_PARSE_TIMEOUT', '60'))
+
+# Extraction function per exam: (module, function)
+EXTRACTORS = {
+    'mts': ('scraper', 'extract_answer_key'),
+    'je': ('scraper_je', 'extract_je_answer_key'),
+    'chsl': ('scraper_chsl', 'extract_chsl_answer_key'),
+}
+
+
+class ParseTimeout(Exception):
+    """Raised when a page takes longer than the pool's timeout to parse."""
+
+
+def _extractor(exam):
+    module, function = EXTRACTORS[exam]
+    return getattr(importlib.import_module(module), function)
+
+
+def _warm_worker():
+    """Worker initializer: import the scrapers (and the tree builder) once per process."""
+    for exam in EXTRACTORS:
+        _extractor(exam)
+
+
+def _extract_in_worker(extractor, page_bytes, args):
+    module, function = extractor
+    return getattr(importlib.import_module(module), function)(page_bytes.decode('utf-8'), *args)
+
+
+def _ping():
+    return os.getpid()
+
+
+class ParsePool:
+    """
+    Runs the scrapers' extraction step (parse the page, pull out the candidate
+    details and answer sheet) in a pool of worker processes, so a large page
+    does not hold the GIL that every other request thread of the process needs.
+
+    Pages go in as UTF-8 bytes and come back as the compact extraction, which
+    the calling thread then scores. Scoring stays in the serving process
+    because it uses process-wide state (the shift key index). Workers are
+    replaced after PARSE_MAX_TASKS pages. Without workers (PARSE_WORKERS=0,
+    serverless, or a pool that cannot start) pages are parsed in-process.
+
+    A page that times out retires its pool: new pages go to a fresh one,
+    while the pages already running in the old pool finish there before its
+    workers (the stuck one included) are stopped.
+    """
+
+    def __init__(self, workers=PARSE_WORKERS, max_tasks=PARSE_MAX_TASKS, timeout=PARSE_TIMEOUT):
+        self.workers = workers
+        self.max_tasks = max_tasks
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        # Futures not yet finished, per pool
+        self._running = {}
+        self._lock = threading.Lock()
+        # Bounds the pages queued for the workers; callers beyond that wait their turn
+        self._slots = threading.BoundedSemaphore(max(workers, 1) * 2)
+        self.offloaded = 0
+        self.in_process = 0
+        self.timeouts = 0
+        self.retired = 0
+        self.unavailable = None if workers > 0 else 'disabled'
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is not None and self._pid != os.getpid():
+                # Forked after the pool started (e.g. a preloading server): the pool belongs to the parent
+                self._executor = None
+                self._running = {}
+            if self._executor is None and self.unavailable is None:
+                try:
+                    context = multiprocessing.get_context('forkserver')
+                    options = {'max_workers': self.workers, 'mp_context': context, 'initializer': _warm_worker}
+                    try:
+                        self._executor = ProcessPoolExecutor(max_tasks_per_child=self.max_tasks, **options)
+                    except TypeError:
+                        # Python < 3.11: no worker recycling
+                        self._executor = ProcessPoolExecutor(**options)
+                    self._pid = os.getpid()
+                    print(f"✓ Parse pool started ({self.workers} workers, recycled every {self.max_tasks} pages)")
+                except (OSError, ValueError, ImportError, NotImplementedError) as e:
+                    self.unavailable = str(e)
+                    print(f"⚠️ Parse pool unavailable, parsing in-process: {e}")
+            return self._executor
+
+    def _discard(self, executor):
+        """Drops a pool (its workers included) so the next page starts a fresh one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+            self._running.pop(executor, None)
+        # A worker stuck on a page would keep its CPU until it finished: stop them
+        for process in list((getattr(executor, '_processes', None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _retire(self, executor, stuck):
+        """
+        Sends new pages to a fresh pool and discards this one once the pages
+        still running in it (other than the stuck one) have finished, waiting
+        at most one timeout for them.
+        """
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            others = [future for future in self._running.get(executor, ()) if future is not stuck]
+        self.retired += 1
+
+        def drain():
+            wait(others, timeout=self.timeout)
+            self._discard(executor)
+
+        threading.Thread(target=drain, name='parse-pool-retire', daemon=True).start()
+
+    def warm(self):
+        """
+        Starts the workers (and their imports) ahead of the first request.
+        Workers that cannot start leave this process parsing in-process.
+        """
+        executor = self._pool()
+        if executor is None:
+            return 0
+        started = time.perf_counter()
+        try:
+            futures = [executor.submit(_ping) for _ in range(self.workers * 2)]
+            pids = {future.result(timeout=self.timeout) for future in futures}
+        except (BrokenProcessPool, FutureTimeoutError, OSError) as e:
+            print(f"⚠️ Parse pool workers did not start, parsing in-process: {e!r}")
+            self.unavailable = repr(e)
+            self._discard(executor)
+            return 0
+        print(f"✓ Parse pool warm: {len(pids)} worker(s) in {time.perf_counter() - started:.2f}s")
+        return len(pids)
+
+    def extract(self, exam, html_content, *args):
+        """
+        Runs the exam's extraction function on a page in a worker, or in this
+        thread when no pool is available.
+
+        Returns:
+            The extraction function's return value.
+
+        Raises:
+            ParseTimeout: If the worker took longer than the pool's timeout
+                          (the pool is retired, see the class docstring).
+        """
+        executor = self._pool()
+        if executor is None:
+            self.in_process += 1
+            return _extractor(exam)(html_content, *args)
+
+        with self._slots:
+            future = None
+            try:
+                future = executor.submit(_extract_in_worker, EXTRACTORS[exam], html_content.encode('utf-8'), args)
+                with self._lock:
+                    self._running.setdefault(executor, set()).add(future)
+                extracted = future.result(timeout=self.timeout)
+                self.offloaded += 1
+                return extracted
+            except BrokenProcessPool as e:
+                # A worker died (e.g. killed for memory): start a fresh pool next time, parse this page here
+                print(f"⚠️ Parse pool broken, parsing in-process: {e}")
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = None
+                    self._running.pop(executor, None)
+                self.in_process += 1
+                return _extractor(exam)(html_content, *args)
+            except FutureTimeoutError:
+                print(f"⚠️ Parse worker timed out after {self.timeout:g}s, retiring the pool")
+                self.timeouts += 1
+                self._retire(executor, future)
+                raise ParseTimeout(f"The answer key page took longer than {self.timeout:g} seconds to read.")
+            finally:
+                if future is not None:
+                    with self._lock:
+                        self._running.get(executor, set()).discard(future)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._running = {}
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self):
+        return {'workers': self.workers if self._executor is not None else 0, 'max_tasks': self.max_tasks,
+                'offloaded': self.offloaded, 'in_process': self.in_process, 'timeouts': self.timeouts,
+                'retired': self.retired, 'unavailable': self.unavailable}
+
+
+# Process-wide pool used by the routes (started on first use)
+parse_pool = ParsePool()
+
+
+if __name__ == '__main__':
+    # Throughput check: the same pages parsed by N threads, in-process vs through the pool
+    import io
+    import argparse
+    import contextlib
+    from concurrent.futures import ThreadPoolExecutor
+
+    parser = argparse.ArgumentParser(description="Compare threaded in-process parsing with the parse pool")
+    parser.add_argument('page', help="A saved MTS answer key page")
+    parser.add_argument('--requests', type=int, default=32)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    with open(args.page, encoding='utf-8') as f:
+        page = f.read()
+    pool = ParsePool(workers=max(PARSE_WORKERS, 2))
+    pool.warm()
+    for label, run in (('in-process', lambda _: _extractor('mts')(page)), ('pool', lambda _: pool.extract('mts', page))):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.threads) as threads:
+                extractions = list(threads.map(run, range(args.requests)))
+            elapsed = time.perf_counter() - started
+        assert all(extraction[1].to_dict() == extractions[0][1].to_dict() for extraction in extractions)
+        print(f"{label:>10}: {args.requests} pages in {elapsed:.2f}s ({args.requests / elapsed:.1f} pages/s)")
+    pool.shutdown()
@@ -0,0 +1,117 @@
+import os
+from urllib.parse import urlsplit
+
+from memory_budget import check_page_size
+
+# --- Configuration (environment overrides) ---
+# Hosts answer keys are fetched from; each also covers its subdomains. '*' allows any host.
+ALLOWED_HOSTS = tuple(
+    host.strip().lower().lstrip('.')
+    for host in os.environ.get('MARKSKING_ALLOWED_HOSTS', 'digialm.com,ssccbt.com,ssc.gov.in,ssc.nic.in').split(',')
+    if host.strip()
+)
+# Scan the start of pages for an answer key layout (off: only URLs and sizes are checked)
+PAGE_SCAN_ENABLED = os.environ.get('MARKSKING_PAGE_SCAN', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+# Bytes at the start of a page that must show an answer key layout
+SCAN_BYTES = int(os.environ.get('MARKSKING_PREFLIGHT_SCAN_BYTES', str(256 * 1024)))
+MAX_URL_LENGTH = 2048
+
+# Answer key layouts as (markers all required, markers of which one is required),
+# matched case-insensitively. TCS (digialm) pages put the candidate panel and
+# the first question panels inside div.wrapper near the top of the page.
+TCS_LAYOUT = ((b'wrapper',), (b'main-info-pnl', b'question-pnl', b'menu-tbl', b'rightans', b'grp-cntnr'))
+EDUQUITY_LAYOUT = ((), (b'ssc online examination', b'ssccbt', b'eduquity'))
+EXAM_LAYOUTS = {
+    'mts': (TCS_LAYOUT,),
+    'je': (TCS_LAYOUT,),
+    'chsl': (TCS_LAYOUT, EDUQUITY_LAYOUT),
+}
+EXAM_NAMES = {'mts': 'SSC MTS', 'je': 'SSC JE', 'chsl': 'SSC CHSL'}
+
+
+class InvalidSubmission(ValueError):
+    """Raised for a URL or page that cannot be an answer key (routes answer 422 with the form)."""
+
+
+def host_allowed(host):
+    if '*' in ALLOWED_HOSTS:
+        return True
+    host = (host or '').lower().rstrip('.')
+    return any(host == allowed or host.endswith('.' + allowed) for allowed in ALLOWED_HOSTS)
+
+
+def check_url(url):
+    """
+    Checks that a submitted answer key URL is a plain http(s) URL on an
+    answer key host, before anything is fetched.
+
+    Raises:
+        InvalidSubmission: With a message for the user.
+    """
+    if not url or len(url) > MAX_URL_LENGTH or any(ch.isspace() for ch in url.strip()):
+        raise InvalidSubmission("This does not look like an answer key link.")
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        raise InvalidSubmission("This does not look like an answer key link.")
+    if parts.scheme.lower() not in ('http', 'https') or not parts.hostname:
+        raise InvalidSubmission("Answer key links start with http:// or https://.")
+    if parts.username or parts.password or port not in (None, 80, 443):
+        raise InvalidSubmission("This does not look like an answer key link.")
+    if not host_allowed(parts.hostname):
+        raise InvalidSubmission(f"Links from {parts.hostname} are not supported. Please use the answer key link "
+                                "from the SSC/TCS (digialm.com) or Eduquity (ssccbt.com) website.")
+
+
+def _head(page):
+    """The first SCAN_BYTES of a page (str or bytes), lower-cased bytes."""
+    if isinstance(page, str):
+        page = page[:SCAN_BYTES].encode('utf-8', 'ignore')
+    return page[:SCAN_BYTES].lower()
+
+
+def _matches(layouts, head):
+    return any(all(marker in head for marker in required) and any(marker in head for marker in one_of)
+               for required, one_of in layouts)
+
+
+def matches_layout(exam, page):
+    """True if the start of a page (str or bytes) shows one of the exam's answer key layouts."""
+    return not PAGE_SCAN_ENABLED or _matches(EXAM_LAYOUTS[exam], _head(page))
+
+
+def looks_like_answer_key(page):
+    """True if the start of a page matches any exam's layout (for the fetch layer, which has no exam)."""
+    return not PAGE_SCAN_ENABLED or _matches((TCS_LAYOUT, EDUQUITY_LAYOUT), _head(page))
+
+
+def check_page(exam, page):
+    """
+    Byte-level scan of the start of a page for the exam's answer key layout,
+    before it is parsed.
+
+    Raises:
+        InvalidSubmission: If no layout marker is found.
+    """
+    if not matches_layout(exam, page):
+        raise InvalidSubmission(f"This page is not an {EXAM_NAMES[exam]} answer key. Please submit the answer "
+                                "key (response sheet) page itself.")
+
+
+def check_upload(exam, file):
+    """
+    Checks an uploaded page (werkzeug FileStorage) from its size and first
+    chunk only, without reading the rest, then rewinds it.
+
+    Raises:
+        PageTooLarge: If the file is above the page size budget.
+        InvalidSubmission: If the start of the file shows no answer key layout.
+    """
+    stream = file.stream
+    stream.seek(0, os.SEEK_END)
+    check_page_size(stream.tell())
+    stream.seek(0)
+    head = stream.read(SCAN_BYTES)
+    stream.seek(0)
+    check_page(exam, head)
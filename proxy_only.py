@@ -1,66 +1,268 @@
-import requests
+import re
 import time
-import random
+import codecs
+from json.decoder import scanstring
+from urllib.parse import quote
+
+import requests
+
+from memory_budget import check_page_size
+from preflight import SCAN_BYTES, InvalidSubmission, looks_like_answer_key
+
+# Proxy endpoints ({url} is the answer key URL; query parameters get it
+# URL-encoded, see proxy_url()); async_fetch.py and bypass_utils use them too.
+# AllOrigins' /raw passes the page through as is; /get wraps it in JSON.
+ALLORIGINS_RAW_URL = "https://api.allorigins.win/raw?url={url}"
+ALLORIGINS_URL = "https://api.allorigins.win/get?url={url}"
+THINGPROXY_URL = "https://thingproxy.freeboard.io/fetch/{url}"
+JSONPROXY_URL = "https://jsonp.afeld.me/?url={url}"
+CORS_ANYWHERE_URL = "https://cors-anywhere.herokuapp.com/{url}"
+CORS_ANYWHERE_HEADERS = {
+    'X-Requested-With': 'XMLHttpRequest',
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+PROXY_TIMEOUT = 30
+# Bytes read at a time from streamed proxy responses
+STREAM_CHUNK = 64 * 1024
+
+_CONTENTS_KEY = re.compile(r'(?<!\\)"contents"\s*:\s*(?:"|null)')
+# An escape cut off by the end of a chunk: \u with up to 3 hex digits, or a
+# complete high surrogate whose low half is still to come
+_PARTIAL_ESCAPE = re.compile(r'(?<!\\)(?:\\\\)*(\\u(?:[dD][89abAB][0-9a-fA-F]{2}|[0-9a-fA-F]{0,3}))$')
+
+
+def proxy_url(template, url):
+    """A proxy endpoint for an answer key URL, URL-encoded when it goes in a query parameter."""
+    return template.format(url=quote(url, safe='') if '?' in template else url)
+
+
+def response_charset(content_type):
+    """Charset named by a Content-Type header, else UTF-8 (answer key pages are UTF-8)."""
+    for parameter in (content_type or '').split(';')[1:]:
+        name, _, value = parameter.partition('=')
+        if name.strip().lower() == 'charset' and value.strip():
+            return value.strip().strip('"')
+    return 'utf-8'
+
+
+def _not_an_answer_key():
+    # A strategy failure: the proxy's own error or consent page, or a link to some other page
+    return InvalidSubmission("Response is not an answer key page")
+
+
+class PageReader:
+    """
+    Reads a proxied page as it streams in. A Content-Length above the page
+    size budget is refused before any of the body is read, the body is cut
+    off at the budget, and a page whose first SCAN_BYTES show no answer key
+    layout is dropped right there instead of being downloaded in full.
+    """
+
+    def __init__(self, headers):
+        length = (headers.get('Content-Length') or '').strip()
+        if length.isdigit():
+            check_page_size(int(length))
+        self.charset = response_charset(headers.get('Content-Type'))
+        self.chunks = []
+        self.size = 0
+        self.scanned = False
+
+    def feed(self, chunk):
+        """
+        Adds a chunk of the body.
+
+        Raises:
+            PageTooLarge: Once the body exceeds the page size budget.
+            InvalidSubmission: If the start of the body is not an answer key page.
+        """
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        check_page_size(self.size)
+        if not self.scanned and self.size >= SCAN_BYTES:
+            self._scan()
+
+    def _scan(self):
+        self.scanned = True
+        if not looks_like_answer_key(b''.join(self.chunks)):
+            raise _not_an_answer_key()
+
+    def text(self):
+        """The page, or None for an empty body."""
+        if not self.size:
+            return None
+        if not self.scanned:
+            self._scan()
+        return b''.join(self.chunks).decode(self.charset, 'replace')
+
+
+def iter_until(chunks, deadline):
+    """
+    Passes chunks through until a time.monotonic() deadline (requests' own
+    timeout only bounds each read, not the whole body).
+
+    Raises:
+        requests.Timeout: Once the deadline has passed.
+    """
+    for chunk in chunks:
+        if deadline is not None and time.monotonic() > deadline:
+            raise requests.Timeout("Proxy response took too long")
+        yield chunk
+
+
+def read_page(response, deadline=None):
+    """Reads a streamed requests response through a PageReader."""
+    reader = PageReader(response.headers)
+    for chunk in iter_until(response.iter_content(STREAM_CHUNK), deadline):
+        reader.feed(chunk)
+    return reader.text()
+
+
+def proxy_get(template, url, session=requests, timeout=PROXY_TIMEOUT, headers=None, deadline=None):
+    """Fetches an answer key URL through a proxy endpoint, streamed; None unless the proxy answers 200."""
+    with session.get(proxy_url(template, url), headers=headers, timeout=timeout, stream=True) as response:
+        return read_page(response, deadline) if response.status_code == 200 else None
+
+
+class EnvelopeDecoder:
+    """
+    Extracts the page from an AllOrigins JSON envelope ({"contents": "<page>",
+    "status": {...}}) while it downloads: chunks are decoded from UTF-8 and
+    the 'contents' string is unescaped piece by piece (by the json module's C
+    string scanner), so neither the whole body nor a decoded JSON document is
+    ever built. Everything after the closing quote is ignored. The page is
+    held to the same size budget and first-chunk scan as PageReader's.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self._buffer = ''
+        self._in_string = False
+        self.done = False
+        self.parts = []
+        self.size = 0
+        self.scanned = False
+
+    def feed(self, data):
+        """
+        Consumes a chunk of the response body. Returns True once the page is complete.
+
+        Raises:
+            PageTooLarge: Once the page exceeds the page size budget.
+            InvalidSubmission: If the start of the page is not an answer key page.
+        """
+        if self.done:
+            return True
+        self._buffer += self._decoder.decode(data)
+        if not self._in_string:
+            match = _CONTENTS_KEY.search(self._buffer)
+            if match is None:
+                # Keep enough to recognise the key across chunks
+                self._buffer = self._buffer[-32:]
+                return False
+            if self._buffer[match.end() - 1] != '"':
+                self.done = True
+                return True
+            self._buffer = self._buffer[match.end():]
+            self._in_string = True
+
+        try:
+            piece, end = scanstring(self._buffer, 0, False)
+            self.done = True
+        except ValueError:
+            # No closing quote yet: decode up to the last complete escape and
+            # leave a cut-off one (and a high surrogate before it) for the next chunk
+            end = len(self._buffer)
+            backslashes = 0
+            while backslashes < end and self._buffer[end - 1 - backslashes] == '\\':
+                backslashes += 1
+            end -= backslashes % 2
+            while True:
+                partial = _PARTIAL_ESCAPE.search(self._buffer, max(end - 16, 0), end)
+                if partial is None:
+                    break
+                end = partial.start(1)
+            piece = scanstring(self._buffer[:end] + '"', 0, False)[0]
+        if piece:
+            self.parts.append(piece)
+            self.size += len(piece)
+            check_page_size(self.size)
+        self._buffer = self._buffer[end:]
+        if not self.scanned and self.parts and (self.done or self.size >= SCAN_BYTES):
+            self.scanned = True
+            if not looks_like_answer_key(''.join(self.parts)):
+                raise _not_an_answer_key()
+        return self.done
+
+    def contents(self):
+        """The page, or None if the envelope had no (complete) contents."""
+        if not self.done or not self.parts:
+            return None
+        return ''.join(self.parts)
+
+
+def decode_envelope(chunks):
+    """Runs an EnvelopeDecoder over an iterable of byte chunks; stops reading once the page is complete."""
+    decoder = EnvelopeDecoder()
+    for chunk in chunks:
+        if decoder.feed(chunk):
+            break
+    return decoder.contents()
+
+
+def fetch_allorigins(url, session=requests, timeout=PROXY_TIMEOUT):
+    """
+    AllOrigins API: the raw passthrough endpoint, else the JSON envelope,
+    decoded as it streams in. Both attempts share one timeout. A connection,
+    timeout or HTTP failure of /raw falls through to /get; a page /raw found
+    too large or not an answer key ends the strategy.
+    """
+    deadline = time.monotonic() + timeout
+    try:
+        content = proxy_get(ALLORIGINS_RAW_URL, url, session=session, timeout=timeout, deadline=deadline)
+    except requests.RequestException as e:
+        print(f"AllOrigins /raw failed ({e}), trying /get")
+        content = None
+    if content:
+        return content
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise requests.Timeout(f"AllOrigins did not answer within {timeout}s")
+    with session.get(proxy_url(ALLORIGINS_URL, url), timeout=remaining, stream=True) as response:
+        if response.status_code == 200:
+            return decode_envelope(iter_until(response.iter_content(STREAM_CHUNK), deadline))
+    return None
+
+
+def fetch_thingproxy(url):
+    return proxy_get(THINGPROXY_URL, url)
+
+
+def fetch_jsonproxy(url):
+    return proxy_get(JSONPROXY_URL, url)
+
+
+def fetch_cors_anywhere(url):
+    return proxy_get(CORS_ANYWHERE_URL, url, headers=CORS_ANYWHERE_HEADERS)
+
+
+# Fetch strategies in order of reliability (names are shared with bypass_utils)
+PROXY_STRATEGIES = (
+    ('allorigins', fetch_allorigins),
+    ('thingproxy', fetch_thingproxy),
+    ('jsonproxy', fetch_jsonproxy),
+    ('cors_anywhere', fetch_cors_anywhere),
+)
+
 
 def fetch_with_proxy_only(url):
     """
     Simple proxy-only fetching function for maximum reliability
     """
+    from fetch_pipeline import FetchPipeline
+
     print(f"🌐 Fetching with proxy only: {url}")
-    
-    # Method 1: AllOrigins API
-    try:
-        print("🔄 Trying AllOrigins proxy...")
-        proxy_url = f"https://api.allorigins.win/get?url={url}"
-        response = requests.get(proxy_url, timeout=30)
-        if response.status_code == 200:
-            data = response.json()
-            if 'contents' in data and data['contents']:
-                print("✅ Success with AllOrigins proxy")
-                return data['contents']
-    except Exception as e:
-        print(f"❌ AllOrigins failed: {e}")
-    
-    # Method 2: ThingProxy
-    try:
-        print("🔄 Trying ThingProxy...")
-        proxy_url = f"https://thingproxy.freeboard.io/fetch/{url}"
-        response = requests.get(proxy_url, timeout=30)
-        if response.status_code == 200:
-            print("✅ Success with ThingProxy")
-            return response.text
-    except Exception as e:
-        print(f"❌ ThingProxy failed: {e}")
-    
-    # Method 3: JSONProxy
-    try:
-        print("🔄 Trying JSONProxy...")
-        proxy_url = f"https://jsonp.afeld.me/?url={url}"
-        response = requests.get(proxy_url, timeout=30)
-        if response.status_code == 200:
-            print("✅ Success with JSONProxy")
-            return response.text
-    except Exception as e:
-        print(f"❌ JSONProxy failed: {e}")
-    
-    # Method 4: CORS Anywhere (if available)
-    try:
-        print("🔄 Trying CORS Anywhere...")
-        proxy_url = f"https://cors-anywhere.herokuapp.com/{url}"
-        headers = {
-            'X-Requested-With': 'XMLHttpRequest',
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get(proxy_url, headers=headers, timeout=30)
-        if response.status_code == 200:
-            print("✅ Success with CORS Anywhere")
-            return response.text
-    except Exception as e:
-        print(f"❌ CORS Anywhere failed: {e}")
-    
-    print("❌ All proxy methods failed")
-    raise Exception("Unable to fetch content through any proxy method")
+    return FetchPipeline(PROXY_STRATEGIES).fetch(url)
 
 # Simple wrapper for scraper compatibility
 def make_proxy_only_request(url):
-    return fetch_with_proxy_only(url)
\ No newline at end of file
+    return fetch_with_proxy_only(url)
@@ -0,0 +1,336 @@
+import os
+import heapq
+import hashlib
+import argparse
+import threading
+from array import array
+from collections import OrderedDict
+
+from answer_sheet import SKIPPED, UNMATCHED, UNREAD, OUTCOMES, outcome
+
+# Opt-in: set MARKSKING_QUESTION_STATS=1 to aggregate per-question outcomes per shift
+QUESTION_STATS_ENABLED = os.environ.get('MARKSKING_QUESTION_STATS', '0').strip().lower() in ('1', 'true', 'yes', 'on')
+
+# Sheets buffered before they are folded into the counters
+FLUSH_BATCH = 64
+
+# Shifts kept in memory and recent submissions remembered for duplicate suppression
+MAX_SHIFTS = 512
+MAX_RECENT_SUBMISSIONS = 100000
+
+# A question is only ranked once this many candidates attempted it
+MIN_ATTEMPTS = 20
+
+# Suspected wrong key: one other option takes at least this share of the attempts.
+# Hard questions spread their wrong answers; a wrong key makes candidates converge.
+DISPUTE_SHARE = 0.5
+
+_SALT = os.urandom(16)
+_UNKNOWN_VALUES = {'', 'n/a', 'unknown'}
+
+
+class ShiftQuestionCounters:
+    """
+    Outcome counters of every question of one shift, as parallel arrays.
+
+    right/wrong/skipped/bonus[i] count outcomes of question_ids[i]; options[i]
+    counts how often each option code was chosen, and key[i] is the option code
+    the answer key gives for it.
+    """
+
+    def __init__(self):
+        self.question_ids = []
+        self.positions = {}
+        self.counts = {name: array('L') for name in OUTCOMES}
+        self.options = []
+        self.key = []
+        self.sheets = 0
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def _position(self, question_id, key_code):
+        position = self.positions.get(question_id)
+        if position is None:
+            position = self.positions[question_id] = len(self.question_ids)
+            self.question_ids.append(question_id)
+            for counter in self.counts.values():
+                counter.append(0)
+            self.options.append({})
+            self.key.append(key_code)
+        elif key_code is not None and self.key[position] is None:
+            self.key[position] = key_code
+        return position
+
+    def add_sheet(self, question_wise_data=None, answer_sheet=None, scoring_key=None):
+        """
+        Folds one scored sheet in. With an answer_sheet, each question's outcome
+        is worked out from its chosen code and scoring_key (else the page's key)
+        and options are counted; question_wise_data is only used without one.
+        """
+        self.sheets += 1
+        if answer_sheet:
+            key = scoring_key or answer_sheet['key']
+            # Later duplicates of a question ID win, as in question_wise_data
+            codes = {question_id: (chosen_code, key_code) for question_id, chosen_code, key_code in zip(
+                answer_sheet['question_ids'], answer_sheet['chosen'], key)}
+            questions = ((question_id, outcome(chosen_code, key_code), chosen_code,
+                          None if key_code == UNREAD else key_code)
+                         for question_id, (chosen_code, key_code) in codes.items())
+        else:
+            questions = ((question_id, result, None, None) for question_id, result in question_wise_data.items())
+
+        for question_id, result, chosen_code, key_code in questions:
+            position = self._position(question_id, key_code)
+            counter = self.counts.get(result)
+            if counter is not None:
+                counter[position] += 1
+            if chosen_code not in (None, SKIPPED, UNMATCHED):
+                options = self.options[position]
+                options[chosen_code] = options.get(chosen_code, 0) + 1
+
+    def question(self, position):
+        """Statistics of one question as a dict."""
+        right = self.counts['right'][position]
+        wrong = self.counts['wrong'][position]
+        skipped = self.counts['skipped'][position]
+        bonus = self.counts['bonus'][position]
+        seen = right + wrong + skipped + bonus
+        attempts = right + wrong
+        options = self.options[position]
+        key_code = self.key[position]
+        top_option = max(options, key=options.get) if options else None
+        dispute = self._dispute_share(position)
+        return {
+            'question_id': self.question_ids[position],
+            'seen': seen,
+            'attempts': attempts,
+            'attempt_rate': round(attempts / seen, 4) if seen else 0.0,
+            'accuracy': round(right / attempts, 4) if attempts else None,
+            'bonus': bonus,
+            'key': key_code,
+            'option_counts': dict(options),
+            'most_chosen': top_option,
+            'suspected_wrong_key': attempts >= MIN_ATTEMPTS and dispute >= DISPUTE_SHARE,
+            'dispute_share': round(dispute, 4),
+        }
+
+    def _dispute_share(self, position):
+        """Share of attempts on the most chosen option other than the keyed one."""
+        options = self.options[position]
+        attempts = self.counts['right'][position] + self.counts['wrong'][position]
+        key_code = self.key[position]
+        if not attempts or key_code is None:
+            return 0.0
+        other = max((count for code, count in options.items() if code != key_code), default=0)
+        return min(other / attempts, 1.0)
+
+    def top(self, k=10, by='hardest', min_attempts=MIN_ATTEMPTS):
+        """
+        The k hardest (lowest accuracy) or most disputed questions of the shift.
+
+        Args:
+            k (int): Number of questions to return.
+            by (str): 'hardest' or 'disputed'.
+            min_attempts (int): Ignore questions attempted by fewer candidates.
+        """
+        right, wrong = self.counts['right'], self.counts['wrong']
+        eligible = [i for i in range(len(self.question_ids)) if right[i] + wrong[i] >= max(min_attempts, 1)]
+        if by == 'hardest':
+            best = heapq.nsmallest(k, eligible, key=lambda i: right[i] / (right[i] + wrong[i]))
+        elif by == 'disputed':
+            best = heapq.nlargest(k, eligible, key=self._dispute_share)
+        else:
+            raise ValueError(f"Unknown ranking '{by}' (use 'hardest' or 'disputed')")
+        return [self.question(i) for i in best]
+
+
+class QuestionStats:
+    """
+    Per-shift question statistics with batched updates.
+
+    record() only appends the sheet's compact answer_sheet/scoring_key strings
+    to a pending buffer (O(1) under the lock, without building the result's
+    lazy question breakdown); every FLUSH_BATCH sheets a background thread
+    works out the outcomes and folds the buffer into the counters, and queries
+    flush whatever is left, so scoring requests never pay for the aggregation.
+    """
+
+    def __init__(self, max_shifts=MAX_SHIFTS, max_recent=MAX_RECENT_SUBMISSIONS, flush_batch=FLUSH_BATCH):
+        self.max_shifts = max_shifts
+        self.max_recent = max_recent
+        self.flush_batch = flush_batch
+        self._shifts = OrderedDict()
+        self._recent = OrderedDict()
+        self._pending = []
+        self._flushing = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    @staticmethod
+    def shift_key(exam, candidate_info):
+        candidate_info = candidate_info or {}
+        exam_date = str(candidate_info.get('exam_date', '')).strip()
+        exam_time = str(candidate_info.get('exam_time', '')).strip()
+        if exam_date.lower() in _UNKNOWN_VALUES or exam_time.lower() in _UNKNOWN_VALUES:
+            return None
+        return (exam, exam_date, exam_time)
+
+    def record(self, exam, result):
+        """
+        Queues a scored result (once per roll number within the recent window).
+
+        Returns:
+            bool: True if the sheet was queued.
+        """
+        candidate_info = result.get('candidate_info')
+        shift = self.shift_key(exam, candidate_info)
+        answer_sheet = result.get('answer_sheet')
+        # Results without an answer sheet carry a plain question_wise_data
+        question_wise_data = None if answer_sheet else result.get('question_wise_data')
+        if shift is None or not (answer_sheet or question_wise_data):
+            return False
+        roll_no = str((candidate_info or {}).get('roll_no', '')).strip()
+        digest = None
+        if roll_no.lower() not in _UNKNOWN_VALUES:
+            digest = hashlib.blake2b(repr((shift, roll_no)).encode(), digest_size=8, key=_SALT).digest()
+
+        with self._lock:
+            if digest is not None:
+                if digest in self._recent:
+                    self._recent.move_to_end(digest)
+                    return False
+                self._recent[digest] = None
+                while len(self._recent) > self.max_recent:
+                    self._recent.popitem(last=False)
+            self._pending.append((shift, question_wise_data, answer_sheet, result.get('scoring_key')))
+            due = len(self._pending) >= self.flush_batch and not self._flushing
+            if due:
+                self._flushing = True
+        if due:
+            threading.Thread(target=self._background_flush, daemon=True).start()
+        return True
+
+    def _background_flush(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error flushing question statistics: {e}")
+        finally:
+            with self._lock:
+                self._flushing = False
+
+    def flush(self):
+        """Folds all pending sheets into the per-shift counters."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+            for shift, question_wise_data, answer_sheet, scoring_key in pending:
+                counters = self._shifts.get(shift)
+                if counters is None:
+                    counters = ShiftQuestionCounters()
+                counters.add_sheet(question_wise_data, answer_sheet, scoring_key)
+                with self._lock:
+                    self._shifts[shift] = counters
+                    self._shifts.move_to_end(shift)
+                    while len(self._shifts) > self.max_shifts:
+                        self._shifts.popitem(last=False)
+            return len(pending)
+
+    def shifts(self, exam=None):
+        self.flush()
+        with self._lock:
+            return [shift for shift in self._shifts if exam is None or shift[0] == exam]
+
+    def counters(self, shift):
+        self.flush()
+        with self._lock:
+            return self._shifts.get(shift)
+
+    def top(self, shift, k=10, by='hardest', min_attempts=MIN_ATTEMPTS):
+        """Top-k questions of a shift (see ShiftQuestionCounters.top), [] if unknown."""
+        counters = self.counters(shift)
+        if counters is None:
+            return []
+        with self._flush_lock:
+            return counters.top(k, by, min_attempts)
+
+    def summary(self, exam, k=10, by='hardest'):
+        """Top-k questions of every indexed shift of an exam."""
+        return [
+            {'exam_date': shift[1], 'exam_time': shift[2], 'sheets': self.counters(shift).sheets,
+             'questions': self.top(shift, k, by)}
+            for shift in self.shifts(exam)
+        ]
+
+
+# Process-wide statistics shared by all routes
+question_stats = QuestionStats()
+
+
+def record_question_stats(exam, result, trusted=False):
+    """Queues a scored result (trusted, i.e. fetched from the source site, only) when enabled."""
+    if not QUESTION_STATS_ENABLED or not result or not trusted:
+        return False
+    return question_stats.record(exam, result)
+
+
+if __name__ == "__main__":
+    import time
+    import random
+
+    parser = argparse.ArgumentParser(description="Benchmark question statistics on simulated sheets.")
+    parser.add_argument("--sheets", type=int, default=20000, help="Simulated sheets (one shift).")
+    parser.add_argument("--questions", type=int, default=100, help="Questions per sheet.")
+    args = parser.parse_args()
+
+    question_ids = [f"Q{i:04d}" for i in range(args.questions)]
+    key = ''.join(random.choice('1234') for _ in question_ids)
+    difficulty = [random.random() for _ in question_ids]
+    # Question 0 has a wrong key: most candidates choose the same other option
+    wrong_key = '1' if key[0] != '1' else '2'
+
+    stats = QuestionStats()
+    record_ms = []
+    started = time.perf_counter()
+    for n in range(args.sheets):
+        chosen = []
+        for i, right_code in enumerate(key):
+            roll = random.random()
+            if roll < 0.2:
+                chosen.append(SKIPPED)
+            elif i == 0:
+                chosen.append(wrong_key if roll < 0.8 else right_code)
+            elif roll < 0.2 + 0.8 * (1 - difficulty[i]):
+                chosen.append(right_code)
+            else:
+                chosen.append(random.choice([c for c in '1234' if c != right_code]))
+        question_wise_data = {
+            qid: 'skipped' if c == SKIPPED else ('right' if c == k else 'wrong')
+            for qid, c, k in zip(question_ids, chosen, key)
+        }
+        result = {
+            'candidate_info': {'roll_no': str(n), 'exam_date': '01/01/2025', 'exam_time': '9:00 AM'},
+            'question_wise_data': question_wise_data,
+            'answer_sheet': {'question_ids': question_ids, 'chosen': ''.join(chosen), 'key': key, 'sections': []},
+        }
+        t0 = time.perf_counter()
+        stats.record('sim', result)
+        record_ms.append((time.perf_counter() - t0) * 1000)
+    stats.flush()
+    elapsed = time.perf_counter() - started
+
+    shift = ('sim', '01/01/2025', '9:00 AM')
+    t0 = time.perf_counter()
+    hardest = stats.top(shift, 5, 'hardest')
+    disputed = stats.top(shift, 5, 'disputed')
+    query_ms = (time.perf_counter() - t0) * 1000
+    record_ms.sort()
+    print(f"{args.sheets} sheets in {elapsed:.2f}s (incl. simulation); record() median "
+          f"{record_ms[len(record_ms) // 2]:.4f}ms, p99 {record_ms[int(len(record_ms) * 0.99)]:.3f}ms; "
+          f"top-k queries {query_ms:.2f}ms")
+    print("Hardest:", [(q['question_id'], q['accuracy']) for q in hardest])
+    print("Disputed:", [(q['question_id'], q['key'], q['most_chosen'], q['dispute_share'], q['suspected_wrong_key'])
+                        for q in disputed])
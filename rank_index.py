@@ -0,0 +1,268 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Opt-in: set MARKSKING_RANK_INDEX=1 to collect anonymised scores per shift
+RANK_INDEX_ENABLED = os.environ.get('MARKSKING_RANK_INDEX', '0').strip().lower() in ('1', 'true', 'yes', 'on')
+
+# All marking schemes (+3/-1, +1/-0.25, +2/-0.5) land on a quarter-mark grid
+SCORE_STEP = 0.25
+MIN_SCORE = -200.0
+MAX_SCORE = 400.0
+
+# Shifts kept in memory and recent submissions remembered for duplicate suppression
+MAX_SHIFTS = 1024
+MAX_RECENT_SUBMISSIONS = 100000
+
+# Per-process salt so stored digests cannot be matched back to roll numbers
+_SALT = os.urandom(16)
+
+# candidate_info values that mean "not parsed"
+_UNKNOWN_VALUES = {'', 'n/a', 'unknown'}
+
+
+class ScoreHistogram:
+    """
+    Fenwick (binary indexed) tree over the quarter-mark score grid.
+
+    Inserts, rank and percentile lookups and quantile queries are O(log B),
+    B being the number of grid buckets. Memory is fixed by the grid, not by the
+    number of submissions, so a shift with millions of scores costs the same as
+    one with ten; scores off the grid are rounded to the nearest bucket.
+    """
+
+    def __init__(self, min_score=MIN_SCORE, max_score=MAX_SCORE, step=SCORE_STEP):
+        self.min_score = min_score
+        self.step = step
+        self.size = int(round((max_score - min_score) / step)) + 1
+        self._tree = [0] * (self.size + 1)
+        self.total = 0
+
+    def bucket(self, score):
+        """Grid bucket (0-based) of a score, clamped to the grid."""
+        index = int(round((score - self.min_score) / self.step))
+        return min(max(index, 0), self.size - 1)
+
+    def score_of(self, bucket):
+        return round(self.min_score + bucket * self.step, 2)
+
+    def insert(self, score, count=1):
+        i = self.bucket(score) + 1
+        while i <= self.size:
+            self._tree[i] += count
+            i += i & -i
+        self.total += count
+
+    def _prefix(self, bucket):
+        """Number of scores in buckets [0, bucket]."""
+        i, total = bucket + 1, 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def count_at_or_below(self, score):
+        return self._prefix(self.bucket(score))
+
+    def count_below(self, score):
+        bucket = self.bucket(score)
+        return self._prefix(bucket - 1) if bucket > 0 else 0
+
+    def quantile(self, fraction):
+        """Smallest grid score with at least `fraction` of all scores at or below it."""
+        if not self.total:
+            return None
+        return self.kth_score(int(-(-fraction * self.total // 1)))
+
+    def kth_score(self, k):
+        """Smallest grid score with at least k scores (clamped to 1..total) at or below it."""
+        if not self.total:
+            return None
+        position, remaining = 0, max(1, min(self.total, k))
+        step = 1 << (self.size.bit_length() - 1)
+        while step:
+            nxt = position + step
+            if nxt <= self.size and self._tree[nxt] < remaining:
+                position = nxt
+                remaining -= self._tree[nxt]
+            step >>= 1
+        return self.score_of(position)
+
+    def counts(self):
+        """Per-bucket counts (a plain histogram), for bulk/vector consumers."""
+        counts = [self._prefix(0)]
+        running = counts[0]
+        for bucket in range(1, self.size):
+            value = self._prefix(bucket)
+            counts.append(value - running)
+            running = value
+        return counts
+
+
+class ShiftRankIndex:
+    """
+    Anonymised scores per (exam, exam date, exam time) with rank/percentile lookups.
+
+    Only the score is kept; a salted digest of the roll number is remembered in
+    a bounded window so that double submissions are not counted twice.
+    """
+
+    def __init__(self, max_shifts=MAX_SHIFTS, max_recent=MAX_RECENT_SUBMISSIONS):
+        self.max_shifts = max_shifts
+        self.max_recent = max_recent
+        self._shifts = OrderedDict()
+        self._pooled = {}
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def shift_key(exam, candidate_info):
+        candidate_info = candidate_info or {}
+        exam_date = str(candidate_info.get('exam_date', '')).strip()
+        exam_time = str(candidate_info.get('exam_time', '')).strip()
+        if exam_date.lower() in _UNKNOWN_VALUES or exam_time.lower() in _UNKNOWN_VALUES:
+            return None
+        return (exam, exam_date, exam_time)
+
+    @staticmethod
+    def _submission_digest(shift, candidate_info):
+        roll_no = str((candidate_info or {}).get('roll_no', '')).strip()
+        if roll_no.lower() in _UNKNOWN_VALUES:
+            return None
+        return hashlib.blake2b(repr((shift, roll_no)).encode(), digest_size=8, key=_SALT).digest()
+
+    def histogram(self, shift):
+        with self._lock:
+            return self._shifts.get(shift)
+
+    def shifts(self, exam=None):
+        """Shift keys currently indexed, optionally for one exam."""
+        with self._lock:
+            return [shift for shift in self._shifts if exam is None or shift[0] == exam]
+
+    def record(self, exam, candidate_info, score):
+        """
+        Adds a score to its shift (once per roll number within the recent window).
+
+        Returns:
+            tuple: (shift key or None, True if the score was added)
+        """
+        shift = self.shift_key(exam, candidate_info)
+        if shift is None:
+            return None, False
+        digest = self._submission_digest(shift, candidate_info)
+        with self._lock:
+            if digest is not None:
+                if digest in self._recent:
+                    self._recent.move_to_end(digest)
+                    return shift, False
+                self._recent[digest] = None
+                while len(self._recent) > self.max_recent:
+                    self._recent.popitem(last=False)
+
+            histogram = self._shifts.get(shift)
+            if histogram is None:
+                histogram = self._shifts[shift] = ScoreHistogram()
+                while len(self._shifts) > self.max_shifts:
+                    self._evict_oldest()
+            else:
+                self._shifts.move_to_end(shift)
+            histogram.insert(score)
+            pooled = self._pooled.get(exam)
+            if pooled is None:
+                pooled = self._pooled[exam] = ScoreHistogram()
+            pooled.insert(score)
+        return shift, True
+
+    def _evict_oldest(self):
+        """Drops the least recently used shift and removes its scores from the exam pool."""
+        (exam, _, _), histogram = self._shifts.popitem(last=False)
+        pooled = self._pooled.get(exam)
+        if pooled is None:
+            return
+        for bucket, count in enumerate(histogram.counts()):
+            if count:
+                pooled.insert(histogram.score_of(bucket), -count)
+
+    def standing(self, exam, candidate_info, score):
+        """
+        Returns {'rank', 'total', 'percentile'} for a score within its shift, or
+        None when the shift is unknown. Rank counts strictly higher scores;
+        percentile is the share of scores at or below this one.
+        """
+        shift = self.shift_key(exam, candidate_info)
+        if shift is None:
+            return None
+        with self._lock:
+            histogram = self._shifts.get(shift)
+            if histogram is None or not histogram.total:
+                return None
+            at_or_below = histogram.count_at_or_below(score)
+            total = histogram.total
+        return {
+            'rank': total - at_or_below + 1,
+            'total': total,
+            'percentile': round(100.0 * at_or_below / total, 2),
+        }
+
+    def equipercentile(self, exam, candidate_info, score):
+        """
+        Maps a score to the pooled (all-shift) distribution of its exam at the same
+        percentile it holds within its own shift. O(log B).
+
+        Returns:
+            dict: {'normalised_marks', 'shift_total', 'pooled_total', 'shift_count'}
+                  or None when the shift or exam has no scores yet.
+        """
+        shift = self.shift_key(exam, candidate_info)
+        if shift is None:
+            return None
+        with self._lock:
+            histogram = self._shifts.get(shift)
+            pooled = self._pooled.get(exam)
+            if histogram is None or not histogram.total or pooled is None or not pooled.total:
+                return None
+            # Same share of the pool, in exact integer arithmetic
+            target = -(-histogram.count_at_or_below(score) * pooled.total // histogram.total)
+            return {
+                'normalised_marks': pooled.kth_score(target),
+                'shift_total': histogram.total,
+                'pooled_total': pooled.total,
+                'shift_count': sum(1 for key in self._shifts if key[0] == exam),
+            }
+
+    def bucket_counts(self, shift):
+        """
+        Copies of the per-bucket counts of a shift and of its exam pool, taken
+        under the lock, for bulk (vectorised) consumers.
+
+        Returns:
+            tuple: (shift counts, pooled counts) on the ScoreHistogram grid, or None
+        """
+        with self._lock:
+            histogram = self._shifts.get(shift)
+            pooled = self._pooled.get(shift[0])
+            if histogram is None or pooled is None:
+                return None
+            return histogram.counts(), pooled.counts()
+
+
+# Process-wide index shared by all routes
+rank_index = ShiftRankIndex()
+
+
+def attach_standing(exam, result, trusted=False):
+    """
+    Records a scored result (trusted, i.e. fetched from the source site, only)
+    and stores its shift standing in result['standing'] when the index is enabled.
+    """
+    if not RANK_INDEX_ENABLED or not result:
+        return None
+    candidate_info = result.get('candidate_info')
+    score = result['exam_summary']['total_marks']
+    if trusted:
+        rank_index.record(exam, candidate_info, score)
+    standing = rank_index.standing(exam, candidate_info, score)
+    result['standing'] = standing
+    return standing
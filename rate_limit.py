@@ -0,0 +1,296 @@
+import os
+import hmac
+import time
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+
+# --- Configuration (environment overrides) ---
+RATE_LIMIT_ENABLED = os.environ.get('MARKSKING_RATE_LIMIT', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+# memory:// (per worker) or redis://[:password@]host[:port][/db] (shared by all workers)
+RATE_LIMIT_URL = os.environ.get('MARKSKING_RATE_LIMIT_URL', 'memory://')
+# Client buckets kept per budget by the in-memory backend
+RATE_LIMIT_MAX_CLIENTS = int(os.environ.get('MARKSKING_RATE_LIMIT_MAX_CLIENTS', '100000'))
+# Proxies in front of the app whose X-Forwarded-For entries are trusted (1 on Vercel)
+PROXY_HOPS = int(os.environ.get('MARKSKING_PROXY_HOPS', '1' if os.environ.get('VERCEL') else '0'))
+
+# API keys issued to scripted clients (comma-separated); each gets its own budget.
+# Unknown keys are ignored: the client is limited by its IP address.
+API_KEYS = tuple(key.strip() for key in os.environ.get('MARKSKING_API_KEYS', '').split(',') if key.strip())
+_API_KEY_DIGESTS = tuple(hashlib.sha256(key.encode('utf-8')).digest() for key in API_KEYS)
+
+# WSGI environ key naming the budget a server layer has already charged for the request
+CHECKED_ENVIRON_KEY = 'marksking.rate_checked'
+
+
+def _budget(name, burst, per_minute):
+    return (int(os.environ.get(f'MARKSKING_RATE_{name}_BURST', burst)),
+            float(os.environ.get(f'MARKSKING_RATE_{name}_PER_MINUTE', per_minute)))
+
+
+# Token bucket per client and budget: (burst capacity, tokens refilled per minute).
+# A URL submission costs a full fetch and parse; an upload only the parse.
+# A bulk request spends 'bulk' once, then one URL token per row: from 'url'
+# for anonymous clients, from 'bulk_url' for clients with an issued API key.
+BUDGETS = {
+    'url': _budget('URL', 5, 6),
+    'upload': _budget('UPLOAD', 10, 30),
+    'bulk': _budget('BULK', 2, 0.5),
+    'bulk_url': _budget('BULK_URL', 500, 60),
+}
+
+
+class Decision:
+    """Outcome of a rate limit check."""
+
+    __slots__ = ('allowed', 'remaining', 'retry_after')
+
+    def __init__(self, allowed, remaining, retry_after=0):
+        self.allowed = allowed
+        self.remaining = remaining
+        self.retry_after = retry_after
+
+    def __bool__(self):
+        return self.allowed
+
+
+def _decision(allowed, tokens, cost, rate):
+    """Builds a Decision; retry_after is the time until `cost` tokens are available again."""
+    retry_after = 0 if allowed else max(int((cost - tokens) / rate) + 1, 1)
+    return Decision(allowed, int(tokens), retry_after)
+
+
+class MemoryRateLimiter:
+    """
+    Token buckets in this process, bounded in memory.
+
+    Buckets are kept in last-use order. A bucket idle for its full refill time
+    is full again, i.e. the same as having no bucket, so such buckets are
+    dropped from the front as new clients arrive (amortised O(1) per check).
+    Past max_clients the least recently used buckets are dropped as well;
+    those clients simply start over with a full bucket.
+    """
+
+    name = 'memory'
+
+    def __init__(self, max_clients=RATE_LIMIT_MAX_CLIENTS):
+        self.max_clients = max_clients
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, budget, client, capacity, per_minute, cost=1):
+        rate = per_minute / 60.0
+        horizon = capacity / rate if rate > 0 else float('inf')
+        now = time.monotonic()
+        with self._lock:
+            buckets = self._buckets.get(budget)
+            if buckets is None:
+                buckets = self._buckets[budget] = OrderedDict()
+            state = buckets.pop(client, None)
+            if state is None:
+                tokens = capacity
+            else:
+                tokens = min(capacity, state[0] + (now - state[1]) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            buckets[client] = (tokens, now)
+
+            # Expire refilled buckets, then enforce the size bound
+            while buckets:
+                oldest_client, (_, updated) = next(iter(buckets.items()))
+                if now - updated < horizon and len(buckets) <= self.max_clients:
+                    break
+                del buckets[oldest_client]
+        return _decision(allowed, tokens, cost, rate)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(buckets) for buckets in self._buckets.values())
+
+
+# Atomic token bucket in Redis: the state is "tokens updated_ms", expiring once refilled
+_REDIS_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local tokens = capacity
+local state = redis.call('GET', KEYS[1])
+if state then
+  local space = string.find(state, ' ')
+  local updated = tonumber(string.sub(state, space + 1))
+  tokens = math.min(capacity, tonumber(string.sub(state, 1, space - 1)) + math.max(0, now - updated) * rate)
+end
+local allowed = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+end
+redis.call('SET', KEYS[1], string.format('%.4f %d', tokens, now), 'PX', ARGV[5])
+return {allowed, string.format('%.4f', tokens)}
+"""
+
+
+class RedisRateLimiter:
+    """
+    Token buckets shared by every worker through Redis. Each check is one
+    EVALSHA of a small script, so concurrent workers cannot over-spend a
+    bucket, and keys expire as soon as the bucket would be full again. If
+    Redis is unreachable requests are allowed (the limiter fails open).
+    """
+
+    name = 'redis'
+
+    def __init__(self, client, prefix='rl:'):
+        self.client = client
+        self.prefix = client.prefix + prefix
+        self._sha = None
+
+    def _eval(self, keys, args):
+        if self._sha is None:
+            self._sha = self.client.command('SCRIPT', 'LOAD', _REDIS_TAKE_SCRIPT).decode()
+        try:
+            return self.client.command('EVALSHA', self._sha, len(keys), *keys, *args)
+        except RuntimeError as e:
+            if not str(e).startswith('NOSCRIPT'):
+                raise
+            return self.client.command('EVAL', _REDIS_TAKE_SCRIPT, len(keys), *keys, *args)
+
+    def take(self, budget, client, capacity, per_minute, cost=1):
+        rate = per_minute / 60000.0
+        horizon_ms = int(capacity / rate) + 1000 if rate > 0 else 86400000
+        try:
+            allowed, tokens = self._eval([f"{self.prefix}{budget}:{client}"],
+                                         [capacity, repr(rate), int(time.time() * 1000), cost, horizon_ms])
+        except Exception as e:
+            print(f"⚠️ Rate limiter unavailable, allowing request: {e}")
+            return Decision(True, capacity)
+        return _decision(bool(allowed), float(tokens), cost, per_minute / 60.0)
+
+
+def limiter_from_url(url):
+    """Builds a limiter from memory:// or redis://[:password@]host[:port][/db]."""
+    if url.startswith('redis://'):
+        from cache_backends import cache_from_url
+        return RedisRateLimiter(cache_from_url(url))
+    if url.startswith('memory://'):
+        return MemoryRateLimiter()
+    raise ValueError(f"Unsupported rate limit URL '{url}'")
+
+
+try:
+    rate_limiter = limiter_from_url(RATE_LIMIT_URL)
+except Exception as e:
+    print(f"⚠️ Rate limit backend unavailable ({RATE_LIMIT_URL}), using memory: {e}")
+    rate_limiter = MemoryRateLimiter()
+
+
+def issued_key(api_key):
+    """The digest of an X-API-Key value if it is one of API_KEYS (compared in constant time), else None."""
+    if not api_key or not _API_KEY_DIGESTS:
+        return None
+    digest = hashlib.sha256(api_key.encode('utf-8')).digest()
+    matched = False
+    for issued in _API_KEY_DIGESTS:
+        # No early exit: the time taken does not depend on which key matched
+        matched |= hmac.compare_digest(digest, issued)
+    return digest if matched else None
+
+
+def client_key(request):
+    """
+    Identifies the client: an issued X-API-Key (so keyed clients get their own
+    budget wherever they connect from), else its IP address. Keys that were
+    not issued are ignored, so made-up keys cannot buy fresh budgets.
+    """
+    digest = issued_key(request.headers.get('X-API-Key'))
+    if digest is not None:
+        return 'key:' + digest.hex()[:32]
+    address = request.remote_addr
+    if PROXY_HOPS:
+        forwarded = [hop.strip() for hop in request.headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+        if len(forwarded) >= PROXY_HOPS:
+            address = forwarded[-PROXY_HOPS]
+    return 'ip:' + (address or 'unknown')
+
+
+def row_budget(request):
+    """The budget a bulk request's rows are charged to (see BUDGETS)."""
+    return 'bulk_url' if issued_key(request.headers.get('X-API-Key')) is not None else 'url'
+
+
+def check_rate(request, budget, cost=1):
+    """Spends `cost` tokens of the client's budget. Returns a Decision (always allowed when disabled)."""
+    capacity, per_minute = BUDGETS[budget]
+    if not RATE_LIMIT_ENABLED:
+        return Decision(True, capacity)
+    return rate_limiter.take(budget, client_key(request), capacity, per_minute, cost)
+
+
+def rate_limited(template):
+    """
+    Route decorator for the scoring routes: POSTs with an answer key URL spend
+    the 'url' budget, uploads the 'upload' budget. Over budget, the form is
+    shown again with HTTP 429 and Retry-After.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import request, flash, render_template
+
+            if request.method != 'POST':
+                return view(*args, **kwargs)
+            budget = 'url' if request.form.get('ans_key_url') else 'upload'
+            if request.environ.get(CHECKED_ENVIRON_KEY) == budget:
+                # Already spent by the ASGI entry point before it fetched the page
+                return view(*args, **kwargs)
+            decision = check_rate(request, budget)
+            if not decision:
+                print(f"🚦 Rate limited {client_key(request)} ({budget}); retry after {decision.retry_after}s")
+                kind = 'answer key links' if budget == 'url' else 'uploads'
+                flash(f'Too many {kind} from your connection. Please try again in {decision.retry_after} seconds.',
+                      'warning')
+                return render_template(template), 429, {'Retry-After': str(decision.retry_after)}
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+if __name__ == '__main__':
+    # Memory-bound check: a flood of distinct clients against the in-memory limiter
+    import argparse
+    import tracemalloc
+
+    parser = argparse.ArgumentParser(description="Exercise the rate limiter with many distinct clients")
+    parser.add_argument('--clients', type=int, default=1000000)
+    parser.add_argument('--redis-url', help="Also check a Redis-protocol server, e.g. redis://localhost:6379/15.")
+    args = parser.parse_args()
+
+    limiter = MemoryRateLimiter(max_clients=100000)
+    assert [bool(limiter.take('url', 'ip:a', 3, 60)) for _ in range(4)] == [True, True, True, False]
+    assert limiter.take('url', 'ip:a', 3, 60).retry_after == 1
+    assert limiter.take('upload', 'ip:a', 3, 60)
+
+    started = time.perf_counter()
+    for number in range(args.clients):
+        limiter.take('url', f"ip:{number}", 5, 6)
+    elapsed = time.perf_counter() - started
+    print(f"{args.clients} clients in {elapsed:.2f}s ({elapsed / args.clients * 1e6:.1f} us/check); "
+          f"{len(limiter)} buckets kept")
+
+    # Memory of a full limiter (traced separately: tracing slows every check)
+    tracemalloc.start()
+    limiter = MemoryRateLimiter(max_clients=100000)
+    for number in range(150000):
+        limiter.take('url', f"ip:{number}", 5, 6)
+    current, peak = tracemalloc.get_traced_memory()
+    print(f"{len(limiter)} buckets: {current / 1e6:.1f} MB current, {peak / 1e6:.1f} MB peak")
+
+    if args.redis_url:
+        shared = limiter_from_url(args.redis_url)
+        client = f"selftest:{time.time()}"
+        outcomes = [bool(shared.take('url', client, 3, 60)) for _ in range(4)]
+        assert outcomes == [True, True, True, False], outcomes
+        print("✓ Redis limiter")
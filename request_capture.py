@@ -0,0 +1,340 @@
+import os
+import re
+import io
+import json
+import gzip
+import time
+import uuid
+import pstats
+import argparse
+import cProfile
+import tempfile
+import threading
+import functools
+import contextlib
+import traceback
+from urllib.parse import urlparse
+
+# --- Configuration (environment overrides) ---
+CAPTURE_DIR = os.environ.get('MARKSKING_CAPTURE_DIR', os.path.join(tempfile.gettempdir(), 'marksking-captures'))
+CAPTURE_SLOW_MS = float(os.environ.get('MARKSKING_CAPTURE_SLOW_MS', '8000'))
+CAPTURE_RING_SIZE = int(os.environ.get('MARKSKING_CAPTURE_RING_SIZE', '50'))
+# Opt-in: captured pages are written to disk, if anonymised
+CAPTURE_ENABLED = os.environ.get('MARKSKING_CAPTURE', '0').strip().lower() in ('1', 'true', 'yes', 'on')
+
+# The only candidate-table labels whose values are kept (needed to replay
+# shift-level logic); every other value is redacted, e.g. "Exam Centre Name"
+_KEEP_LABELS = frozenset({'exam date', 'exam time', 'subject', 'test date', 'test time'})
+_FIRST_TABLE = re.compile(r'<table\b.*?</table\s*>', re.IGNORECASE | re.DOTALL)
+# Rows and their td/th cells, closing tags optional
+_INFO_ROW = re.compile(r'<tr\b[^>]*>(.*?)(?=</tr\s*>|<tr\b|$)', re.IGNORECASE | re.DOTALL)
+_INFO_CELL = re.compile(r'<t[dh]\b[^>]*>(.*?)(?=</t[dh]\s*>|<t[dh]\b|</tr\s*>|$)', re.IGNORECASE | re.DOTALL)
+_ANY_TAG = re.compile(r'<[^>]*>')
+
+_local = threading.local()
+
+
+class RequestCapture:
+    """Stage timings, fetch trace and page of one scoring request."""
+
+    def __init__(self, route, exam, source_kind, source=None):
+        self.case_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.route = route
+        self.exam = exam
+        self.source_kind = source_kind
+        self.source = _strip_query(source) if source_kind == 'url' else None
+        self.started = time.perf_counter()
+        self._last_checkpoint = self.started
+        self.stages = []
+        self.fetch_trace = []
+        self.html = None
+        self.result = None
+        self.error = None
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def checkpoint(self, name):
+        """Records the time spent since the previous checkpoint as stage `name`."""
+        now = time.perf_counter()
+        self.stages.append({'stage': name, 'ms': round((now - self._last_checkpoint) * 1000, 1)})
+        self._last_checkpoint = now
+
+    def should_save(self):
+        """Slow or failed requests that actually reached a scraper are kept."""
+        if not self.stages and not self.fetch_trace:
+            return False
+        return self.error is not None or self.result is None or self.elapsed_ms() >= CAPTURE_SLOW_MS
+
+    def to_case(self):
+        candidate_info = (self.result or {}).get('candidate_info') or {}
+        return {
+            'case_id': self.case_id,
+            'captured_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'route': self.route,
+            'exam': self.exam,
+            'source_kind': self.source_kind,
+            'source': self.source,
+            'elapsed_ms': round(self.elapsed_ms(), 1),
+            'outcome': 'error' if self.error else ('failed' if self.result is None else 'slow'),
+            'error': self.error,
+            'stages': self.stages,
+            'fetch_trace': self.fetch_trace,
+            'total_marks': ((self.result or {}).get('exam_summary') or {}).get('total_marks'),
+            'html': anonymise_html(self.html, candidate_info) if self.html else None,
+        }
+
+
+def _strip_query(url):
+    """Drops the query string and fragment (digialm URLs carry per-candidate tokens)."""
+    if not url:
+        return url
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+
+
+def anonymise_html(html_content, candidate_info=None):
+    """
+    Removes personal details from an answer key page.
+
+    Rows of the first (candidate) table are read as label/value cell pairs (td
+    or th, any number per row). Every value is replaced unless its label is one
+    of _KEEP_LABELS (ignoring case, spacing and colons); a cell without a value
+    cell is replaced unless it reads "<kept label>: value". This does not depend
+    on the page having been parsed. Any parsed candidate_info value (roll number,
+    name, venue) is also replaced wherever else it appears on the page.
+    """
+    def redact_row(match):
+        row = match.group(0)
+        cells = list(_INFO_CELL.finditer(row))
+        redact = []
+        for index in range(1, len(cells), 2):
+            if _label(cells[index - 1].group(1)) not in _KEEP_LABELS:
+                redact.append(cells[index])
+        if len(cells) % 2:
+            last = cells[-1]
+            if _label(_ANY_TAG.sub('', last.group(1)).split(':', 1)[0]) not in _KEEP_LABELS:
+                redact.append(last)
+        for cell in reversed(redact):
+            if cell.group(1).strip():
+                row = row[:cell.start(1)] + 'REDACTED' + row[cell.end(1):]
+        return row
+
+    first_table = _FIRST_TABLE.search(html_content)
+    if first_table:
+        redacted = _INFO_ROW.sub(redact_row, first_table.group(0))
+        html_content = html_content[:first_table.start()] + redacted + html_content[first_table.end():]
+
+    for field in ('roll_no', 'cand_name', 'venue_name'):
+        value = str((candidate_info or {}).get(field, '')).strip()
+        if len(value) >= 3 and value.lower() not in ('unknown', 'n/a'):
+            html_content = html_content.replace(value, 'REDACTED')
+    return html_content
+
+
+def _label(cell_html):
+    """A cell's text, lowercased, without tags, colons or extra spacing."""
+    text = _ANY_TAG.sub('', cell_html).replace('&nbsp;', ' ').replace(':', ' ')
+    return ' '.join(text.lower().split())
+
+
+# --- Per-request hooks (no-ops when no capture is active on this thread) ---
+
+def current_capture():
+    return getattr(_local, 'capture', None)
+
+
+def capture_checkpoint(name):
+    """Ends stage `name` of the active capture, if any (e.g. 'fetch', 'parse', 'score')."""
+    capture = current_capture()
+    if capture is not None:
+        capture.checkpoint(name)
+
+
+def note_fetch(method, ok, elapsed_ms, detail=None):
+    """Appends one fetch attempt (proxy, direct, ...) to the active capture's trace."""
+    capture = current_capture()
+    if capture is not None:
+        capture.fetch_trace.append({'method': method, 'ok': bool(ok), 'ms': round(elapsed_ms, 1), 'detail': detail})
+
+
+def note_html(html_content):
+    capture = current_capture()
+    if capture is not None:
+        capture.html = html_content
+
+
+def note_result(result):
+    capture = current_capture()
+    if capture is not None:
+        capture.result = result
+
+
+# --- Ring storage ---
+
+def _case_files(capture_dir=None):
+    capture_dir = capture_dir or CAPTURE_DIR
+    if not os.path.isdir(capture_dir):
+        return []
+    return sorted(
+        os.path.join(capture_dir, name) for name in os.listdir(capture_dir) if name.endswith('.json.gz')
+    )
+
+
+def save_case(case, capture_dir=None, ring_size=None):
+    """Writes one case and evicts the oldest beyond the ring size."""
+    capture_dir = capture_dir or CAPTURE_DIR
+    ring_size = ring_size or CAPTURE_RING_SIZE
+    os.makedirs(capture_dir, exist_ok=True)
+    path = os.path.join(capture_dir, f"{case['case_id']}.json.gz")
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        json.dump(case, f)
+    for stale in _case_files(capture_dir)[:-ring_size]:
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+    return path
+
+
+def load_case(case_id, capture_dir=None):
+    for path in _case_files(capture_dir):
+        if os.path.basename(path).startswith(case_id):
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                return json.load(f)
+    raise FileNotFoundError(f"No captured case matching '{case_id}'")
+
+
+def list_cases(capture_dir=None):
+    cases = []
+    for path in _case_files(capture_dir):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            case = json.load(f)
+        case.pop('html', None)
+        cases.append(case)
+    return cases
+
+
+# --- Flask integration ---
+
+def capture_slow_requests(exam):
+    """
+    Route decorator: captures POST requests to a scoring route and saves the
+    case when it is slow (>= MARKSKING_CAPTURE_SLOW_MS) or ends without a result.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import request
+
+            if not CAPTURE_ENABLED or request.method != 'POST':
+                return view(*args, **kwargs)
+
+            ans_key_url = request.form.get('ans_key_url')
+            capture = RequestCapture(request.path, exam, 'url' if ans_key_url else 'file', ans_key_url)
+            _local.capture = capture
+            try:
+                return view(*args, **kwargs)
+            except Exception:
+                capture.error = traceback.format_exc(limit=5)
+                raise
+            finally:
+                _local.capture = None
+                if capture.should_save():
+                    try:
+                        case = capture.to_case()
+                        path = save_case(case)
+                        print(f"📼 Captured {case['outcome']} request {case['case_id']} -> {path}")
+                    except Exception as e:
+                        print(f"Error saving request capture: {e}")
+        return wrapper
+    return decorator
+
+
+# --- Offline replay ---
+
+def _scraper_for(exam):
+    if exam == 'mts':
+        from scraper import scrape_answer_key
+        return scrape_answer_key
+    if exam == 'je':
+        from scraper_je import scrape_je_answer_key
+        return scrape_je_answer_key
+    if exam == 'chsl':
+        from scraper_chsl import scrape_chsl_answer_key
+        return scrape_chsl_answer_key
+    raise ValueError(f"Unknown exam '{exam}'")
+
+
+def replay_case(case, sort='cumulative', limit=25, quiet=True):
+    """
+    Re-runs a captured page through the current scraper under cProfile. A
+    page the pre-flight checks refuse gives a None result.
+
+    Returns:
+        tuple: (result, elapsed_ms, profile stats text)
+    """
+    from preflight import InvalidSubmission
+    from memory_budget import PageTooLarge
+
+    if not case.get('html'):
+        raise ValueError(f"Case {case['case_id']} has no page (the fetch itself failed)")
+    scraper = _scraper_for(case['exam'])
+    rejected = None
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as temp_file:
+        temp_file.write(case['html'])
+        filepath = temp_file.name
+    profiler = cProfile.Profile()
+    try:
+        output = io.StringIO() if quiet else None
+        with contextlib.redirect_stdout(output) if output else contextlib.nullcontext():
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                result = scraper(filepath, is_file=True)
+            except (InvalidSubmission, PageTooLarge) as e:
+                # Refused before parsing, as the routes would (422/413)
+                result, rejected = None, e
+            finally:
+                profiler.disable()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+    finally:
+        os.remove(filepath)
+    if rejected is not None:
+        print(f"⚠️ Case {case['case_id']} was refused: {rejected}")
+    stats_text = io.StringIO()
+    pstats.Stats(profiler, stream=stats_text).sort_stats(sort).print_stats(limit)
+    return result, elapsed_ms, stats_text.getvalue()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and replay captured slow or failed scoring requests.")
+    parser.add_argument("--dir", help=f"Capture directory (default: {CAPTURE_DIR}).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="List captured cases, oldest first.")
+    replay_parser = commands.add_parser("replay", help="Re-run captured cases through the current scrapers under the profiler.")
+    replay_parser.add_argument("case_id", nargs="?", help="Case ID (or prefix). Omit with --all.")
+    replay_parser.add_argument("--all", action="store_true", help="Replay every captured case that has a page.")
+    replay_parser.add_argument("--sort", default="cumulative", help="pstats sort key (default: cumulative).")
+    replay_parser.add_argument("--limit", type=int, default=25, help="Number of profile rows to print.")
+
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for case in list_cases(args.dir):
+            stages = ', '.join(f"{s['stage']}={s['ms']}ms" for s in case['stages'])
+            print(f"{case['case_id']}  {case['route']:<8} {case['outcome']:<7} {case['elapsed_ms']:>9.1f}ms  {stages}")
+    else:
+        if args.all:
+            cases = [load_case(os.path.basename(p)[:-len('.json.gz')], args.dir) for p in _case_files(args.dir)]
+            cases = [case for case in cases if case.get('html')]
+        elif args.case_id:
+            cases = [load_case(args.case_id, args.dir)]
+        else:
+            parser.error("replay needs a case_id or --all")
+        for case in cases:
+            result, elapsed_ms, stats_text = replay_case(case, sort=args.sort, limit=args.limit)
+            marks = ((result or {}).get('exam_summary') or {}).get('total_marks')
+            print(f"=== {case['case_id']} [{case['exam']}] captured {case['outcome']} in {case['elapsed_ms']}ms; "
+                  f"replayed in {elapsed_ms:.1f}ms, total_marks={marks}")
+            print(stats_text)
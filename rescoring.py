@@ -0,0 +1,267 @@
+import json
+import time
+import argparse
+
+from answer_sheet import BONUS, OUTCOMES, outcome
+from result_store import OUTCOME_CODES, STORE_PATH, ResultStore
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+_OUTCOME_INDEX = {name: index for index, name in enumerate(OUTCOMES)}
+_CODE_INDEX = {OUTCOME_CODES[name]: index for name, index in _OUTCOME_INDEX.items()}
+
+
+def marking_scheme(exam):
+    """
+    Returns (marks per right/bonus question, marks lost per wrong answer,
+    section groups without negative marking) as used by the exam's scraper.
+    """
+    if exam == 'mts':
+        import scraper
+        return scraper.EACH_QUE_POS_MARKS, scraper.EACH_QUE_NEG_MARKS, scraper.NO_NEGATIVE_GROUPS
+    if exam == 'je':
+        import scraper_je
+        return scraper_je.EACH_QUE_POS_MARKS, scraper_je.EACH_QUE_NEG_MARKS, ()
+    if exam == 'chsl':
+        import scraper_chsl
+        return scraper_chsl.POS_MARKS, scraper_chsl.NEG_MARKS, ()
+    raise ValueError(f"Unknown exam '{exam}'")
+
+
+class KeyRevision:
+    """
+    A published change to one shift's answer key.
+
+    Args:
+        exam (str): 'mts', 'je' or 'chsl'.
+        exam_date (str), exam_time (str): The shift, exactly as parsed from the pages.
+        changed (dict): {question_id: new correct option}.
+        bonus (iterable): Question IDs dropped from the paper (marks for everyone).
+    """
+
+    def __init__(self, exam, exam_date, exam_time, changed=None, bonus=()):
+        self.exam = exam
+        self.exam_date = exam_date
+        self.exam_time = exam_time
+        self.codes = {str(qid): str(code) for qid, code in (changed or {}).items()}
+        for qid in bonus:
+            self.codes[str(qid)] = BONUS
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['exam'], data['exam_date'], data['exam_time'], data.get('changed'), data.get('bonus', ()))
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    @property
+    def shift(self):
+        return (self.exam, self.exam_date, self.exam_time)
+
+
+def _score_deltas(entries, sheet_count, exam):
+    """
+    Marks gained per entry and per sheet for a batch of revised questions.
+
+    entries is a list of (sheet index, section group, old outcome index,
+    new outcome index); all entries are scored in one array pass.
+    """
+    pos_marks, neg_marks, no_negative_groups = marking_scheme(exam)
+    # Marks of each outcome in OUTCOMES order: right, wrong, skipped, bonus
+    with_negative = [pos_marks, -neg_marks, 0.0, pos_marks]
+    without_negative = [pos_marks, 0.0, 0.0, pos_marks]
+
+    if NUMPY_AVAILABLE:
+        if not entries:
+            return [], [0.0] * sheet_count
+        sheets, groups, old, new = (np.asarray(column) for column in zip(*entries))
+        values = np.where(np.isin(groups, list(no_negative_groups))[:, None],
+                          np.asarray(without_negative), np.asarray(with_negative))
+        rows = np.arange(len(entries))
+        deltas = values[rows, new] - values[rows, old]
+        return deltas.tolist(), np.bincount(sheets, weights=deltas, minlength=sheet_count).tolist()
+
+    deltas, per_sheet = [], [0.0] * sheet_count
+    for sheet_index, group, old, new in entries:
+        values = without_negative if group in no_negative_groups else with_negative
+        delta = values[new] - values[old]
+        deltas.append(delta)
+        per_sheet[sheet_index] += delta
+    return deltas, per_sheet
+
+
+def _revised_positions(question_ids, page_sections, codes):
+    """(position, new key code, section position, group) of every revised question on a page layout."""
+    revised = []
+    for position, qid in enumerate(question_ids):
+        new_key = codes.get(qid)
+        if new_key is None:
+            continue
+        section_position, group = None, 0
+        for index, section in enumerate(page_sections):
+            if section['start'] <= position < section['end']:
+                section_position, group = index, section['group']
+                break
+        revised.append((position, new_key, section_position, group))
+    return revised
+
+
+def rescore_shift(store, revision, apply=False):
+    """
+    Applies a key revision to every stored sheet of its shift.
+
+    Only the revised questions are re-evaluated; every other question keeps the
+    outcome it was scored with, so results scored against the shift's master
+    key stay consistent with it. Sheets without stored chosen options
+    (Eduquity CHSL pages) cannot be re-scored and are counted as skipped.
+
+    Args:
+        store (ResultStore): The result store holding the shift's sheets.
+        revision (KeyRevision): The changes to apply.
+        apply (bool): Write new outcomes, keys, section counts and totals back
+                      to the store and record the revision there, where the app
+                      picks it up for new results, cached results and permalinks;
+                      otherwise only report.
+
+    Returns:
+        dict: {'shift', 'sheets', 'skipped', 'changed', 'elapsed_ms', 'results'}
+              where results lists (roll_no, old total, new total) per sheet.
+    """
+    started = time.perf_counter()
+    store.flush()
+    connection = store._connection()
+    rows = connection.execute(
+        "SELECT c.id, c.roll_no, c.total_marks, c.exam_summary, s.question_ids, s.chosen, s.answer_key, "
+        "s.outcomes, s.page_sections "
+        "FROM candidates c JOIN sheets s ON s.candidate_id = c.id "
+        "WHERE c.exam = ? AND c.exam_date = ? AND c.exam_time = ?",
+        (revision.exam, revision.exam_date, revision.exam_time),
+    ).fetchall()
+
+    sheets, entries, skipped = [], [], 0
+    entry_meta = []    # (position in sheet, section position) per entry
+    key_updates = []   # (revised answer key, candidate id)
+    # Sheets of a shift share a few page layouts: resolve each layout's revised
+    # positions (with their section and group) once, not once per sheet
+    layouts = {}
+    for candidate_id, roll_no, total_marks, exam_summary, question_ids, chosen, answer_key, outcomes, page_sections in rows:
+        if chosen is None:
+            skipped += 1
+            continue
+        sheet_index = len(sheets)
+        sheets.append((candidate_id, roll_no, total_marks, exam_summary, outcomes))
+        revised = layouts.get((question_ids, page_sections))
+        if revised is None:
+            revised = layouts[(question_ids, page_sections)] = _revised_positions(
+                json.loads(question_ids), json.loads(page_sections), revision.codes
+            )
+        if answer_key is not None and revised:
+            new_answer_key = list(answer_key)
+            for position, new_key, _, _ in revised:
+                new_answer_key[position] = new_key
+            if ''.join(new_answer_key) != answer_key:
+                key_updates.append((''.join(new_answer_key), candidate_id))
+        for position, new_key, section_position, group in revised:
+            old_outcome = _CODE_INDEX.get(outcomes[position])
+            if old_outcome is None:
+                continue
+            new_outcome = _OUTCOME_INDEX[outcome(chosen[position], new_key)]
+            if new_outcome == old_outcome:
+                continue
+            entries.append((sheet_index, group, old_outcome, new_outcome))
+            entry_meta.append((position, section_position))
+
+    deltas, per_sheet = _score_deltas(entries, len(sheets), revision.exam)
+
+    results = [
+        (roll_no, total_marks, round(total_marks + delta, 2))
+        for (_, roll_no, total_marks, _, _), delta in zip(sheets, per_sheet)
+    ]
+    changed = sum(1 for _, old_total, new_total in results if old_total != new_total)
+
+    if apply:
+        _write_back(connection, revision, sheets, entries, entry_meta, deltas, per_sheet, key_updates)
+        store.save_revision(revision.shift, revision.codes, connection)
+
+    return {
+        'shift': revision.shift,
+        'sheets': len(sheets),
+        'skipped': skipped,
+        'changed': changed,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        'results': results,
+    }
+
+
+def _write_back(connection, revision, sheets, entries, entry_meta, deltas, per_sheet, key_updates=()):
+    """Stores re-scored outcomes, revised keys, section counts and totals in one transaction."""
+    outcome_codes = [OUTCOME_CODES[name] for name in OUTCOMES]
+    new_outcomes = {}
+    section_changes = {}
+    group_deltas = {}
+    for (sheet_index, group, old, new), (position, section_position), delta in zip(entries, entry_meta, deltas):
+        outcomes = new_outcomes.setdefault(sheet_index, list(sheets[sheet_index][4]))
+        outcomes[position] = outcome_codes[new]
+        if section_position is not None:
+            counts = section_changes.setdefault((sheet_index, section_position), [0, 0, 0, 0, 0.0])
+            counts[old] -= 1
+            counts[new] += 1
+            counts[4] += delta
+        group_deltas[(sheet_index, group)] = group_deltas.get((sheet_index, group), 0.0) + delta
+
+    now = time.time()
+    candidate_updates, sheet_updates = [], []
+    for sheet_index, outcomes in new_outcomes.items():
+        candidate_id, _, total_marks, exam_summary, _ = sheets[sheet_index]
+        exam_summary = json.loads(exam_summary)
+        exam_summary['total_marks'] = round(total_marks + per_sheet[sheet_index], 2)
+        # MTS keeps separate subtotals of the first two section groups
+        for group, field in ((0, 'section_one_total'), (1, 'section_two_total')):
+            if field in exam_summary:
+                exam_summary[field] = round(exam_summary[field] + group_deltas.get((sheet_index, group), 0.0), 2)
+        candidate_updates.append((exam_summary['total_marks'], json.dumps(exam_summary), now, candidate_id))
+        sheet_updates.append((''.join(outcomes), candidate_id))
+
+    with connection:
+        connection.executemany(
+            "UPDATE candidates SET total_marks = ?, exam_summary = ?, updated_at = ? WHERE id = ?", candidate_updates
+        )
+        connection.executemany("UPDATE sheets SET outcomes = ? WHERE candidate_id = ?", sheet_updates)
+        connection.executemany("UPDATE sheets SET answer_key = ? WHERE candidate_id = ?", key_updates)
+        connection.executemany(
+            "UPDATE sections SET right = right + ?, wrong = wrong + ?, not_attempted = not_attempted + ?, "
+            "bonus = bonus + ?, attempted = attempted - ?, marks = ROUND(marks + ?, 2) "
+            "WHERE candidate_id = ? AND position = ?",
+            [
+                (counts[0], counts[1], counts[2], counts[3], counts[2], counts[4],
+                 sheets[sheet_index][0], section_position)
+                for (sheet_index, section_position), counts in section_changes.items()
+            ],
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score every stored sheet of a shift against a revised answer key.")
+    parser.add_argument("revision", help='JSON file: {"exam", "exam_date", "exam_time", "changed": {qid: option}, "bonus": [qid, ...]}')
+    parser.add_argument("--path", default=STORE_PATH, help="Result store SQLite file (default: MARKSKING_STORE_PATH).")
+    parser.add_argument("--apply", action="store_true", help="Write the new scores back (default: report only).")
+    parser.add_argument("--limit", type=int, default=20, help="Number of changed results to list.")
+    args = parser.parse_args()
+
+    if not args.path:
+        parser.error("--path or MARKSKING_STORE_PATH is required")
+
+    revision = KeyRevision.from_file(args.revision)
+    report = rescore_shift(ResultStore(args.path), revision, apply=args.apply)
+    print(f"{'Applied' if args.apply else 'Dry run'}: {report['shift']} - {report['sheets']} sheets "
+          f"({report['skipped']} without chosen options skipped), {report['changed']} totals changed, "
+          f"{report['elapsed_ms']}ms ({'numpy' if NUMPY_AVAILABLE else 'pure Python'})")
+    changed = [row for row in report['results'] if row[1] != row[2]]
+    for roll_no, old_total, new_total in sorted(changed, key=lambda row: row[2] - row[1])[:args.limit]:
+        print(f"  {roll_no:<14} {old_total:>8} -> {new_total:<8} ({new_total - old_total:+g})")
@@ -0,0 +1,529 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import argparse
+import threading
+
+from answer_sheet import OUTCOMES, outcome
+from lazy_result import compact_dict, scored_result
+
+# Opt-in: set MARKSKING_STORE_PATH to a SQLite file to persist every scored result
+STORE_PATH = os.environ.get('MARKSKING_STORE_PATH', '').strip() or None
+
+# Writer batching: at most WRITE_BATCH results per transaction, committed at
+# least every WRITE_INTERVAL seconds; results beyond MAX_PENDING are dropped
+WRITE_BATCH = 256
+WRITE_INTERVAL = 0.5
+MAX_PENDING = 10000
+
+# One character per question outcome in sheets.outcomes
+OUTCOME_CODES = {'right': 'r', 'wrong': 'w', 'skipped': 's', 'bonus': 'b'}
+_OUTCOME_NAMES = {code: name for name, code in OUTCOME_CODES.items()}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS candidates (
+    id INTEGER PRIMARY KEY,
+    exam TEXT NOT NULL,
+    roll_no TEXT NOT NULL,
+    cand_name TEXT,
+    venue_name TEXT,
+    exam_date TEXT,
+    exam_time TEXT,
+    subject TEXT,
+    total_marks REAL NOT NULL,
+    exam_summary TEXT NOT NULL,
+    trusted INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    UNIQUE (exam, roll_no)
+);
+CREATE INDEX IF NOT EXISTS candidates_shift ON candidates (exam, exam_date, exam_time, total_marks);
+CREATE INDEX IF NOT EXISTS candidates_marks ON candidates (exam, total_marks);
+
+CREATE TABLE IF NOT EXISTS sections (
+    candidate_id INTEGER NOT NULL REFERENCES candidates (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    section_name TEXT,
+    total_questions INTEGER,
+    attempted INTEGER,
+    not_attempted INTEGER,
+    right INTEGER,
+    wrong INTEGER,
+    bonus INTEGER,
+    marks REAL,
+    PRIMARY KEY (candidate_id, position)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sheets (
+    candidate_id INTEGER PRIMARY KEY REFERENCES candidates (id) ON DELETE CASCADE,
+    question_ids TEXT NOT NULL,
+    chosen TEXT,
+    answer_key TEXT,
+    outcomes TEXT NOT NULL,
+    page_sections TEXT
+);
+
+CREATE TABLE IF NOT EXISTS snapshots (
+    token TEXT PRIMARY KEY,
+    exam TEXT NOT NULL,
+    roll_no TEXT,
+    created_at REAL NOT NULL,
+    page_gzip BLOB NOT NULL,
+    exam_date TEXT,
+    exam_time TEXT,
+    result TEXT
+);
+
+CREATE TABLE IF NOT EXISTS key_revisions (
+    exam TEXT NOT NULL,
+    exam_date TEXT NOT NULL,
+    exam_time TEXT NOT NULL,
+    question_id TEXT NOT NULL,
+    answer_key TEXT NOT NULL,
+    revised_at REAL NOT NULL,
+    PRIMARY KEY (exam, exam_date, exam_time, question_id)
+) WITHOUT ROWID;
+"""
+
+# Columns added to tables of existing stores: {table: ((column, type), ...)}
+_ADDED_COLUMNS = {
+    'snapshots': (('exam_date', 'TEXT'), ('exam_time', 'TEXT'), ('result', 'TEXT')),
+}
+
+# The copy of its result a permalink snapshot keeps (see ResultStore.save_snapshot)
+SNAPSHOT_KEYS = ('candidate_info', 'exam_summary', 'section_details', 'answer_sheet', 'scoring_key',
+                 'question_wise_data')
+
+# Uploaded (untrusted) results never overwrite a result fetched from the source site
+# (nor, see write_many(), another upload with a different sheet)
+_UPSERT_CANDIDATE = """
+INSERT INTO candidates (exam, roll_no, cand_name, venue_name, exam_date, exam_time, subject,
+                        total_marks, exam_summary, trusted, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (exam, roll_no) DO UPDATE SET
+    cand_name = excluded.cand_name, venue_name = excluded.venue_name,
+    exam_date = excluded.exam_date, exam_time = excluded.exam_time, subject = excluded.subject,
+    total_marks = excluded.total_marks, exam_summary = excluded.exam_summary,
+    trusted = excluded.trusted, updated_at = excluded.updated_at
+WHERE excluded.trusted >= candidates.trusted
+"""
+
+_SECTION_FIELDS = ('section_name', 'total_questions', 'attempted', 'not_attempted', 'right', 'wrong', 'bonus')
+
+_UNKNOWN_VALUES = {'', 'n/a', 'unknown'}
+
+
+def connect(path):
+    """Opens a connection with WAL journaling (readers never block the writer)."""
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA foreign_keys=ON")
+    connection.executescript(SCHEMA)
+    for table, columns in _ADDED_COLUMNS.items():
+        existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+        for column, column_type in columns:
+            if column not in existing:
+                connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+    return connection
+
+
+def outcome_codes(chosen, key):
+    """sheets.outcomes of a sheet: one OUTCOME_CODES character per question."""
+    return ''.join(OUTCOME_CODES[outcome(chosen_code, key_code)] for chosen_code, key_code in zip(chosen, key))
+
+
+def _row_for(exam, result, trusted):
+    """Flattens a scraper result into the rows stored for it, or None if it has no roll number."""
+    candidate_info = result.get('candidate_info') or {}
+    roll_no = str(candidate_info.get('roll_no', '')).strip()
+    if roll_no.lower() in _UNKNOWN_VALUES:
+        return None
+    exam_summary = result.get('exam_summary') or {}
+    candidate = (
+        exam, roll_no,
+        candidate_info.get('cand_name'), candidate_info.get('venue_name'),
+        candidate_info.get('exam_date'), candidate_info.get('exam_time'), candidate_info.get('subject'),
+        exam_summary.get('total_marks', 0), json.dumps(exam_summary), int(bool(trusted)), time.time(),
+    )
+    sections = [
+        tuple(section.get(field) for field in _SECTION_FIELDS) + (section.get('marks_in_section'),)
+        for section in result.get('section_details') or []
+    ]
+    answer_sheet = result.get('answer_sheet')
+    if answer_sheet:
+        # The writer thread works the outcomes out from the chosen and key codes
+        # (reading question_wise_data would build a lazy result's breakdown here)
+        question_ids = answer_sheet['question_ids']
+        outcomes = None
+    else:
+        question_wise_data = result.get('question_wise_data') or {}
+        question_ids = list(question_wise_data)
+        outcomes = ''.join(OUTCOME_CODES.get(question_wise_data[qid], '?') for qid in question_ids)
+    sheet = (
+        json.dumps(question_ids),
+        answer_sheet['chosen'] if answer_sheet else None,
+        (result.get('scoring_key') or answer_sheet['key']) if answer_sheet else None,
+        outcomes,
+        json.dumps(answer_sheet['sections']) if answer_sheet else None,
+    )
+    return candidate, sections, sheet
+
+
+def _snapshot_json(result):
+    """The SNAPSHOT_KEYS of a result as JSON (a lazy question breakdown is left out, see lazy_result)."""
+    data = compact_dict(result)
+    entry = {key: data[key] for key in SNAPSHOT_KEYS if key in data}
+    if 'answer_sheet' in entry:
+        entry.pop('question_wise_data', None)
+    return json.dumps(entry, separators=(',', ':'), ensure_ascii=False)
+
+
+class ResultStore:
+    """
+    SQLite (WAL) store of scored results, one row per (exam, roll number).
+    A result fetched from the source site replaces any stored one; an upload
+    only replaces an upload of the same sheet (question IDs and chosen options).
+
+    save() only enqueues; a single writer thread per process drains the queue
+    and writes up to WRITE_BATCH results per transaction, so request threads
+    never wait on disk and result-day bursts become a few large commits.
+    """
+
+    def __init__(self, path, write_batch=WRITE_BATCH, write_interval=WRITE_INTERVAL, max_pending=MAX_PENDING):
+        self.path = path
+        self.write_batch = write_batch
+        self.write_interval = write_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._local = threading.local()
+        self.dropped = 0
+        connect(path).close()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._forget_connections)
+
+    def _forget_connections(self):
+        # Read connections stay with the process that opened them
+        self._local = threading.local()
+
+    def _connection(self):
+        """Per-thread read connection."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = connect(self.path)
+        return connection
+
+    # --- Writes ---
+
+    def save(self, exam, result, trusted=False):
+        """
+        Queues a result for the writer thread.
+
+        Returns:
+            bool: False if the result has no roll number or the queue is full.
+        """
+        rows = _row_for(exam, result, trusted)
+        if rows is None:
+            return False
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(rows)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                print(f"⚠️ Result store queue full, dropped result ({self.dropped} so far)")
+            return False
+        return True
+
+    def _ensure_writer(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name='result-store-writer', daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        connection = connect(self.path)
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.write_interval
+            while len(batch) < self.write_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.write_many(batch, connection)
+            except Exception as e:
+                print(f"Error writing {len(batch)} result(s) to store: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def write_many(self, rows, connection=None):
+        """
+        Writes flattened results in one transaction (later duplicates win). An
+        upload is dropped when the roll number's stored result came from the
+        source site, or from an upload of a different sheet.
+        """
+        connection = connection or self._connection()
+        with connection:
+            for candidate, sections, sheet in rows:
+                stored = connection.execute(
+                    "SELECT c.trusted, s.question_ids, s.chosen FROM candidates c "
+                    "LEFT JOIN sheets s ON s.candidate_id = c.id WHERE c.exam = ? AND c.roll_no = ?", candidate[:2]
+                ).fetchone()
+                if stored is not None and not candidate[9] and (stored[0] or stored[1:] != sheet[:2]):
+                    continue
+                connection.execute(_UPSERT_CANDIDATE, candidate)
+                candidate_id = connection.execute(
+                    "SELECT id FROM candidates WHERE exam = ? AND roll_no = ?", candidate[:2]
+                ).fetchone()[0]
+                connection.execute("DELETE FROM sections WHERE candidate_id = ?", (candidate_id,))
+                connection.executemany(
+                    "INSERT INTO sections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(candidate_id, position) + section for position, section in enumerate(sections)],
+                )
+                if sheet[3] is None:
+                    sheet = sheet[:3] + (outcome_codes(sheet[1], sheet[2]),) + sheet[4:]
+                connection.execute("INSERT OR REPLACE INTO sheets VALUES (?, ?, ?, ?, ?, ?)", (candidate_id,) + sheet)
+
+    def flush(self):
+        """Blocks until every queued result has been written."""
+        self._queue.join()
+
+    def save_snapshot(self, token, exam, result, page_gzip):
+        """
+        Stores a rendered, gzipped results page under its permalink token,
+        with a compact copy of the result it shows (SNAPSHOT_KEYS). The
+        snapshot's breakdown and re-renders read that copy, never the
+        candidates row of its roll number, which a later result may replace.
+
+        Written synchronously (one small insert) so the link works as soon as
+        the page that shows it has been sent.
+        """
+        candidate_info = result.get('candidate_info') or {}
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "INSERT INTO snapshots (token, exam, roll_no, created_at, page_gzip, exam_date, exam_time, result) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (token, exam, candidate_info.get('roll_no'), time.time(), sqlite3.Binary(page_gzip),
+                 candidate_info.get('exam_date'), candidate_info.get('exam_time'), _snapshot_json(result)),
+            )
+
+    def load_snapshot(self, token):
+        """Returns the gzipped page stored under a permalink token, or None."""
+        row = self._connection().execute("SELECT page_gzip FROM snapshots WHERE token = ?", (token,)).fetchone()
+        return bytes(row[0]) if row else None
+
+    def snapshot(self, token):
+        """
+        (exam, gzipped page, created_at, candidate_info) of a permalink token, or
+        None. candidate_info holds the shift of the snapshot's result ({} when unknown).
+        """
+        row = self._connection().execute(
+            "SELECT exam, page_gzip, created_at, exam_date, exam_time FROM snapshots WHERE token = ?", (token,)
+        ).fetchone()
+        if row is None:
+            return None
+        candidate_info = {'exam_date': row[3], 'exam_time': row[4]} if row[3] is not None else {}
+        return row[0], bytes(row[1]), row[2], candidate_info
+
+    def snapshot_result(self, token):
+        """(exam, result) kept with a permalink snapshot, or None (also for snapshots stored without one)."""
+        row = self._connection().execute("SELECT exam, result FROM snapshots WHERE token = ?", (token,)).fetchone()
+        if row is None or row[1] is None:
+            return None
+        return row[0], scored_result(json.loads(row[1]))
+
+    def replace_snapshot(self, token, page_gzip, result=None):
+        """Stores a re-rendered page (and the result it now shows) under an existing permalink token."""
+        connection = self._connection()
+        with connection:
+            if result is None:
+                connection.execute(
+                    "UPDATE snapshots SET page_gzip = ?, created_at = ? WHERE token = ?",
+                    (sqlite3.Binary(page_gzip), time.time(), token),
+                )
+            else:
+                connection.execute(
+                    "UPDATE snapshots SET page_gzip = ?, created_at = ?, result = ? WHERE token = ?",
+                    (sqlite3.Binary(page_gzip), time.time(), _snapshot_json(result), token),
+                )
+
+    # --- Key revisions ---
+
+    def save_revision(self, shift, codes, connection=None):
+        """
+        Records revised key codes ({question_id: code}) for an (exam, exam_date,
+        exam_time) shift. Later revisions of a question replace earlier ones.
+        """
+        connection = connection or self._connection()
+        now = time.time()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO key_revisions (exam, exam_date, exam_time, question_id, answer_key, revised_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(*shift, question_id, code, now) for question_id, code in codes.items()],
+            )
+
+    def revision(self, shift):
+        """(latest revised_at, {question_id: code}) of a shift's key revisions, or None."""
+        rows = self._connection().execute(
+            "SELECT question_id, answer_key, revised_at FROM key_revisions "
+            "WHERE exam = ? AND exam_date = ? AND exam_time = ?", tuple(shift)
+        ).fetchall()
+        if not rows:
+            return None
+        return max(row[2] for row in rows), {row[0]: row[1] for row in rows}
+
+    # --- Reads ---
+
+    def get_result(self, exam, roll_no):
+        """Rebuilds a stored result in the scrapers' format, or None."""
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT id, roll_no, cand_name, venue_name, exam_date, exam_time, subject, exam_summary "
+            "FROM candidates WHERE exam = ? AND roll_no = ?", (exam, str(roll_no).strip())
+        ).fetchone()
+        if row is None:
+            return None
+        candidate_id = row[0]
+        result = {
+            'candidate_info': dict(zip(('roll_no', 'cand_name', 'venue_name', 'exam_date', 'exam_time', 'subject'), row[1:7])),
+            'exam_summary': json.loads(row[7]),
+            'section_details': [],
+        }
+        for section in connection.execute(
+                "SELECT section_name, total_questions, attempted, not_attempted, right, wrong, bonus, marks "
+                "FROM sections WHERE candidate_id = ? ORDER BY position", (candidate_id,)):
+            details = {field: value for field, value in zip(_SECTION_FIELDS, section) if value is not None}
+            details['marks_in_section'] = section[7]
+            result['section_details'].append(details)
+        sheet = connection.execute(
+            "SELECT question_ids, chosen, answer_key, outcomes, page_sections FROM sheets WHERE candidate_id = ?",
+            (candidate_id,)
+        ).fetchone()
+        if sheet is not None:
+            question_ids = json.loads(sheet[0])
+            result['question_wise_data'] = {
+                qid: _OUTCOME_NAMES.get(code, 'unknown') for qid, code in zip(question_ids, sheet[3])
+            }
+            if sheet[1] is not None:
+                result['answer_sheet'] = {
+                    'question_ids': question_ids, 'chosen': sheet[1], 'key': sheet[2],
+                    'sections': json.loads(sheet[4]),
+                }
+        return result
+
+    def shift_marks(self, exam, exam_date, exam_time):
+        """Total marks of every stored candidate of a shift, highest first."""
+        return [marks for (marks,) in self._connection().execute(
+            "SELECT total_marks FROM candidates WHERE exam = ? AND exam_date = ? AND exam_time = ? "
+            "ORDER BY total_marks DESC", (exam, exam_date, exam_time)
+        )]
+
+    def score_counts(self, exam):
+        """
+        (exam_date, exam_time, total_marks, candidates) of every distinct score of
+        an exam's stored results fetched from the source site (uploads are left
+        out, as in the rank index). Read from the candidates_shift index alone.
+        """
+        return self._connection().execute(
+            "SELECT exam_date, exam_time, total_marks, COUNT(*) FROM candidates WHERE exam = ? AND trusted = 1 "
+            "GROUP BY exam_date, exam_time, total_marks", (exam,)
+        ).fetchall()
+
+    def shifts(self, exam):
+        """(exam_date, exam_time, candidates) of every stored shift of an exam."""
+        return self._connection().execute(
+            "SELECT exam_date, exam_time, COUNT(*) FROM candidates WHERE exam = ? "
+            "GROUP BY exam_date, exam_time ORDER BY exam_date, exam_time", (exam,)
+        ).fetchall()
+
+    def count(self, exam=None):
+        if exam is None:
+            return self._connection().execute("SELECT COUNT(*) FROM candidates").fetchone()[0]
+        return self._connection().execute("SELECT COUNT(*) FROM candidates WHERE exam = ?", (exam,)).fetchone()[0]
+
+
+# Process-wide store, or None when MARKSKING_STORE_PATH is not set
+result_store = ResultStore(STORE_PATH) if STORE_PATH else None
+
+
+def store_result(exam, result, trusted=False):
+    """Queues a scored result for persistence when the store is configured."""
+    if result_store is None or not result:
+        return False
+    try:
+        return result_store.save(exam, result, trusted=trusted)
+    except Exception as e:
+        print(f"Error queueing result for store: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    import random
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Inspect a result store or benchmark bulk inserts.")
+    parser.add_argument("--path", default=STORE_PATH, help="SQLite file (default: MARKSKING_STORE_PATH).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("shifts", help="List stored shifts per exam.")
+    bench_parser = commands.add_parser("bench", help="Insert simulated results through the writer thread.")
+    bench_parser.add_argument("--results", type=int, default=20000)
+    bench_parser.add_argument("--threads", type=int, default=8, help="Concurrent request threads.")
+    args = parser.parse_args()
+
+    if args.command == "shifts":
+        if not args.path:
+            parser.error("--path or MARKSKING_STORE_PATH is required")
+        store = ResultStore(args.path)
+        for exam in ('mts', 'je', 'chsl'):
+            for exam_date, exam_time, candidates in store.shifts(exam):
+                print(f"{exam:<5} {exam_date} {exam_time:<22} {candidates}")
+    else:
+        path = args.path or os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+        store = ResultStore(path, max_pending=args.results)
+        question_ids = [f"{630096000 + i}" for i in range(100)]
+
+        def make_result(n):
+            chosen = ''.join(random.choice('1234-') for _ in question_ids)
+            key = ''.join(random.choice('1234') for _ in question_ids)
+            return {
+                'candidate_info': {'roll_no': str(2201000000 + n), 'cand_name': 'X', 'venue_name': 'Y',
+                                   'exam_date': '01/09/2025', 'exam_time': f'shift-{n % 4}', 'subject': 'MTS'},
+                'exam_summary': {'total_marks': random.randint(0, 1200) / 4},
+                'section_details': [{'section_name': f'Part {s}', 'right': 10, 'wrong': 5, 'not_attempted': 10,
+                                     'bonus': 0, 'marks_in_section': 25} for s in range(4)],
+                'question_wise_data': {qid: random.choice(OUTCOMES) for qid in question_ids},
+                'answer_sheet': {'question_ids': question_ids, 'chosen': chosen, 'key': key, 'sections': []},
+            }
+
+        results = [make_result(n) for n in range(args.results)]
+        save_ms = []
+
+        def worker(chunk):
+            for result in chunk:
+                t0 = time.perf_counter()
+                store.save('mts', result, trusted=True)
+                save_ms.append((time.perf_counter() - t0) * 1000)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(results[i::args.threads],)) for i in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        store.flush()
+        elapsed = time.perf_counter() - started
+        save_ms.sort()
+        print(f"{store.count('mts')} results stored in {elapsed:.2f}s ({args.results / elapsed:.0f}/s) at {path}; "
+              f"save() median {save_ms[len(save_ms) // 2]:.3f}ms, p99 {save_ms[int(len(save_ms) * 0.99)]:.3f}ms")
@@ -1,184 +1,56 @@
-import requests
-from bs4 import BeautifulSoup
+from fetch_pipeline import fetch_html
+from html_backend import make_soup
+from html_prefilter import prefilter_html
+from extraction_plan import LayoutProfile, plan_cache
+from answer_key_index import shift_key_index
+from request_capture import capture_checkpoint, note_html
+from memory_budget import PageTooLarge, read_page_file, release_soup
+from lazy_result import scored_result
+from parse_pool import parse_pool
+from preflight import InvalidSubmission, check_page
 import json
 import argparse
-import time
-import random
 
-# Try to import proxy-only utilities
-try:
-    from proxy_only import make_proxy_only_request
-    PROXY_ONLY_AVAILABLE = True
-    print("✓ Proxy-only utilities loaded")
-except ImportError:
-    PROXY_ONLY_AVAILABLE = False
-    print("⚠️ Proxy-only utilities not available")
-
-# Try to import advanced bypass utilities
-try:
-    from bypass_utils import make_advanced_request
-    ADVANCED_BYPASS_AVAILABLE = True
-    print("✓ Advanced bypass utilities loaded")
-except ImportError:
-    ADVANCED_BYPASS_AVAILABLE = False
-    print("⚠️ Advanced bypass utilities not available, using basic method")
-
-def make_request_with_retry(url, max_retries=3):
-    """
-    Make HTTP request with enhanced headers and retry logic to bypass restrictions.
+# --- SSC MTS Marking Scheme (no negative marking in the first section group) ---
+EACH_QUE_POS_MARKS = 3
+EACH_QUE_NEG_MARKS = 1
+NO_NEGATIVE_GROUPS = (0,)
+
+# --- SSC MTS page layout: fixed-index candidate table when complete, label rows otherwise ---
+MTS_LAYOUT = LayoutProfile(
+    'mts',
+    info_mode='auto',
+    info_labels=(('roll', 'roll_no'), ('name', 'cand_name'), ('venue', 'venue_name'),
+                 ('date', 'exam_date'), ('time', 'exam_time'), ('subject', 'subject')),
+    section_label=('div', 'section-lbl'),
+    skip_short_ids=True,
+)
+
+def extract_answer_key(html_content, agreed_shifts=()):
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Sec-Fetch-Dest': 'document',
-        'Sec-Fetch-Mode': 'navigate',
-        'Sec-Fetch-Site': 'none',
-        'Sec-Fetch-User': '?1',
-        'sec-ch-ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
-        'sec-ch-ua-mobile': '?0',
-        'sec-ch-ua-platform': '"Windows"'
-    }
-    
-    session = requests.Session()
-    session.headers.update(headers)
-    
-    for attempt in range(max_retries):
-        try:
-            # Add random delay to avoid rate limiting
-            if attempt > 0:
-                delay = random.uniform(1, 3)
-                print(f"Retrying in {delay:.1f} seconds... (attempt {attempt + 1})")
-                time.sleep(delay)
-            
-            print(f"Attempting to fetch URL (attempt {attempt + 1}): {url}")
-            response = session.get(url, timeout=30)
-            
-            if response.status_code == 200:
-                print("✓ Successfully fetched content")
-                return response.text
-            elif response.status_code == 403:
-                print(f"✗ 403 Forbidden - Server blocking request (attempt {attempt + 1})")
-                if attempt < max_retries - 1:
-                    # Try with different User-Agent
-                    user_agents = [
-                        'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/119.0',
-                        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                    ]
-                    session.headers['User-Agent'] = random.choice(user_agents)
-                continue
-            else:
-                print(f"✗ HTTP {response.status_code}: {response.reason}")
-                response.raise_for_status()
-                
-        except requests.exceptions.Timeout:
-            print(f"✗ Timeout error (attempt {attempt + 1})")
-        except requests.exceptions.ConnectionError:
-            print(f"✗ Connection error (attempt {attempt + 1})")
-        except requests.RequestException as e:
-            print(f"✗ Request error (attempt {attempt + 1}): {e}")
-            
-        if attempt == max_retries - 1:
-            raise Exception(f"Failed to fetch URL after {max_retries} attempts. Server may be blocking requests.")
-    
-    return None
-
-def scrape_answer_key(source, is_file=False):
-    """
-    Parses an SSC-style answer key HTML file or URL to calculate scores.
-
-    This function replicates the logic from the provided JavaScript code, including
-    extracting candidate details, iterating through questions, and applying a
-    specific scoring scheme (no negative marking for the first section group).
-
-    Args:
-        source (str): The URL or local file path of the answer key.
-        is_file (bool): True if the source is a local file path, False if it's a URL.
+    Parses an MTS answer key page into its candidate details and answer sheet.
+    Touches no shared state, so it can also run in a parse worker process.
+    Pages of agreed_shifts (see ShiftKeyIndex.agreed_shifts()) skip rightAns.
 
     Returns:
-        dict: A dictionary containing the parsed candidate info, score summary,
-              section-wise breakdown, and question-wise results. Returns None on error.
+        tuple: (candidate_info, AnswerSheet), or None if the page is not an answer key.
     """
-    html_content = ""
-    if is_file:
-        try:
-            with open(source, 'r', encoding='utf-8') as f:
-                html_content = f.read()
-        except FileNotFoundError:
-            print(f"Error: File not found at '{source}'")
-            return None
-    else:
-        try:
-            # Use proxy-only method for maximum reliability
-            if PROXY_ONLY_AVAILABLE:
-                print("🌐 Using proxy-only method...")
-                html_content = make_proxy_only_request(source)
-            elif ADVANCED_BYPASS_AVAILABLE:
-                print("🔄 Using advanced bypass with proxy priority...")
-                from bypass_utils import SSCBypassManager
-                bypass_manager = SSCBypassManager()
-                html_content = bypass_manager.try_proxy_methods(source)
-                if html_content and html_content.status_code == 200:
-                    html_content = html_content.text
-                    print("✅ Success: Proxy method")
-                else:
-                    print("📡 Proxy methods failed, trying advanced bypass...")
-                    html_content = make_advanced_request(source)
-            else:
-                print("📡 Using basic bypass method...")
-                html_content = make_request_with_retry(source)
-                
-            if not html_content:
-                return None
-        except Exception as e:
-            print(f"Error fetching URL: {e}")
-            return None
+    soup = make_soup(prefilter_html(html_content))
+    html_content = None
+
+    wrapper = soup.find('div', class_='wrapper')
+    if not wrapper:
+        print("Error: Main content 'wrapper' not found in HTML.")
+        release_soup(soup)
+        return None
 
-    soup = BeautifulSoup(html_content, 'html.parser')
+    # The page layout is fingerprinted and compiled into fixed cell positions once
+    plan = plan_cache.get_plan(soup, wrapper, MTS_LAYOUT)
 
     # 1. Extract Candidate Information with robust parsing
     candidate_info = {}
     try:
-        # Try multiple approaches to find candidate info
-        info_table = soup.find('table')
-        if info_table:
-            cells = info_table.find_all('td')
-            if len(cells) >= 12:
-                # Standard format
-                candidate_info = {
-                    'roll_no': cells[1].text.strip() if len(cells) > 1 else 'N/A',
-                    'cand_name': cells[3].text.strip() if len(cells) > 3 else 'N/A',
-                    'venue_name': cells[5].text.strip() if len(cells) > 5 else 'N/A',
-                    'exam_date': cells[7].text.strip() if len(cells) > 7 else 'N/A',
-                    'exam_time': cells[9].text.strip() if len(cells) > 9 else 'N/A',
-                    'subject': cells[11].text.strip() if len(cells) > 11 else 'N/A'
-                }
-            else:
-                # Alternative parsing - search for labels
-                print("Trying alternative candidate info parsing...")
-                rows = info_table.find_all('tr')
-                for row in rows:
-                    cells = row.find_all('td')
-                    if len(cells) >= 2:
-                        label = cells[0].text.lower().strip()
-                        value = cells[1].text.strip()
-                        if 'roll' in label:
-                            candidate_info['roll_no'] = value
-                        elif 'name' in label:
-                            candidate_info['cand_name'] = value
-                        elif 'venue' in label:
-                            candidate_info['venue_name'] = value
-                        elif 'date' in label:
-                            candidate_info['exam_date'] = value
-                        elif 'time' in label:
-                            candidate_info['exam_time'] = value
-                        elif 'subject' in label:
-                            candidate_info['subject'] = value
+        candidate_info = plan.candidate_info(soup)
         
         # If still no info found, set defaults
         if not candidate_info:
@@ -207,89 +79,68 @@ def scrape_answer_key(source, is_file=False):
         }
         print("Using default candidate information to continue processing.")
 
-    # 2. Process Questions and Calculate Score
-    all_question_data = {}
+    # 2. Extract Questions into a compact answer sheet
+    read_key = shift_key_index.shift_key('mts', candidate_info) not in agreed_shifts
+    sheet = plan.extract_sheet(wrapper, read_key=read_key)
+
+    # Everything needed is extracted: free the tree before scoring
+    release_soup(soup)
+    return candidate_info, sheet
+
+def score_answer_key(extracted, trusted=False):
+    """
+    Scores an extracted MTS answer key (see extract_answer_key()).
+
+    Args:
+        extracted (tuple): (candidate_info, AnswerSheet).
+        trusted (bool): True if the page was fetched from the source site (see ShiftKeyIndex).
+
+    Returns:
+        LazyResult: The scored result (same format as scrape_answer_key()), or
+                    None if the page's key was not read and the shift's agreed key
+                    no longer covers it.
+    """
+    candidate_info, sheet = extracted
     section_results = []
     total_marks = 0.0
     section_one_marks = 0.0
     section_two_marks = 0.0
 
-    # Constants from your JS logic
-    EACH_QUE_POS_MARKS = 3
-    EACH_QUE_NEG_MARKS = 1
-
-    wrapper = soup.find('div', class_='wrapper')
-    if not wrapper:
-        print("Error: Main content 'wrapper' not found in HTML.")
+    # 3. Score against the page's own key (or the shift's agreed key, see ShiftKeyIndex)
+    key, key_check = shift_key_index.reconcile('mts', candidate_info, sheet, trusted=trusted)
+    if key is None:
         return None
 
-    # Loop through main groups (grp-cntnr)
-    groups = wrapper.find_all('div', class_='grp-cntnr')
-    for i, group in enumerate(groups):
-        # Loop through sections within a group (section-cntnr)
-        sections = group.find_all('div', class_='section-cntnr')
-        for section in sections:
-            section_name_element = section.find('div', class_='section-lbl')
-            section_name = section_name_element.text.strip() if section_name_element else "Unknown Section"
-            
-            questions = section.find_all('div', class_='question-pnl')
-            right, not_attempted, bonus, wrong = 0, 0, 0, 0
-
-            for question in questions:
-                menu_tbl = question.find('table', class_='menu-tbl')
-                bold_elements = menu_tbl.find_all('td', class_='bold')
-
-                # Get Question ID (handling the edge case from your JS)
-                question_id = bold_elements[0].text.strip()
-                if len(question_id) < 5 and len(bold_elements) > 1:
-                    question_id = bold_elements[1].text.strip()
-
-                # Get the option chosen by the candidate
-                chosen_opt = bold_elements[-1].text.strip()
-
-                # Find the correct answer (using try-except like your JS)
-                try:
-                    right_ans_element = question.find('td', class_='rightAns')
-                    right_opt = right_ans_element.text.strip()[0] # Get first character e.g., "1)" -> "1"
-                    
-                    if chosen_opt == "--":
-                        not_attempted += 1
-                        all_question_data[question_id] = "skipped"
-                    elif chosen_opt == right_opt:
-                        right += 1
-                        all_question_data[question_id] = "right"
-                    else:
-                        wrong += 1
-                        all_question_data[question_id] = "wrong"
-                except AttributeError: # This is triggered if find() returns None
-                    bonus += 1
-                    all_question_data[question_id] = "bonus"
-            
-            # 3. Apply Scoring Logic
-            marks = 0.0
-            if i == 0:  # First group has no negative marking
-                marks = (right + bonus) * EACH_QUE_POS_MARKS
-                section_one_marks += marks
-            else:  # Subsequent groups have negative marking
-                marks = (right + bonus) * EACH_QUE_POS_MARKS - (wrong * EACH_QUE_NEG_MARKS)
-                if i == 1: # Specifically track marks for the second group
-                    section_two_marks += marks
-            
-            total_marks += marks
-
-            section_results.append({
-                'section_name': section_name[9:],
-                'total_questions': len(questions),
-                'attempted': len(questions) - not_attempted,
-                'not_attempted': not_attempted,
-                'right': right,
-                'wrong': wrong,
-                'bonus': bonus,
-                'marks_in_section': round(marks, 2)
-            })
-
-    # 4. Compile the Final Result
-    final_result = {
+    for section in sheet.sections:
+        i = section['group']
+        right, wrong, not_attempted, bonus = sheet.tally(section, key)
+        total_questions = section['end'] - section['start']
+
+        # Apply Scoring Logic
+        marks = 0.0
+        if i in NO_NEGATIVE_GROUPS:  # First group has no negative marking
+            marks = (right + bonus) * EACH_QUE_POS_MARKS
+            section_one_marks += marks
+        else:  # Subsequent groups have negative marking
+            marks = (right + bonus) * EACH_QUE_POS_MARKS - (wrong * EACH_QUE_NEG_MARKS)
+            if i == 1: # Specifically track marks for the second group
+                section_two_marks += marks
+
+        total_marks += marks
+
+        section_results.append({
+            'section_name': section['name'][9:],
+            'total_questions': total_questions,
+            'attempted': total_questions - not_attempted,
+            'not_attempted': not_attempted,
+            'right': right,
+            'wrong': wrong,
+            'bonus': bonus,
+            'marks_in_section': round(marks, 2)
+        })
+
+    # 4. Compile the Final Result (question_wise_data is derived on first access)
+    final_result = scored_result({
         'candidate_info': candidate_info,
         'exam_summary': {
             'total_marks': round(total_marks, 2),
@@ -297,11 +148,61 @@ def scrape_answer_key(source, is_file=False):
             'section_two_total': round(section_two_marks, 2)
         },
         'section_details': section_results,
-        'question_wise_data': all_question_data
-    }
+        'key_check': key_check,
+        'answer_sheet': sheet.to_dict()
+    })
+    if key != sheet.key:
+        final_result['scoring_key'] = key
 
+    capture_checkpoint('score')
     return final_result
 
+def scrape_answer_key(source, is_file=False, offload=False):
+    """
+    Parses an SSC-style answer key HTML file or URL to calculate scores.
+
+    This function replicates the logic from the provided JavaScript code, including
+    extracting candidate details, iterating through questions, and applying a
+    specific scoring scheme (no negative marking for the first section group).
+
+    Args:
+        source (str): The URL or local file path of the answer key.
+        is_file (bool): True if the source is a local file path, False if it's a URL.
+        offload (bool): Parse in the parse worker pool (see parse_pool.py).
+
+    Returns:
+        dict: A dictionary containing the parsed candidate info, score summary,
+              section-wise breakdown, and question-wise results. Returns None on error.
+    """
+    html_content = ""
+    if is_file:
+        try:
+            html_content = read_page_file(source)
+        except FileNotFoundError:
+            print(f"Error: File not found at '{source}'")
+            return None
+    else:
+        html_content = fetch_html(source)
+        if not html_content:
+            return None
+
+    check_page('mts', html_content)
+    note_html(html_content)
+    capture_checkpoint('read' if is_file else 'fetch')
+
+    extract = (lambda *args: parse_pool.extract('mts', html_content, *args)) if offload else (
+        lambda *args: extract_answer_key(html_content, *args))
+    extracted = extract(shift_key_index.agreed_shifts('mts'))
+    capture_checkpoint('parse')
+    if extracted is None:
+        return None
+
+    result = score_answer_key(extracted, trusted=not is_file)
+    if result is None:
+        # The shift's agreed key no longer covers the page: read its own key after all
+        result = score_answer_key(extract(), trusted=not is_file)
+    return result
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="A Python script to scrape and evaluate SSC-style answer keys from a URL or local file."
@@ -311,8 +212,12 @@ if __name__ == "__main__":
     
     args = parser.parse_args()
     
-    result = scrape_answer_key(args.source, is_file=args.file)
+    try:
+        result = scrape_answer_key(args.source, is_file=args.file)
+    except (InvalidSubmission, PageTooLarge) as e:
+        print(f"Error: {e}")
+        result = None
     
     if result:
         # Pretty print the JSON output
-        print(json.dumps(result, indent=4))
\ No newline at end of file
+        print(json.dumps(result.to_dict(), indent=4))
\ No newline at end of file
@@ -1,159 +1,77 @@
-import requests
-from bs4 import BeautifulSoup
+from fetch_pipeline import fetch_html
+from html_backend import make_soup
+from html_prefilter import prefilter_html
+from extraction_plan import LayoutProfile, plan_cache
+from answer_key_index import shift_key_index
+from request_capture import capture_checkpoint, note_html
+from memory_budget import PageTooLarge, read_page_file, release_soup
+from lazy_result import scored_result
+from parse_pool import parse_pool
+from preflight import InvalidSubmission, check_page
 import json
 import argparse
 import re
 from urllib.parse import urlparse, parse_qs
-import time
-import random
-
-# Try to import proxy-only utilities
-try:
-    from proxy_only import make_proxy_only_request
-    PROXY_ONLY_AVAILABLE = True
-    print("✓ Proxy-only utilities loaded")
-except ImportError:
-    PROXY_ONLY_AVAILABLE = False
-    print("⚠️ Proxy-only utilities not available")
-
-# Try to import advanced bypass utilities
-try:
-    from bypass_utils import make_advanced_request
-    ADVANCED_BYPASS_AVAILABLE = True
-    print("✓ Advanced bypass utilities loaded")
-except ImportError:
-    ADVANCED_BYPASS_AVAILABLE = False
-    print("⚠️ Advanced bypass utilities not available, using basic method")
-
-def make_request_with_retry(url, max_retries=3):
-    """
-    Make HTTP request with enhanced headers and retry logic to bypass restrictions.
-    """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Sec-Fetch-Dest': 'document',
-        'Sec-Fetch-Mode': 'navigate',
-        'Sec-Fetch-Site': 'none',
-        'Sec-Fetch-User': '?1',
-        'sec-ch-ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
-        'sec-ch-ua-mobile': '?0',
-        'sec-ch-ua-platform': '"Windows"'
-    }
-    
-    session = requests.Session()
-    session.headers.update(headers)
-    
-    for attempt in range(max_retries):
-        try:
-            if attempt > 0:
-                delay = random.uniform(1, 3)
-                print(f"Retrying in {delay:.1f} seconds... (attempt {attempt + 1})")
-                time.sleep(delay)
-            
-            print(f"Attempting to fetch URL (attempt {attempt + 1}): {url}")
-            response = session.get(url, timeout=30)
-            
-            if response.status_code == 200:
-                print("✓ Successfully fetched content")
-                return response.text
-            elif response.status_code == 403:
-                print(f"✗ 403 Forbidden - Server blocking request (attempt {attempt + 1})")
-                if attempt < max_retries - 1:
-                    user_agents = [
-                        'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/119.0',
-                        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                    ]
-                    session.headers['User-Agent'] = random.choice(user_agents)
-                continue
-            else:
-                print(f"✗ HTTP {response.status_code}: {response.reason}")
-                response.raise_for_status()
-                
-        except requests.exceptions.Timeout:
-            print(f"✗ Timeout error (attempt {attempt + 1})")
-        except requests.exceptions.ConnectionError:
-            print(f"✗ Connection error (attempt {attempt + 1})")
-        except requests.RequestException as e:
-            print(f"✗ Request error (attempt {attempt + 1}): {e}")
-            
-        if attempt == max_retries - 1:
-            raise Exception(f"Failed to fetch URL after {max_retries} attempts. Server may be blocking requests.")
-    
-    return None
 
 # --- SSC CHSL Tier-I Marking Scheme ---
 POS_MARKS = 2
 NEG_MARKS = 0.5
 
-def _parse_tcs_html(soup):
-    """Parses the modern, class-based TCS answer key format."""
+# TCS layout: label/value candidate rows, section names in span.section-lbl-text
+CHSL_TCS_LAYOUT = LayoutProfile(
+    'chsl-tcs',
+    info_mode='labelled',
+    info_labels=(('roll', 'roll_no'), ('candidate name', 'cand_name'), ('venue', 'venue_name'),
+                 ('date', 'exam_date'), ('time', 'exam_time'), ('subject', 'subject')),
+    info_row_cells=2,
+    section_label=('span', 'section-lbl-text'),
+    skip_short_ids=True,
+)
+
+def _parse_tcs_html(soup, agreed_shifts=()):
+    """Extracts candidate info and the answer sheet from the modern, class-based TCS format."""
     print("-> Detected TCS format. Parsing...")
+    wrapper = soup.find('div', class_='wrapper')
+    # The page layout is fingerprinted and compiled into fixed cell positions once
+    plan = plan_cache.get_plan(soup, wrapper, CHSL_TCS_LAYOUT)
+
     # 1. Extract Candidate Info
     candidate_info = {}
     try:
-        info_table = soup.find('table')
-        # Robust keyword search for details
-        for row in info_table.find_all('tr'):
-            cells = row.find_all('td')
-            if len(cells) == 2:
-                label = cells[0].text.lower().strip()
-                value = cells[1].text.strip()
-                if 'roll' in label: candidate_info['roll_no'] = value
-                elif 'candidate name' in label: candidate_info['cand_name'] = value
-                elif 'venue' in label: candidate_info['venue_name'] = value
-                elif 'date' in label: candidate_info['exam_date'] = value
-                elif 'time' in label: candidate_info['exam_time'] = value
-                elif 'subject' in label: candidate_info['subject'] = value
+        candidate_info = plan.candidate_info(soup)
     except Exception as e:
         print(f"Warning: Could not parse candidate info from TCS key. {e}")
 
-    # 2. Process Questions
-    all_question_data = {}
+    # 2. Extract Questions into a compact answer sheet
+    read_key = shift_key_index.shift_key('chsl', candidate_info) not in agreed_shifts
+    return candidate_info, plan.extract_sheet(wrapper, read_key=read_key)
+
+def _score_tcs(candidate_info, sheet, trusted=False):
+    """
+    Scores a TCS answer sheet, or returns None if its key was not read and the
+    shift's agreed key no longer covers it.
+    `trusted` marks pages fetched by URL (see ShiftKeyIndex).
+    """
     section_results = []
     total_marks = 0.0
-    
-    wrapper = soup.find('div', class_='wrapper')
-    groups = wrapper.find_all('div', class_='grp-cntnr')
-    
-    for group in groups:
-        sections = group.find_all('div', class_='section-cntnr')
-        for section in sections:
-            section_name = section.find('span', class_='section-lbl-text').text.strip()
-            questions = section.find_all('div', class_='question-pnl')
-            right, wrong, not_attempted, bonus = 0, 0, 0, 0
 
-            for q in questions:
-                bold_elements = q.find('table', class_='menu-tbl').find_all('td', class_='bold')
-                q_id = bold_elements[1].text.strip() if len(bold_elements[0].text.strip()) < 5 else bold_elements[0].text.strip()
-                chosen_opt = bold_elements[-1].text.strip()
+    # 3. Score against the page's own key (or the shift's agreed key, see ShiftKeyIndex)
+    key, key_check = shift_key_index.reconcile('chsl', candidate_info, sheet, trusted=trusted)
+    if key is None:
+        return None
 
-                try:
-                    right_opt = q.find('td', class_='rightAns').text.strip()[0]
-                    if chosen_opt == '--':
-                        not_attempted += 1
-                        all_question_data[q_id] = "skipped"
-                    elif chosen_opt == right_opt:
-                        right += 1
-                        all_question_data[q_id] = "right"
-                    else:
-                        wrong += 1
-                        all_question_data[q_id] = "wrong"
-                except AttributeError:
-                    bonus += 1
-                    all_question_data[q_id] = "bonus"
-            
-            marks = (right + bonus) * POS_MARKS - (wrong * NEG_MARKS)
-            total_marks += marks
-            section_results.append({ 'section_name': section_name, 'right': right, 'wrong': wrong, 'not_attempted': not_attempted, 'bonus': bonus, 'marks_in_section': round(marks, 2) })
+    for section in sheet.sections:
+        right, wrong, not_attempted, bonus = sheet.tally(section, key)
+        marks = (right + bonus) * POS_MARKS - (wrong * NEG_MARKS)
+        total_marks += marks
+        section_results.append({ 'section_name': section['name'], 'right': right, 'wrong': wrong, 'not_attempted': not_attempted, 'bonus': bonus, 'marks_in_section': round(marks, 2) })
 
-    return { 'candidate_info': candidate_info, 'exam_summary': {'total_marks': round(total_marks, 2)}, 'section_details': section_results, 'question_wise_data': all_question_data }
+    capture_checkpoint('score')
+    # question_wise_data is derived on first access
+    result = scored_result({ 'candidate_info': candidate_info, 'exam_summary': {'total_marks': round(total_marks, 2)}, 'section_details': section_results, 'key_check': key_check, 'answer_sheet': sheet.to_dict() })
+    if key != sheet.key:
+        result['scoring_key'] = key
+    return result
 
 def _parse_eduquity_html(soup):
     """Parses the older, color-based Eduquity answer key format."""
@@ -203,51 +121,74 @@ def _parse_eduquity_html(soup):
     return { 'candidate_info': candidate_info, 'exam_summary': {'total_marks': round(marks, 2)}, 'section_details': section_results, 'question_wise_data': all_question_data }
 
 
-def scrape_chsl_answer_key(source, is_file=False):
+def extract_chsl_answer_key(html_content, source='', agreed_shifts=()):
+    """
+    Parses a CHSL answer key page, auto-detecting the TCS or Eduquity format.
+    Touches no shared state, so it can also run in a parse worker process.
+    TCS pages of agreed_shifts (see ShiftKeyIndex.agreed_shifts()) skip rightAns.
+
+    Returns:
+        tuple: ('tcs', (candidate_info, AnswerSheet)) or ('eduquity', result).
+    """
+    is_eduquity = "ssccbt.com" in source or "SSC ONLINE EXAMINATION" in html_content
+    soup = make_soup(prefilter_html(html_content))
+    html_content = None
+
+    # --- The Auto-Detector Logic ---
+    try:
+        if is_eduquity:
+            return 'eduquity', _parse_eduquity_html(soup)
+        elif "digialm" in source or soup.find('div', class_='grp-cntnr'):
+            return 'tcs', _parse_tcs_html(soup, agreed_shifts)
+        else:
+            print("Warning: Could not determine format. Attempting Eduquity parser as a fallback.")
+            return 'eduquity', _parse_eduquity_html(soup)
+    finally:
+        # The extraction holds plain values only: free the tree now rather than at the next GC cycle
+        release_soup(soup)
+
+
+def score_chsl_answer_key(extracted, trusted=False):
+    """
+    Scores an extracted CHSL answer key (see extract_chsl_answer_key()).
+    `trusted` marks pages fetched by URL (see ShiftKeyIndex). None when a TCS
+    page's key was not read and the shift's agreed key no longer covers it.
+    """
+    page_format, payload = extracted
+    if page_format == 'tcs':
+        return _score_tcs(*payload, trusted=trusted)
+    # Eduquity pages are scored while parsing
+    capture_checkpoint('score')
+    return payload
+
+
+def scrape_chsl_answer_key(source, is_file=False, offload=False):
     """
     Universal scraper for SSC CHSL. Auto-detects TCS or Eduquity format.
+    With offload=True the page is parsed in the parse worker pool (see parse_pool.py).
     """
     html_content = ""
     if is_file:
-        with open(source, 'r', encoding='utf-8') as f:
-            html_content = f.read()
+        html_content = read_page_file(source)
     else:
-        try:
-            # Use proxy-only method for maximum reliability
-            if PROXY_ONLY_AVAILABLE:
-                print("🌐 Using proxy-only method...")
-                html_content = make_proxy_only_request(source)
-            elif ADVANCED_BYPASS_AVAILABLE:
-                print("🔄 Using advanced bypass with proxy priority...")
-                from bypass_utils import SSCBypassManager
-                bypass_manager = SSCBypassManager()
-                html_content = bypass_manager.try_proxy_methods(source)
-                if html_content and html_content.status_code == 200:
-                    html_content = html_content.text
-                    print("✅ Success: Proxy method")
-                else:
-                    print("📡 Proxy methods failed, trying advanced bypass...")
-                    html_content = make_advanced_request(source)
-            else:
-                print("📡 Using basic bypass method...")
-                html_content = make_request_with_retry(source)
-                
-            if not html_content:
-                return None
-        except Exception as e:
-            print(f"Error fetching URL: {e}")
+        html_content = fetch_html(source)
+        if not html_content:
             return None
     
-    soup = BeautifulSoup(html_content, 'html.parser')
+    check_page('chsl', html_content)
+    note_html(html_content)
+    capture_checkpoint('read' if is_file else 'fetch')
 
-    # --- The Auto-Detector Logic ---
-    if "ssccbt.com" in source or "SSC ONLINE EXAMINATION" in html_content:
-        return _parse_eduquity_html(soup)
-    elif "digialm" in source or soup.find('div', class_='grp-cntnr'):
-        return _parse_tcs_html(soup)
-    else:
-        print("Warning: Could not determine format. Attempting Eduquity parser as a fallback.")
-        return _parse_eduquity_html(soup)
+    extract = (lambda *args: parse_pool.extract('chsl', html_content, source, *args)) if offload else (
+        lambda *args: extract_chsl_answer_key(html_content, source, *args))
+    extracted = extract(shift_key_index.agreed_shifts('chsl'))
+    capture_checkpoint('parse')
+
+    result = score_chsl_answer_key(extracted, trusted=not is_file)
+    if result is None:
+        # The shift's agreed key no longer covers the page: read its own key after all
+        result = score_chsl_answer_key(extract(), trusted=not is_file)
+    return result
 
 
 if __name__ == "__main__":
@@ -257,7 +198,11 @@ if __name__ == "__main__":
     
     args = parser.parse_args()
     
-    result = scrape_chsl_answer_key(args.source, is_file=args.file)
+    try:
+        result = scrape_chsl_answer_key(args.source, is_file=args.file)
+    except (InvalidSubmission, PageTooLarge) as e:
+        print(f"Error: {e}")
+        result = None
     
     if result:
-        print(json.dumps(result, indent=4))
\ No newline at end of file
+        print(json.dumps(dict(result), indent=4))
\ No newline at end of file
@@ -0,0 +1,118 @@
+import os
+import copy
+import hashlib
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from admission import ADMISSION_MAX_WAIT, Saturated, admission
+from proxy_only import PROXY_TIMEOUT
+
+# Longest a follower waits for its leader: the leader's admission wait and
+# fetch timeout plus a margin; then it gets the same 503 as an unadmitted fetch
+FOLLOWER_WAIT_MARGIN = 5
+FOLLOWER_MAX_WAIT = float(os.environ.get('MARKSKING_SINGLEFLIGHT_MAX_WAIT',
+                                         str(ADMISSION_MAX_WAIT + PROXY_TIMEOUT + FOLLOWER_WAIT_MARGIN)))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller (the leader) runs the function; callers arriving while it
+    runs wait for it and receive a deep copy of its result (routes add fields
+    to results afterwards), or the same exception. A follower waits at most
+    max_wait seconds, then raises Saturated (routes answer 503) rather than
+    holding its request thread for as long as the leader hangs. Nothing is
+    kept once the call finishes: repeated work after that is the result
+    cache's job.
+    """
+
+    def __init__(self, max_wait=FOLLOWER_MAX_WAIT):
+        self.max_wait = max_wait
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+        self.timed_out = 0
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                call.followers += 1
+                self.coalesced += 1
+
+        if not leader:
+            print("🔗 Joined an identical in-flight request")
+            if not call.done.wait(self.max_wait):
+                with self._lock:
+                    self.timed_out += 1
+                retry_after = admission.retry_after()
+                print(f"⏱️ Gave up on an identical in-flight request after {self.max_wait:.0f}s; retry after {retry_after}s")
+                raise Saturated("An identical answer key request is taking too long", retry_after)
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = function()
+        except Exception as e:
+            call.error = e
+            raise
+        else:
+            call.result = result
+        finally:
+            # Closes the call to newcomers and fixes its follower count in one step
+            with self._lock:
+                self._calls.pop(key, None)
+                shared = call.followers > 0
+            call.done.set()
+        # Followers copy call.result, so the leader's route must not get that object
+        return copy.deepcopy(result) if shared else result
+
+    def __len__(self):
+        return len(self._calls)
+
+
+# Process-wide coalescer shared by all routes
+single_flight = SingleFlight()
+
+
+def normalise_url(url):
+    """
+    Canonical form of an answer key URL: lower-case scheme and host, no default
+    port or fragment, query parameters sorted.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and not ((scheme == 'http' and parts.port == 80) or (scheme == 'https' and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+
+def url_key(exam, url):
+    return (exam, 'url', normalise_url(url))
+
+
+def upload_key(exam, content):
+    """Key of an uploaded page: exam plus the SHA-256 of its content."""
+    return (exam, 'upload', hashlib.sha256(content.encode('utf-8')).hexdigest())
+
+
+def coalesce(key, function):
+    """Runs function once for all concurrent callers with the same key."""
+    return single_flight.do(key, function)
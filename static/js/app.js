@@ -0,0 +1,20 @@
+// The two Bootstrap behaviours the pages use: the navbar toggler and dismissible alerts
+(function () {
+  document.addEventListener('click', function (event) {
+    var toggle = event.target.closest('[data-bs-toggle="collapse"]');
+    if (toggle) {
+      var target = document.querySelector(toggle.getAttribute('data-bs-target'));
+      if (target) {
+        var open = target.classList.toggle('show');
+        toggle.classList.toggle('collapsed', !open);
+        toggle.setAttribute('aria-expanded', open ? 'true' : 'false');
+      }
+      return;
+    }
+    var dismiss = event.target.closest('[data-bs-dismiss="alert"]');
+    if (dismiss) {
+      var alert = dismiss.closest('.alert');
+      if (alert) alert.remove();
+    }
+  });
+})();
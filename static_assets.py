@@ -0,0 +1,318 @@
+import io
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+
+from markupsafe import Markup
+
+# Try to import the font subsetter (optional, only used by the asset build)
+try:
+    from fontTools import subset as font_subset
+    from fontTools.ttLib import TTFont
+    FONTTOOLS_AVAILABLE = True
+except ImportError:
+    FONTTOOLS_AVAILABLE = False
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+
+# Fingerprinted assets are served under this path and never change
+ASSET_URL_PREFIX = '/assets/'
+ASSET_MAX_AGE = 31536000
+# Earlier fingerprints (e.g. linked by stored permalink pages) get the current
+# file, cached briefly since it is not the content their name stands for
+PREVIOUS_ASSET_MAX_AGE = 3600
+# Types worth gzipping (fonts and images are compressed already)
+COMPRESSIBLE = ('.css', '.js', '.svg', '.txt', '.json')
+
+# Third-party assets, written to static/vendor by `python static_assets.py`.
+# Until that has been run, pages link the same pinned versions on jsDelivr.
+BOOTSTRAP_CSS_URL = "https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css"
+BOOTSTRAP_ICONS_URL = "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.1/font/bootstrap-icons.css"
+BOOTSTRAP_ICONS_FONT_URL = "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.1/font/fonts/bootstrap-icons.woff2"
+VENDOR_ASSETS = {
+    'vendor/bootstrap.min.css': BOOTSTRAP_CSS_URL,
+    'vendor/bootstrap-icons.css': BOOTSTRAP_ICONS_URL,
+}
+ICONS_FONT = 'vendor/fonts/bootstrap-icons.woff2'
+
+# Classes that only appear at runtime: flash categories (alert-{{ category }})
+# and the state classes static/js/app.js toggles
+KEEP_CLASSES = {'alert-danger', 'alert-warning', 'alert-success', 'alert-info', 'show', 'collapsed'}
+
+# css/app.<hash>.css -> (css/app, .css)
+_HASHED_NAME = re.compile(r'^(.+)\.[0-9a-f]{10}(\.[^./]+)$')
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def fingerprint(name, data):
+    """'css/app.css' -> 'css/app.<hash>.css' (see content_hash())."""
+    root, ext = os.path.splitext(name)
+    return f"{root}.{content_hash(data)}{ext}"
+
+
+class Asset:
+    """A static file held in memory, with its fingerprinted name and gzipped body."""
+
+    __slots__ = ('name', 'hashed_name', 'data', 'gzip_data', 'mimetype', 'etag')
+
+    def __init__(self, name, data):
+        root, ext = os.path.splitext(name)
+        self.etag = content_hash(data)
+        self.name = name
+        self.hashed_name = f"{root}.{self.etag}{ext}"
+        self.data = data
+        self.gzip_data = None
+        if name.endswith(COMPRESSIBLE):
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) < len(data):
+                self.gzip_data = compressed
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.mimetype = mimetype + '; charset=utf-8' if mimetype.startswith('text/') else mimetype
+
+
+class AssetManifest:
+    """
+    The static files of the site, read once per process. Pages link them by
+    fingerprinted URL (asset_url('css/app.css') -> /assets/css/app.<hash>.css),
+    so browsers and CDNs may keep every response for a year: a changed file
+    gets a new URL. Vendor assets that have not been built link their CDN copy.
+    Small stylesheets are inlined instead (inline_asset('css/app.css')).
+    """
+
+    def __init__(self, root=STATIC_DIR):
+        self.root = root
+        self.by_name = {}
+        self.by_hashed_name = {}
+        self.load()
+
+    def load(self):
+        by_name = {}
+        if os.path.isdir(self.root):
+            for directory, _, files in os.walk(self.root):
+                for filename in files:
+                    path = os.path.join(directory, filename)
+                    name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                    with open(path, 'rb') as f:
+                        by_name[name] = Asset(name, f.read())
+        self.by_name = by_name
+        self.by_hashed_name = {asset.hashed_name: asset for asset in by_name.values()}
+        missing = [name for name in VENDOR_ASSETS if name not in by_name]
+        if missing:
+            print(f"⚠️ Vendor assets not built, pages link jsDelivr for {', '.join(missing)}: run python static_assets.py")
+
+    def url(self, name):
+        """
+        The URL of a static file for templates.
+
+        Raises:
+            KeyError: If there is no such file (and no CDN copy of it).
+        """
+        asset = self.by_name.get(name)
+        if asset is not None:
+            return ASSET_URL_PREFIX + asset.hashed_name
+        if name in VENDOR_ASSETS:
+            return VENDOR_ASSETS[name]
+        raise KeyError(f"No static asset {name!r}")
+
+    def inline(self, name):
+        """The text of a static file for inlining into a page (e.g. a <style> block)."""
+        return Markup(self.by_name[name].data.decode('utf-8'))
+
+    def get(self, hashed_name):
+        """
+        The asset served at a fingerprinted name, or None. An earlier fingerprint
+        of a file gets its current version (check asset.hashed_name against the
+        name asked for before caching the response for good).
+        """
+        asset = self.by_hashed_name.get(hashed_name)
+        if asset is None:
+            match = _HASHED_NAME.match(hashed_name)
+            if match:
+                asset = self.by_name.get(match.group(1) + match.group(2))
+        return asset
+
+    def stats(self):
+        return {'assets': len(self.by_name), 'bytes': sum(len(asset.data) for asset in self.by_name.values()),
+                'vendor_built': all(name in self.by_name for name in VENDOR_ASSETS)}
+
+
+# Process-wide manifest used by the templates and the /assets/ route
+asset_manifest = AssetManifest()
+
+
+# --- Vendor asset build ---
+
+# Comments, strings and the characters that give a stylesheet its structure
+_CSS_TOKENS = re.compile(r'/\*.*?\*/|"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|[{};]', re.S)
+_CSS_STRINGS = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'')
+_NEGATIONS = re.compile(r':not\([^()]*\)')
+_CLASS = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+_WORD = re.compile(r'[A-Za-z][\w-]*')
+_GLYPH = re.compile(r'content:\s*"\\([0-9a-fA-F]+)"')
+_FONT_SRC = re.compile(r'src:[^;}]*')
+
+
+def _css_blocks(css):
+    """Top-level (prelude, body) pairs of a stylesheet; body is None for statements such as @charset."""
+    depth = 0
+    start = opened = 0
+    for match in _CSS_TOKENS.finditer(css):
+        token = match.group()
+        if token.startswith('/*'):
+            if depth == 0:
+                # Licence banners (/*! ... */) are kept, other comments dropped
+                if token.startswith('/*!'):
+                    yield token, None
+                start = match.end()
+        elif token == '{':
+            if depth == 0:
+                opened = match.start()
+            depth += 1
+        elif token == '}':
+            depth -= 1
+            if depth == 0:
+                yield css[start:opened].strip(), css[opened + 1:match.start()]
+                start = match.end()
+        elif token == ';' and depth == 0:
+            yield css[start:match.start()].strip() + ';', None
+            start = match.end()
+
+
+def _split_selectors(prelude):
+    selectors, depth, start = [], 0, 0
+    for i, ch in enumerate(prelude):
+        if ch in '([':
+            depth += 1
+        elif ch in ')]':
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            selectors.append(prelude[start:i].strip())
+            start = i + 1
+    selectors.append(prelude[start:].strip())
+    return selectors
+
+
+def _selector_used(selector, used):
+    # Classes inside :not() are ones the element must *not* have
+    classes = _CLASS.findall(_NEGATIONS.sub('', _CSS_STRINGS.sub('""', selector)))
+    return all(name in used for name in classes)
+
+
+def prune_css(css, used):
+    """
+    Drops the selectors of a stylesheet that need a class the pages never use,
+    and the rules left without selectors. Rules without classes (element
+    selectors, :root), @font-face and @keyframes are kept; @media and
+    @supports blocks are pruned recursively.
+
+    Args:
+        css (str): The stylesheet.
+        used (set): Class names the pages use.
+
+    Returns:
+        str: The pruned stylesheet, minified as far as rule layout goes.
+    """
+    out = []
+    for prelude, body in _css_blocks(css):
+        if body is None:
+            out.append(prelude + ('\n' if prelude.startswith('/*!') else ''))
+        elif prelude.startswith(('@media', '@supports', '@layer', '@container')):
+            inner = prune_css(body, used)
+            if inner:
+                out.append(f"{prelude}{{{inner}}}")
+        elif prelude.startswith('@'):
+            out.append(f"{prelude}{{{body.strip()}}}")
+        else:
+            selectors = [selector for selector in _split_selectors(prelude) if _selector_used(selector, used)]
+            if selectors:
+                out.append(f"{','.join(selectors)}{{{body.strip()}}}")
+    return ''.join(out)
+
+
+def used_classes(templates_dir=TEMPLATES_DIR):
+    """Every class-like word in the templates (markup, Jinja and inline scripts alike), plus KEEP_CLASSES."""
+    words = set(KEEP_CLASSES)
+    for filename in sorted(os.listdir(templates_dir)):
+        if filename.endswith(('.html', '.xml', '.txt')):
+            with open(os.path.join(templates_dir, filename), encoding='utf-8') as f:
+                words.update(_WORD.findall(f.read()))
+    return words
+
+
+def subset_font(data, codepoints):
+    """The WOFF2 font cut down to the given codepoints, or unchanged without fontTools (or brotli)."""
+    if not FONTTOOLS_AVAILABLE:
+        return data
+    try:
+        font = TTFont(io.BytesIO(data))
+        options = font_subset.Options()
+        options.flavor = 'woff2'
+        subsetter = font_subset.Subsetter(options)
+        subsetter.populate(unicodes=codepoints)
+        subsetter.subset(font)
+        out = io.BytesIO()
+        font.flavor = 'woff2'
+        font.save(out)
+        return out.getvalue()
+    except Exception as e:
+        print(f"⚠️ Icon font not subset, shipping it whole: {e}")
+        return data
+
+
+def _write(root, name, data):
+    path = os.path.join(root, *name.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    print(f"✓ {name}: {len(data) / 1024:.1f} KB")
+
+
+def build_vendor_assets(root=STATIC_DIR, templates_dir=TEMPLATES_DIR, session=None):
+    """
+    Downloads the pinned Bootstrap CSS and Bootstrap Icons, keeps only the
+    rules (and icon glyphs) the templates use, and writes them to
+    static/vendor, where the manifest picks them up.
+    """
+    import requests
+
+    session = session or requests
+    used = used_classes(templates_dir)
+
+    def download(url):
+        response = session.get(url, timeout=60)
+        response.raise_for_status()
+        return response.content
+
+    bootstrap = download(BOOTSTRAP_CSS_URL).decode('utf-8')
+    _write(root, 'vendor/bootstrap.min.css', prune_css(bootstrap, used).encode('utf-8'))
+
+    icons = prune_css(download(BOOTSTRAP_ICONS_URL).decode('utf-8'), used)
+    codepoints = {int(glyph, 16) for glyph in _GLYPH.findall(icons)}
+    font = subset_font(download(BOOTSTRAP_ICONS_FONT_URL), codepoints)
+    # The stylesheet is served from vendor/, so the font URL is relative to that
+    font_url = fingerprint(ICONS_FONT, font)[len('vendor/'):]
+    icons = _FONT_SRC.sub(lambda _: f'src:url("{font_url}") format("woff2")', icons)
+    _write(root, ICONS_FONT, font)
+    _write(root, 'vendor/bootstrap-icons.css', icons.encode('utf-8'))
+    print(f"✓ Vendor assets built: {len(codepoints)} icon(s) kept")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the self-hosted Bootstrap subset into static/vendor")
+    parser.add_argument('--list', action='store_true', help="List the fingerprinted assets instead")
+    args = parser.parse_args()
+    if args.list:
+        for asset in sorted(asset_manifest.by_name.values(), key=lambda asset: asset.name):
+            gzipped = f", {len(asset.gzip_data) / 1024:.1f} KB gzipped" if asset.gzip_data else ''
+            print(f"{ASSET_URL_PREFIX}{asset.hashed_name}  ({len(asset.data) / 1024:.1f} KB{gzipped})")
+    else:
+        build_vendor_assets()
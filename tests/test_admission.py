@@ -0,0 +1,109 @@
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from admission import MAX_RETRY_AFTER, MIN_RETRY_AFTER, AdmissionController, Saturated
+
+URL = 'https://cdn3.digialm.com/per/g28/pub/2207/touchstone/AssessmentQPHTMLMode1/sheet.html'
+
+
+def small_controller(max_queue, max_wait=5.0):
+    return AdmissionController(max_outbound=1, max_per_host=1, max_queue=max_queue, max_wait=max_wait,
+                               worker_threads=64, reserved_share=0)
+
+
+class HeldSlot:
+    """Holds a controller's only fetch slot on another thread until released."""
+
+    def __init__(self, controller, url=URL):
+        self.entered, self.release = threading.Event(), threading.Event()
+        self.thread = threading.Thread(target=self._hold, args=(controller, url))
+        self.thread.start()
+        self.entered.wait(5)
+
+    def _hold(self, controller, url):
+        with controller.admit(url):
+            self.entered.set()
+            self.release.wait(5)
+
+    def stop(self):
+        self.release.set()
+        self.thread.join(5)
+
+
+class AdmissionControllerTest(unittest.TestCase):
+
+    def test_full_queue_rejects_at_once(self):
+        controller = small_controller(max_queue=1)
+        held = HeldSlot(controller)
+        self.addCleanup(held.stop)
+        queued = threading.Event()
+
+        def wait_for_slot():
+            queued.set()
+            try:
+                with controller.admit(URL):
+                    pass
+            except Saturated:
+                pass
+
+        waiter = threading.Thread(target=wait_for_slot)
+        waiter.start()
+        queued.wait(5)
+        while not controller.stats()['waiting']:
+            pass
+
+        with self.assertRaises(Saturated) as raised:
+            with controller.admit(URL):
+                pass
+        self.assertIn('queue full', str(raised.exception))
+        self.assertTrue(MIN_RETRY_AFTER <= raised.exception.retry_after <= MAX_RETRY_AFTER)
+        self.assertEqual(controller.stats()['rejected'], 1)
+
+        held.stop()
+        waiter.join(5)
+        self.assertEqual(controller.stats()['admitted'], 2)
+
+    def test_wait_runs_out(self):
+        controller = small_controller(max_queue=4, max_wait=0.1)
+        held = HeldSlot(controller)
+        self.addCleanup(held.stop)
+        with self.assertRaises(Saturated) as raised:
+            with controller.admit(URL):
+                pass
+        self.assertIn('timed out', str(raised.exception))
+
+    def test_retry_after_grows_with_backlog(self):
+        controller = small_controller(max_queue=0)
+        controller._hold_seconds = 10.0
+        self.assertEqual(controller.retry_after(), 10)
+        controller._active = 100
+        self.assertEqual(controller.retry_after(), MAX_RETRY_AFTER)
+
+
+class ServiceBusyTest(unittest.TestCase):
+
+    def test_unadmitted_url_answers_503_with_retry_after(self):
+        controller = small_controller(max_queue=0)
+        controller._hold_seconds = 3.0
+        held = HeldSlot(controller)
+        self.addCleanup(held.stop)
+
+        def fetch(source, **kwargs):
+            with controller.admit(source):
+                return None
+
+        with mock.patch.object(main, 'scrape_mts_key', fetch):
+            response = main.create_app({'TESTING': True}).test_client().post('/mts', data={'ans_key_url': URL})
+        self.assertEqual(response.status_code, 503)
+        # One fetch holding its slot for about 3s, plus this request, over one slot
+        self.assertEqual(response.headers['Retry-After'], '6')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answer_key_index import ShiftKeyIndex
+from answer_sheet import UNREAD, AnswerSheet
+
+QUESTION_IDS = ['q1', 'q2', 'q3', 'q4']
+
+
+def page(roll_no):
+    return {'roll_no': roll_no, 'exam_date': '01/09/2025', 'exam_time': '9:00 AM - 10:30 AM'}
+
+
+def sheet(key, question_ids=QUESTION_IDS):
+    return AnswerSheet(question_ids, '1' * len(question_ids), key,
+                       [{'name': 'Part A', 'group': 0, 'start': 0, 'end': len(question_ids)}])
+
+
+class ShiftKeyIndexTest(unittest.TestCase):
+
+    def test_first_page_does_not_override_later_pages(self):
+        index = ShiftKeyIndex()
+        index.reconcile('mts', page('1'), sheet('1234'), trusted=True)
+        key, key_check = index.reconcile('mts', page('2'), sheet('1231'), trusted=True)
+        self.assertEqual(key, '1231')
+        self.assertEqual(key_check['mismatched_questions'], ['q4'])
+        self.assertEqual(key_check['overridden_questions'], [])
+
+    def test_agreed_key_overrides_after_quorum(self):
+        index = ShiftKeyIndex()
+        for roll_no in ('1', '2', '3'):
+            index.reconcile('mts', page(roll_no), sheet('1234'), trusted=True)
+        key, key_check = index.reconcile('mts', page('4'), sheet('1231'), trusted=True)
+        self.assertEqual(key, '1234')
+        self.assertEqual(key_check['overridden_questions'], ['q4'])
+
+    def test_repeated_and_uploaded_sheets_do_not_vote(self):
+        index = ShiftKeyIndex()
+        for _ in range(3):
+            index.reconcile('mts', page('1'), sheet('1234'), trusted=True)
+        for roll_no in ('2', '3'):
+            index.reconcile('mts', page(roll_no), sheet('1234'), trusted=False)
+        key, _ = index.reconcile('mts', page('4'), sheet('1231'), trusted=True)
+        self.assertEqual(key, '1231')
+        self.assertEqual(index.agreed_shifts('mts'), frozenset())
+
+    def test_unread_key_uses_agreed_key(self):
+        index = ShiftKeyIndex()
+        for roll_no in ('1', '2', '3'):
+            index.reconcile('mts', page(roll_no), sheet('1234'), trusted=True)
+        self.assertEqual(len(index.agreed_shifts('mts')), 1)
+        key, _ = index.reconcile('mts', page('4'), sheet(UNREAD * 4), trusted=True)
+        self.assertEqual(key, '1234')
+        # A question the shift has not agreed on cannot be scored without the page's key
+        key, _ = index.reconcile('mts', page('5'), sheet(UNREAD * 5, QUESTION_IDS + ['q5']), trusted=True)
+        self.assertIsNone(key)
+
+    def test_revision_overrides_every_key(self):
+        index = ShiftKeyIndex(revisions=lambda shift: (0.0, {'q2': '4'}))
+        key, key_check = index.reconcile('mts', page('1'), sheet('1234'), trusted=True)
+        self.assertEqual(key, '1434')
+        self.assertEqual(key_check['revised_questions'], ['q2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
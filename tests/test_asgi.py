@@ -0,0 +1,81 @@
+import os
+import sys
+import asyncio
+import unittest
+from unittest import mock
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asgi
+import fetch_pipeline
+from admission import Saturated
+from cache_backends import MemoryCache
+from fetch_pipeline import Prefetched
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+URL = 'https://cdn3.digialm.com/per/g28/pub/2207/touchstone/AssessmentQPHTMLMode1/sheet.html'
+
+
+def call_app(method, path, form=None):
+    """Runs one HTTP request through the ASGI app; returns (status, headers, body)."""
+    body = urlencode(form or {}).encode('ascii')
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'http_version': '1.1',
+        'headers': [(b'host', b'testserver'), (b'content-type', b'application/x-www-form-urlencoded'),
+                    (b'content-length', str(len(body)).encode('ascii'))],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app(scope, receive, send))
+    start = sent[0]
+    headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in start['headers']}
+    return start['status'], headers, b''.join(message.get('body', b'') for message in sent[1:])
+
+
+class PrefetchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.prefetched = []
+        for patcher in (mock.patch.object(asgi, 'prefetch_page', self.fake_prefetch),
+                        mock.patch('cache_backends.cache', MemoryCache()),
+                        # The view must use the prefetched page and never fetch it again
+                        mock.patch.object(fetch_pipeline, 'default_pipeline', side_effect=AssertionError('fetched'))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.outcome = None
+
+    async def fake_prefetch(self, exam, url):
+        self.prefetched.append((exam, url))
+        return self.outcome
+
+    def test_view_scores_the_prefetched_page(self):
+        with open(os.path.join(FIXTURES, 'je_tcs.html'), 'r', encoding='utf-8') as f:
+            self.outcome = Prefetched(html_content=f.read())
+        status, _, body = call_app('POST', '/ssc-je', {'ans_key_url': URL})
+        self.assertEqual(self.prefetched, [('je', URL)])
+        self.assertEqual(status, 200)
+        self.assertIn(b'2201001234', body)
+
+    def test_prefetch_error_reaches_the_view(self):
+        self.outcome = Prefetched(error=Saturated('busy', 9))
+        status, headers, _ = call_app('POST', '/mts', {'ans_key_url': URL})
+        self.assertEqual((status, headers['retry-after']), (503, '9'))
+
+    def test_requests_without_a_url_are_not_prefetched(self):
+        status, _, _ = call_app('GET', '/mts')
+        self.assertEqual(status, 200)
+        call_app('POST', '/mts', {'ans_key_url': 'not a link'})
+        self.assertEqual(self.prefetched, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
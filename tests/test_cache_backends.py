@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache_backends
+from answer_key_index import REVISION_REFRESH, shift_key_index
+from cache_backends import (FileSystemCache, MemoryCache, RedisCache, SQLiteCache, _StandInRedisServer,
+                            _check_backend, cache_from_url)
+
+SHIFT = ('mts', '01/09/2025', '9:00 AM - 10:30 AM')
+RESULT = {
+    'candidate_info': {'roll_no': '2201001200', 'exam_date': SHIFT[1], 'exam_time': SHIFT[2]},
+    'exam_summary': {'total_marks': 12.0},
+    'section_details': [],
+}
+
+
+class BackendTest(unittest.TestCase):
+
+    def test_backends_round_trip_and_expire(self):
+        workdir = tempfile.mkdtemp()
+        for backend in (MemoryCache(),
+                        FileSystemCache(os.path.join(workdir, 'files')),
+                        SQLiteCache(os.path.join(workdir, 'cache.sqlite3')),
+                        RedisCache('127.0.0.1', _StandInRedisServer().port)):
+            with self.subTest(backend=backend.name):
+                _check_backend(backend)
+
+    def test_memory_cache_evicts_oldest_over_limit(self):
+        memory = MemoryCache(max_bytes=1000)
+        for i in range(20):
+            memory.set(f'k{i}', b'x' * 100)
+        self.assertIsNone(memory.get('k0'))
+        self.assertEqual(memory.get('k19'), b'x' * 100)
+
+    def test_cache_url_selects_backend(self):
+        self.assertEqual(cache_from_url('memory://?max_bytes=10').max_bytes, 10)
+        self.assertEqual(cache_from_url('none://').name, 'none')
+        self.assertEqual(cache_from_url('redis://:pw@cache:6380/2').port, 6380)
+        with self.assertRaises(ValueError):
+            cache_from_url('ftp://host')
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.published = None
+        for patcher in (mock.patch.object(cache_backends, 'cache', MemoryCache()),
+                        mock.patch.object(shift_key_index, 'revisions', lambda shift: self.published)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(shift_key_index._revisions.clear)
+
+    def test_result_round_trip(self):
+        cache_backends.set_result('mts', 'https://example.com/sheet', RESULT)
+        self.assertEqual(cache_backends.get_result('mts', 'https://example.com/sheet')['exam_summary'],
+                         RESULT['exam_summary'])
+        self.assertIsNone(cache_backends.get_result('je', 'https://example.com/sheet'))
+
+    def test_revision_invalidates_older_results(self):
+        cache_backends.set_result('mts', 'https://example.com/sheet', RESULT)
+        self.published = (time.time(), {'q1': '2'})
+        shift_key_index._revisions.clear()
+        self.assertIsNone(cache_backends.get_result('mts', 'https://example.com/sheet'))
+
+        # Results cached well after the revision was published are served again
+        self.published = (time.time() - REVISION_REFRESH - 1, {'q1': '2'})
+        shift_key_index._revisions.clear()
+        self.assertIsNotNone(cache_backends.get_result('mts', 'https://example.com/sheet'))
+
+
+if __name__ == '__main__':
+    unittest.main()
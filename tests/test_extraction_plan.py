@@ -0,0 +1,62 @@
+import contextlib
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_backend import make_soup
+from extraction_plan import PlanCache, fingerprint_layout
+with contextlib.redirect_stdout(io.StringIO()):
+    from scraper_chsl import CHSL_TCS_LAYOUT
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_page(html_content):
+    soup = make_soup(html_content)
+    return soup, soup.find('div', class_='wrapper')
+
+
+class PlanCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(FIXTURES, 'chsl_tcs.html'), 'r', encoding='utf-8') as f:
+            self.page = f.read()
+
+    def test_same_layout_reuses_plan(self):
+        cache = PlanCache()
+        first = cache.get_plan(*load_page(self.page), CHSL_TCS_LAYOUT)
+        # Another candidate of the same shift: different values, same structure
+        other = self.page.replace('2201001234', '2201005678').replace('RAHUL KUMAR', 'ASHA DEVI')
+        soup, wrapper = load_page(other)
+        self.assertIs(cache.get_plan(soup, wrapper, CHSL_TCS_LAYOUT), first)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(first.candidate_info(soup)['roll_no'], '2201005678')
+
+    def test_changed_layout_compiles_new_plan(self):
+        cache = PlanCache()
+        first = cache.get_plan(*load_page(self.page), CHSL_TCS_LAYOUT)
+        # Swapping two candidate rows moves the fields: the old row positions must not be reused
+        swapped = self.page.replace('<td>Venue Name</td>', '<td>@@</td>').replace(
+            '<td>Candidate Name</td>', '<td>Venue Name</td>').replace('<td>@@</td>', '<td>Candidate Name</td>')
+        soup, wrapper = load_page(swapped)
+        self.assertNotEqual(fingerprint_layout(soup, wrapper, CHSL_TCS_LAYOUT),
+                            fingerprint_layout(*load_page(self.page), CHSL_TCS_LAYOUT))
+        second = cache.get_plan(soup, wrapper, CHSL_TCS_LAYOUT)
+        self.assertIsNot(second, first)
+        self.assertEqual(len(cache), 2)
+        info = second.candidate_info(soup)
+        self.assertEqual((info['cand_name'], info['venue_name']), ('iON Digital Zone', 'RAHUL KUMAR'))
+
+    def test_least_recently_used_plan_is_evicted(self):
+        cache = PlanCache(max_plans=1)
+        first = cache.get_plan(*load_page(self.page), CHSL_TCS_LAYOUT)
+        cache.get_plan(*load_page(self.page.replace('section-lbl-text', 'section-title')), CHSL_TCS_LAYOUT)
+        self.assertEqual(len(cache), 1)
+        self.assertIsNot(cache.get_plan(*load_page(self.page), CHSL_TCS_LAYOUT), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import contextlib
+import io
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_backend import FALLBACK_BACKEND, available_backends, use_backend
+from html_prefilter import PREFILTER_ENV_VAR
+from scraper import extract_answer_key
+from scraper_je import extract_je_answer_key
+from scraper_chsl import extract_chsl_answer_key
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# fixture page -> extract function that must read it
+PAGES = {
+    'mts_tcs.html': extract_answer_key,
+    'je_tcs.html': extract_je_answer_key,
+    'chsl_tcs.html': extract_chsl_answer_key,
+    'chsl_eduquity.html': extract_chsl_answer_key,
+}
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def extract_view(extract, html_content, backend, prefilter):
+    """Runs one extract_* function and reduces its output to plain values."""
+    env = {PREFILTER_ENV_VAR: '1' if prefilter else '0'}
+    with use_backend(backend), mock.patch.dict(os.environ, env), contextlib.redirect_stdout(io.StringIO()):
+        extracted = extract(html_content)
+    page_format = None
+    if isinstance(extracted, tuple) and extracted[0] in ('tcs', 'eduquity'):
+        page_format, extracted = extracted
+    if isinstance(extracted, tuple):
+        candidate_info, sheet = extracted
+        extracted = {'candidate_info': candidate_info, 'answer_sheet': sheet.to_dict()}
+    return page_format, extracted
+
+
+@unittest.skipUnless('lxml' in available_backends(), 'lxml is not installed')
+class BackendConformanceTest(unittest.TestCase):
+
+    def test_fixtures_extract_identically(self):
+        for name, extract in PAGES.items():
+            html_content = read_fixture(name)
+            reference = extract_view(extract, html_content, FALLBACK_BACKEND, prefilter=False)
+            self.assertIsNotNone(reference[1], name)
+            for backend in (FALLBACK_BACKEND, 'lxml'):
+                for prefilter in (False, True):
+                    with self.subTest(page=name, backend=backend, prefilter=prefilter):
+                        self.assertEqual(extract_view(extract, html_content, backend, prefilter), reference)
+
+    def test_fixtures_cover_every_section(self):
+        _, extracted = extract_view(extract_je_answer_key, read_fixture('je_tcs.html'), 'lxml', prefilter=True)
+        sheet = extracted['answer_sheet']
+        self.assertEqual(len(sheet['question_ids']), 12)
+        self.assertEqual([section['name'] for section in sheet['sections']],
+                         ['General Intelligence', 'General Awareness', 'Quantitative Aptitude'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import contextlib
+import io
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_backend import make_soup
+from html_prefilter import PREFILTER_ENV_VAR, prefilter_enabled, prefilter_html
+from scraper import extract_answer_key
+from scraper_je import extract_je_answer_key
+from scraper_chsl import extract_chsl_answer_key
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def extract_sheet(extract, html_content, prefilter):
+    """Returns (candidate_info, compact sheet) with the pre-filter on or off."""
+    with mock.patch.dict(os.environ, {PREFILTER_ENV_VAR: '1' if prefilter else '0'}), \
+            contextlib.redirect_stdout(io.StringIO()):
+        extracted = extract(html_content)
+    if extracted[0] == 'tcs':
+        extracted = extracted[1]
+    candidate_info, sheet = extracted
+    return candidate_info, sheet.to_dict()
+
+
+class PrefilterTest(unittest.TestCase):
+
+    def test_extraction_matches_unfiltered_page(self):
+        for name, extract in (('mts_tcs.html', extract_answer_key),
+                              ('je_tcs.html', extract_je_answer_key),
+                              ('chsl_tcs.html', extract_chsl_answer_key)):
+            html_content = read_fixture(name)
+            with self.subTest(page=name):
+                self.assertEqual(extract_sheet(extract, html_content, prefilter=True),
+                                 extract_sheet(extract, html_content, prefilter=False))
+
+    def test_panels_keep_only_read_cells(self):
+        html_content = read_fixture('mts_tcs.html')
+        filtered = prefilter_html(html_content)
+        self.assertLess(len(filtered), len(html_content) // 2)
+        for dropped in ('<script', '<style', '<head', '<img', '<!--', 'questionRowTbl', 'nested table'):
+            self.assertNotIn(dropped, filtered)
+
+        soup = make_soup(filtered)
+        panels = soup.find_all('div', class_='question-pnl')
+        self.assertEqual(len(panels), 12)
+        # Question type, question ID and chosen option survive; option IDs do not
+        bold = [cell.text for cell in panels[0].find('table', class_='menu-tbl').find_all('td', class_='bold')]
+        self.assertEqual(bold[:2], ['MCQ', '630096101'])
+        self.assertEqual(len(bold), 3)
+        # The bonus question still has no rightAns cell
+        self.assertIsNone(panels[-1].find('td', class_='rightAns'))
+        self.assertEqual(soup.find('table').find_all('td')[1].text, '2201001234')
+
+    def test_disabled_returns_page_unchanged(self):
+        html_content = read_fixture('je_tcs.html')
+        with mock.patch.dict(os.environ, {PREFILTER_ENV_VAR: 'off'}):
+            self.assertFalse(prefilter_enabled())
+            self.assertIs(prefilter_html(html_content), html_content)
+
+
+if __name__ == '__main__':
+    unittest.main()
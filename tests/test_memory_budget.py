@@ -0,0 +1,79 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from werkzeug.datastructures import FileStorage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+import memory_budget
+from memory_budget import PageTooLarge, read_page_file, read_upload
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+LIMIT = 4096
+
+
+class ReadTrackingStream(io.BytesIO):
+    """Records how many bytes were read."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+class PageSizeCapTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(memory_budget, 'MAX_PAGE_BYTES', LIMIT)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_upload_read_stops_past_the_limit(self):
+        stream = ReadTrackingStream(b'x' * (LIMIT * 10))
+        with self.assertRaises(PageTooLarge):
+            read_upload(FileStorage(stream, filename='sheet.html'))
+        self.assertEqual(stream.bytes_read, LIMIT + 1)
+
+    def test_upload_at_the_limit_is_read(self):
+        page = 'é' * (LIMIT // 2)
+        self.assertEqual(read_upload(FileStorage(io.BytesIO(page.encode('utf-8')), filename='sheet.html')), page)
+
+    def test_saved_page_checked_before_reading(self):
+        path = os.path.join(tempfile.mkdtemp(), 'sheet.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('x' * (LIMIT + 1))
+        with mock.patch('builtins.open') as opened, self.assertRaises(PageTooLarge):
+            read_page_file(path)
+        opened.assert_not_called()
+
+    def test_oversized_upload_answers_413(self):
+        with open(os.path.join(FIXTURES, 'mts_tcs.html'), 'rb') as f:
+            page = f.read()
+        self.assertGreater(len(page), LIMIT)
+        client = main.create_app({'TESTING': True}).test_client()
+        with mock.patch.object(main, 'scrape_mts_key') as scrape:
+            response = client.post('/mts', data={'ans_key_file': (io.BytesIO(page), 'sheet.html')},
+                                   content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 413)
+        scrape.assert_not_called()
+
+    def test_request_above_content_length_is_refused(self):
+        client = main.create_app({'TESTING': True, 'MAX_CONTENT_LENGTH': LIMIT}).test_client()
+        with mock.patch.object(main, 'scrape_mts_key') as scrape:
+            response = client.post('/mts', data={'ans_key_file': (io.BytesIO(b'x' * LIMIT * 2), 'sheet.html')},
+                                   content_type='multipart/form-data')
+        self.assertEqual((response.status_code, response.headers['Location']), (302, '/mts'))
+        scrape.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
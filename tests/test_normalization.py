@@ -0,0 +1,63 @@
+import os
+import sys
+import random
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from normalization import MIN_SHIFT_SCORES, NormalisationEngine
+from rank_index import ShiftRankIndex
+from result_store import ResultStore
+
+
+def shift_info(shift_no):
+    return {'exam_date': '01/09/2025', 'exam_time': f'shift-{shift_no}'}
+
+
+def stored_result(roll_no, info, marks):
+    return {'candidate_info': {'roll_no': str(roll_no), **info}, 'exam_summary': {'total_marks': marks},
+            'section_details': [], 'question_wise_data': {}}
+
+
+class StoredNormalisationTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(7)
+        self.store = ResultStore(os.path.join(tempfile.mkdtemp(), 'results.sqlite3'))
+        self.index = ShiftRankIndex()
+        for shift_no, mean in enumerate((100, 140)):
+            for n in range(MIN_SHIFT_SCORES + 10):
+                marks = round(rng.gauss(mean, 25) * 4) / 4
+                self.store.save('mts', stored_result(f'{shift_no}{n:04d}', shift_info(shift_no), marks), trusted=True)
+                self.index.record('mts', shift_info(shift_no), marks)
+        # Uploads are not part of the cohort
+        self.store.save('mts', stored_result('99999', shift_info(0), 300), trusted=False)
+        self.store.flush()
+
+    def test_store_matches_the_rank_index(self):
+        from_store = NormalisationEngine(index=ShiftRankIndex(), store=self.store)
+        from_index = NormalisationEngine(index=self.index, store=None)
+        for score in (60, 100, 125.5, 180):
+            stored = from_store.normalise('mts', shift_info(0), score)
+            indexed = from_index.normalise('mts', shift_info(0), score)
+            self.assertIsNotNone(stored)
+            self.assertEqual(stored, indexed)
+        self.assertEqual(from_store.normalise_many(('mts', '01/09/2025', 'shift-1'), [100, 150]),
+                         from_index.normalise_many(('mts', '01/09/2025', 'shift-1'), [100, 150]))
+
+    def test_new_scores_are_read_after_the_refresh_interval(self):
+        engine = NormalisationEngine(index=ShiftRankIndex(), store=self.store, refresh=0)
+        before = engine.normalise('mts', shift_info(0), 100)['shift_total']
+        self.store.save('mts', stored_result('77777', shift_info(0), 90), trusted=True)
+        self.store.flush()
+        self.assertEqual(engine.normalise('mts', shift_info(0), 100)['shift_total'], before + 1)
+
+    def test_unknown_shift_is_not_normalised(self):
+        engine = NormalisationEngine(index=ShiftRankIndex(), store=self.store)
+        self.assertIsNone(engine.normalise('mts', shift_info(5), 100))
+        self.assertIsNone(engine.normalise('mts', {'exam_date': 'Unknown', 'exam_time': 'x'}, 100))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parse_pool
+from parse_pool import ParsePool, ParseTimeout
+
+# Stand-in extraction for the tests: sleeps, then reports the process it ran in
+parse_pool.EXTRACTORS.setdefault('test-sleep', ('test_parse_pool', 'sleep_extract'))
+
+
+def sleep_extract(html_content, seconds):
+    time.sleep(seconds)
+    return os.getpid()
+
+
+class ParsePoolTimeoutTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ParsePool(workers=2, timeout=1.5)
+        self.addCleanup(self.pool.shutdown)
+        if not self.pool.warm():
+            self.skipTest(f"parse pool unavailable: {self.pool.unavailable}")
+
+    def test_timeout_does_not_fail_a_running_parse(self):
+        outcomes = {}
+
+        def run(name, seconds):
+            try:
+                outcomes[name] = self.pool.extract('test-sleep', '', seconds)
+            except Exception as e:
+                outcomes[name] = e
+
+        stuck = threading.Thread(target=run, args=('stuck', 30))
+        stuck.start()
+        time.sleep(1.0)
+        # Still running when the stuck page times out (at 1.5s)
+        running = threading.Thread(target=run, args=('running', 1.0))
+        running.start()
+        stuck.join(10)
+        running.join(10)
+
+        self.assertIsInstance(outcomes['stuck'], ParseTimeout)
+        self.assertIsInstance(outcomes['running'], int)
+        self.assertNotEqual(outcomes['running'], os.getpid())
+        self.assertEqual(self.pool.in_process, 0)
+        # New pages go to a fresh pool
+        self.assertNotEqual(self.pool.extract('test-sleep', '', 0), os.getpid())
+        self.assertEqual(self.pool.stats()['retired'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
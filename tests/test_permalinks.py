@@ -0,0 +1,97 @@
+import os
+import sys
+import gzip
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from answer_sheet import AnswerSheet
+from scraper import score_answer_key
+from result_store import ResultStore
+
+SHIFT = {'exam_date': '01/09/2025', 'exam_time': '9:00 AM - 10:30 AM'}
+
+
+def scored(roll_no, chosen, key='1234'):
+    sheet = AnswerSheet(['q1', 'q2', 'q3', 'q4'], chosen, key,
+                        [{'name': 'Section: Part A', 'group': 1, 'start': 0, 'end': 4}])
+    return score_answer_key(({'roll_no': roll_no, 'cand_name': 'A', 'venue_name': 'B', 'subject': 'MTS', **SHIFT},
+                             sheet))
+
+
+class ResultPermalinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = ResultStore(os.path.join(tempfile.mkdtemp(), 'results.sqlite3'))
+        patcher = mock.patch.object(main, 'result_store', self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = main.create_app({'TESTING': True}).test_client()
+        self.store.save_snapshot('tok', 'mts', {'candidate_info': {'roll_no': '2201001200'}},
+                                 gzip.compress(b'<p>first</p>'))
+
+    def test_shared_link_redirects_to_an_immutable_version(self):
+        redirect = self.client.get('/r/tok')
+        self.assertEqual(redirect.status_code, 302)
+        self.assertIn('no-cache', redirect.headers['Cache-Control'])
+        page = self.client.get(redirect.headers['Location'])
+        self.assertEqual(page.data, b'<p>first</p>')
+        self.assertIn('private', page.headers['Cache-Control'])
+        self.assertIn('immutable', page.headers['Cache-Control'])
+        self.assertNotIn('public', page.headers['Cache-Control'])
+        revalidated = self.client.get(redirect.headers['Location'], headers={'If-None-Match': page.headers['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_re_rendered_snapshot_gets_a_new_version(self):
+        old = self.client.get('/r/tok').headers['Location']
+        with mock.patch('result_store.time.time', return_value=4102444800.0):
+            self.store.replace_snapshot('tok', gzip.compress(b'<p>revised</p>'))
+        new = self.client.get('/r/tok').headers['Location']
+        self.assertNotEqual(old, new)
+        self.assertTrue(self.client.get(old).headers['Location'].endswith('/r/tok'))
+        self.assertEqual(self.client.get(new).data, b'<p>revised</p>')
+
+
+class SnapshotResultTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = ResultStore(os.path.join(tempfile.mkdtemp(), 'results.sqlite3'))
+        for patcher in (mock.patch.object(main, 'result_store', self.store),
+                        mock.patch.object(main.shift_key_index, 'revisions', self.store.revision)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(main.shift_key_index._revisions.clear)
+        self.client = main.create_app({'TESTING': True}).test_client()
+
+    def test_upload_does_not_replace_another_sheet(self):
+        self.store.save('mts', scored('2201001200', '1234'))
+        self.store.save('mts', scored('2201001200', '4321'))
+        self.store.flush()
+        self.assertEqual(self.store.get_result('mts', '2201001200')['answer_sheet']['chosen'], '1234')
+        # The same sheet scored again, or the page fetched from the source site, does replace it
+        self.store.save('mts', scored('2201001200', '4321'), trusted=True)
+        self.store.flush()
+        self.assertEqual(self.store.get_result('mts', '2201001200')['answer_sheet']['chosen'], '4321')
+
+    def test_snapshot_keeps_its_own_result(self):
+        own = scored('2201001200', '1234')
+        self.store.save_snapshot('tok', 'mts', own, gzip.compress(b'<p>own</p>'))
+        self.store.save('mts', scored('2201001200', '----'), trusted=True)
+        self.store.flush()
+        questions = self.client.get('/results/tok/questions').get_json()['questions']
+        self.assertEqual([question['outcome'] for question in questions], ['right'] * 4)
+
+        # A key revision re-scores the snapshot's own sheet, not the stored row
+        self.store.save_revision(('mts', SHIFT['exam_date'], SHIFT['exam_time']), {'q1': '2'})
+        main.shift_key_index._revisions.clear()
+        self.client.get('/r/tok')
+        exam, result = self.store.snapshot_result('tok')
+        self.assertEqual(result['exam_summary']['total_marks'], own['exam_summary']['total_marks'] - 4)
+        self.assertEqual(result['question_wise_data']['q1'], 'wrong')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import sys
+import json
+import unittest
+from unittest import mock
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import proxy_only
+from memory_budget import PageTooLarge
+from proxy_only import ALLORIGINS_RAW_URL, fetch_allorigins
+
+PAGE = '<div class="wrapper"><div class="question-pnl">Q1</div></div>'
+
+
+class FakeResponse:
+
+    def __init__(self, body, status_code=200, headers=None):
+        self.body = body
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, size):
+        for start in range(0, len(self.body), size):
+            yield self.body[start:start + size]
+
+
+class FakeSession:
+    """Answers /raw with `raw` (a response or an exception) and /get with the page's JSON envelope."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.calls = []
+
+    def get(self, url, timeout=None, stream=False, headers=None):
+        endpoint = 'raw' if url.startswith(ALLORIGINS_RAW_URL.split('?')[0]) else 'get'
+        self.calls.append((endpoint, timeout))
+        if endpoint == 'raw':
+            if isinstance(self.raw, Exception):
+                raise self.raw
+            return self.raw
+        return FakeResponse(json.dumps({'contents': PAGE, 'status': {'http_code': 200}}).encode('utf-8'))
+
+
+class FetchAllOriginsTest(unittest.TestCase):
+
+    def test_raw_page_is_used_as_is(self):
+        session = FakeSession(FakeResponse(PAGE.encode('utf-8')))
+        self.assertEqual(fetch_allorigins('https://example.digialm.com/a', session=session), PAGE)
+        self.assertEqual([endpoint for endpoint, _ in session.calls], ['raw'])
+
+    def test_transport_and_http_failures_fall_through_to_get(self):
+        for raw in (requests.ConnectionError('reset'), requests.Timeout('slow'), FakeResponse(b'', status_code=502)):
+            session = FakeSession(raw)
+            self.assertEqual(fetch_allorigins('https://example.digialm.com/a', session=session), PAGE)
+            self.assertEqual([endpoint for endpoint, _ in session.calls], ['raw', 'get'])
+
+    def test_page_too_large_is_not_retried(self):
+        session = FakeSession(FakeResponse(b'', headers={'Content-Length': str(10 ** 10)}))
+        with self.assertRaises(PageTooLarge):
+            fetch_allorigins('https://example.digialm.com/a', session=session)
+        self.assertEqual(len(session.calls), 1)
+
+    def test_attempts_share_one_timeout(self):
+        clock = iter([100.0, 125.0])
+        session = FakeSession(requests.Timeout('slow'))
+        with mock.patch.object(proxy_only.time, 'monotonic', lambda: next(clock, 125.0)):
+            fetch_allorigins('https://example.digialm.com/a', session=session, timeout=30)
+        self.assertEqual(session.calls[1][0], 'get')
+        self.assertAlmostEqual(session.calls[1][1], 5.0)
+
+        clock = iter([100.0, 131.0])
+        session = FakeSession(requests.Timeout('slow'))
+        with mock.patch.object(proxy_only.time, 'monotonic', lambda: next(clock, 131.0)):
+            with self.assertRaises(requests.Timeout):
+                fetch_allorigins('https://example.digialm.com/a', session=session, timeout=30)
+        self.assertEqual(len(session.calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lazy_result import question_breakdown, scored_result
+from question_stats import QuestionStats
+from result_store import ResultStore
+
+QUESTION_IDS = ['q1', 'q2', 'q3', 'q4']
+
+
+def result(roll_no, chosen, key='1234', scoring_key=None):
+    data = {
+        'candidate_info': {'roll_no': roll_no, 'exam_date': '01/09/2025', 'exam_time': '9:00 AM - 10:30 AM'},
+        'exam_summary': {'total_marks': 0},
+        'section_details': [],
+        'answer_sheet': {'question_ids': QUESTION_IDS, 'chosen': chosen, 'key': key,
+                         'sections': [{'name': 'Part A', 'group': 0, 'start': 0, 'end': 4}]},
+    }
+    if scoring_key:
+        data['scoring_key'] = scoring_key
+    return scored_result(data)
+
+
+class QuestionStatsTest(unittest.TestCase):
+
+    def test_record_leaves_the_breakdown_lazy(self):
+        stats = QuestionStats()
+        scored = result('1', '12-4')
+        self.assertTrue(stats.record('mts', scored))
+        self.assertIn('question_wise_data', scored.pending())
+
+    def test_outcomes_match_the_breakdown(self):
+        stats = QuestionStats()
+        results = [result('1', '12-4'), result('2', '2134'), result('3', '1.34', key='....', scoring_key='1434')]
+        for scored in results:
+            stats.record('mts', scored)
+        counters = stats.counters(('mts', '01/09/2025', '9:00 AM - 10:30 AM'))
+        expected = {name: [0] * 4 for name in counters.counts}
+        for scored in results:
+            for position, outcome in enumerate(question_breakdown(scored).values()):
+                expected[outcome][position] += 1
+        self.assertEqual({name: list(counts) for name, counts in counters.counts.items()}, expected)
+        self.assertEqual(counters.key, ['1', '2', '3', '4'])
+        self.assertEqual(counters.options[0], {'1': 2, '2': 1})
+
+
+class ResultStoreOutcomesTest(unittest.TestCase):
+
+    def test_save_leaves_the_breakdown_lazy(self):
+        store = ResultStore(os.path.join(tempfile.mkdtemp(), 'results.sqlite3'))
+        scored = result('2201001200', '12-4', scoring_key='1244')
+        self.assertTrue(store.save('mts', scored, trusted=True))
+        self.assertIn('question_wise_data', scored.pending())
+        store.flush()
+        stored = store.get_result('mts', '2201001200')
+        self.assertEqual(stored['question_wise_data'], question_breakdown(scored))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import bisect
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rank_index import ScoreHistogram, ShiftRankIndex
+
+
+def shift_info(roll_no, exam_time='9:00 AM - 10:00 AM'):
+    return {'roll_no': roll_no, 'exam_date': '01/09/2025', 'exam_time': exam_time}
+
+
+class ScoreHistogramTest(unittest.TestCase):
+
+    def test_counts_match_sorted_list(self):
+        rng = random.Random(7)
+        scores = sorted(rng.randint(-40, 400) * 0.25 for _ in range(2000))
+        histogram = ScoreHistogram()
+        for score in scores:
+            histogram.insert(score)
+
+        self.assertEqual(histogram.total, len(scores))
+        for probe in (-10.0, 0.0, 0.25, 17.5, 42.75, 99.0, 100.0):
+            self.assertEqual(histogram.count_at_or_below(probe), bisect.bisect_right(scores, probe))
+            self.assertEqual(histogram.count_below(probe), bisect.bisect_left(scores, probe))
+        for k in (1, 2, 500, 1000, 1999, 2000):
+            self.assertEqual(histogram.kth_score(k), scores[k - 1])
+        self.assertEqual(histogram.quantile(0.5), scores[999])
+        self.assertEqual(sum(histogram.counts()), len(scores))
+
+    def test_off_grid_scores_round_to_bucket(self):
+        histogram = ScoreHistogram()
+        histogram.insert(10.1)
+        self.assertEqual(histogram.kth_score(1), 10.0)
+        self.assertIsNone(ScoreHistogram().quantile(0.5))
+
+
+class ShiftRankIndexTest(unittest.TestCase):
+
+    def test_standing_matches_sorted_list(self):
+        rng = random.Random(3)
+        index = ShiftRankIndex()
+        scores = []
+        for n in range(300):
+            score = rng.randint(0, 200) * 0.5
+            scores.append(score)
+            index.record('mts', shift_info(f'R{n}'), score)
+        scores.sort()
+
+        for score in (scores[0], scores[150], scores[-1], 55.5):
+            standing = index.standing('mts', shift_info('anyone'), score)
+            at_or_below = bisect.bisect_right(scores, score)
+            self.assertEqual(standing['total'], len(scores))
+            self.assertEqual(standing['rank'], len(scores) - at_or_below + 1)
+            self.assertEqual(standing['percentile'], round(100.0 * at_or_below / len(scores), 2))
+
+    def test_duplicate_submission_counted_once(self):
+        index = ShiftRankIndex()
+        self.assertEqual(index.record('je', shift_info('R1'), 80.0), (('je', '01/09/2025', '9:00 AM - 10:00 AM'), True))
+        self.assertFalse(index.record('je', shift_info('R1'), 80.0)[1])
+        self.assertEqual(index.standing('je', shift_info('R1'), 80.0)['total'], 1)
+        self.assertIsNone(index.standing('je', shift_info('R1', exam_time='Unknown'), 80.0))
+
+    def test_evicted_shift_leaves_pool(self):
+        index = ShiftRankIndex(max_shifts=1)
+        index.record('mts', shift_info('R1'), 50.0)
+        index.record('mts', shift_info('R2', exam_time='1:00 PM - 2:00 PM'), 70.0)
+        self.assertEqual(index.shifts('mts'), [('mts', '01/09/2025', '1:00 PM - 2:00 PM')])
+        equated = index.equipercentile('mts', shift_info('R2', exam_time='1:00 PM - 2:00 PM'), 70.0)
+        self.assertEqual((equated['pooled_total'], equated['normalised_marks']), (1, 70.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from request_capture import anonymise_html, replay_case
+
+
+def candidate_table(*rows):
+    return '<table>' + ''.join(f'<tr><td>{label}</td><td>{value}</td></tr>' for label, value in rows) + '</table>'
+
+
+class AnonymiseHtmlTest(unittest.TestCase):
+
+    def test_keeps_only_listed_labels(self):
+        html = anonymise_html(candidate_table(
+            ('Exam Date', '01/09/2025'), ('Test Time :', '9:00 AM - 10:30 AM'), ('Subject', 'MTS 2025'),
+            ('Exam Centre Name', 'iON Digital Zone'), ('Exam Venue Address', 'Sector 62, Noida'),
+        ))
+        self.assertIn('01/09/2025', html)
+        self.assertIn('9:00 AM - 10:30 AM', html)
+        self.assertIn('MTS 2025', html)
+        self.assertNotIn('iON Digital Zone', html)
+        self.assertNotIn('Sector 62', html)
+
+    def test_redacts_every_pair_of_a_row(self):
+        html = anonymise_html('<table><tr><td>Roll No</td><td>2201001200</td>'
+                              '<td>Candidate Name</td><td>Asha Verma</td>'
+                              '<td>Exam Date</td><td>01/09/2025</td></tr></table>')
+        self.assertNotIn('2201001200', html)
+        self.assertNotIn('Asha Verma', html)
+        self.assertIn('01/09/2025', html)
+
+    def test_redacts_header_cell_rows(self):
+        html = anonymise_html('<table><tr><th>Venue</th><td>Noida Center</td></tr>'
+                              '<tr><th>Subject</th><td>MTS 2025</td></tr>'
+                              '<tr><td>Candidate: Asha Verma</td></tr></table>')
+        self.assertNotIn('Noida Center', html)
+        self.assertNotIn('Asha Verma', html)
+        self.assertIn('MTS 2025', html)
+
+    def test_redacts_candidate_details_elsewhere(self):
+        html = anonymise_html(candidate_table(('Roll Number', '2201001200')) + '<p>2201001200</p>',
+                              {'roll_no': '2201001200'})
+        self.assertNotIn('2201001200', html)
+
+
+class ReplayCaseTest(unittest.TestCase):
+
+    def test_refused_page_replays_without_a_result(self):
+        result, elapsed_ms, stats_text = replay_case({'case_id': 'case', 'exam': 'mts', 'html': '<p>Not found</p>'})
+        self.assertIsNone(result)
+        self.assertGreaterEqual(elapsed_ms, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rescoring
+import scraper
+from answer_key_index import ShiftKeyIndex
+from answer_sheet import BONUS, AnswerSheet
+from rescoring import KeyRevision, rescore_shift
+from result_store import ResultStore
+
+SHIFT = {'exam_date': '01/09/2025', 'exam_time': '9:00 AM - 10:30 AM'}
+QUESTION_IDS = ['q1', 'q2', 'q3', 'q4', 'q5', 'q6']
+SECTIONS = [
+    {'name': 'Section : Reasoning', 'group': 0, 'start': 0, 'end': 3},
+    {'name': 'Section : English', 'group': 1, 'start': 3, 'end': 6},
+]
+KEY = '123412'
+# q2 (no negative marking) and q5 (negative marking) change, q6 is dropped
+REVISED_KEY = '13343' + BONUS
+CHOSEN = ['123412', '133-32', '-21111', '444444']
+
+
+def scored(roll_no, chosen, key):
+    sheet = AnswerSheet(list(QUESTION_IDS), chosen, key, [dict(section) for section in SECTIONS])
+    info = {'roll_no': roll_no, 'cand_name': 'A', 'venue_name': 'B', 'subject': 'MTS', **SHIFT}
+    # A fresh key index, so every sheet is scored against its own key
+    with mock.patch.object(scraper, 'shift_key_index', ShiftKeyIndex()), contextlib.redirect_stdout(io.StringIO()):
+        return scraper.score_answer_key((info, sheet))
+
+
+def section_view(result):
+    return [(section['right'], section['wrong'], section['not_attempted'], section['bonus'],
+             section['marks_in_section']) for section in result['section_details']]
+
+
+class RescoreShiftTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = ResultStore(os.path.join(tempfile.mkdtemp(), 'results.sqlite3'))
+        for n, chosen in enumerate(CHOSEN):
+            self.store.save('mts', scored(f'R{n}', chosen, KEY), trusted=True)
+        self.store.flush()
+        self.revision = KeyRevision('mts', SHIFT['exam_date'], SHIFT['exam_time'],
+                                    changed={'q2': '3', 'q5': '3'}, bonus=['q6'])
+
+    def check_rescore(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = rescore_shift(self.store, self.revision, apply=True)
+        self.assertEqual((report['sheets'], report['skipped']), (len(CHOSEN), 0))
+        new_totals = {roll_no: new_total for roll_no, _, new_total in report['results']}
+        for n, chosen in enumerate(CHOSEN):
+            expected = scored(f'R{n}', chosen, REVISED_KEY)
+            stored = self.store.get_result('mts', f'R{n}')
+            self.assertEqual(new_totals[f'R{n}'], expected['exam_summary']['total_marks'])
+            self.assertEqual(stored['exam_summary'], expected['exam_summary'])
+            self.assertEqual(section_view(stored), section_view(expected))
+            self.assertEqual(stored['answer_sheet']['key'], REVISED_KEY)
+
+    def test_rescore_with_numpy(self):
+        if not rescoring.NUMPY_AVAILABLE:
+            self.skipTest('numpy is not installed')
+        self.check_rescore()
+
+    def test_rescore_pure_python(self):
+        with mock.patch.object(rescoring, 'NUMPY_AVAILABLE', False):
+            self.check_rescore()
+
+    def test_report_only_leaves_store_unchanged(self):
+        before = self.store.get_result('mts', 'R0')
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = rescore_shift(self.store, self.revision)
+        self.assertEqual(report['changed'], len(CHOSEN))
+        self.assertEqual(self.store.get_result('mts', 'R0'), before)
+        self.assertIsNone(self.store.revision(self.revision.shift))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+import singleflight
+from admission import Saturated
+from singleflight import FOLLOWER_MAX_WAIT, SingleFlight
+from proxy_only import PROXY_TIMEOUT
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def test_followers_get_copies(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        results = []
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return {'score': 1}
+
+        leader = threading.Thread(target=lambda: results.append(flight.do('key', slow)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(flight.do('key', lambda: {'score': 2})))
+        follower.start()
+        while not flight.coalesced:
+            pass
+        release.set()
+        leader.join()
+        follower.join()
+        self.assertEqual(results, [{'score': 1}, {'score': 1}])
+        self.assertIsNot(results[0], results[1])
+        self.assertEqual(flight.executed, 1)
+
+    def test_late_joiner_never_shares_the_leaders_result(self):
+        # A caller arriving just as the leader returns must not receive (a copy
+        # of) the object the leader's route is already adding fields to
+        flight = SingleFlight()
+        stop = threading.Event()
+        leaked = []
+
+        def follow():
+            while not stop.is_set():
+                result = flight.do('key', lambda: {'score': 1})
+                if len(result) != 1:
+                    leaked.append(result)
+
+        followers = [threading.Thread(target=follow) for _ in range(4)]
+        for thread in followers:
+            thread.start()
+        try:
+            for _ in range(20000):
+                result = flight.do('key', lambda: {'score': 1})
+                for number in range(20):
+                    result[f'route_field_{number}'] = number
+        finally:
+            stop.set()
+            for thread in followers:
+                thread.join()
+        self.assertEqual(leaked, [])
+
+    def test_error_reaches_followers(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        errors = []
+
+        def failing():
+            started.set()
+            release.wait(5)
+            raise ValueError('fetch failed')
+
+        def call(function):
+            try:
+                flight.do('key', function)
+            except ValueError as e:
+                errors.append(str(e))
+
+        leader = threading.Thread(target=call, args=(failing,))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=call, args=(lambda: None,))
+        follower.start()
+        while not flight.coalesced:
+            pass
+        release.set()
+        leader.join()
+        follower.join()
+        self.assertEqual(errors, ['fetch failed', 'fetch failed'])
+        self.assertEqual(len(flight), 0)
+
+    def test_follower_gives_up_after_max_wait(self):
+        self.assertGreater(FOLLOWER_MAX_WAIT, PROXY_TIMEOUT)
+        flight = SingleFlight(max_wait=0.1)
+        started, release = threading.Event(), threading.Event()
+        results = []
+
+        def hanging():
+            started.set()
+            release.wait(5)
+            return {'score': 1}
+
+        leader = threading.Thread(target=lambda: results.append(flight.do('key', hanging)))
+        leader.start()
+        started.wait(5)
+        try:
+            with self.assertRaises(Saturated) as raised:
+                flight.do('key', lambda: {'score': 2})
+        finally:
+            release.set()
+            leader.join()
+        self.assertGreater(raised.exception.retry_after, 0)
+        self.assertEqual(flight.timed_out, 1)
+        # The leader still gets its own result
+        self.assertEqual(results, [{'score': 1}])
+
+    def test_follower_timeout_answers_503(self):
+        started, release = threading.Event(), threading.Event()
+        url = 'https://cdn3.digialm.com/per/g28/pub/2207/touchstone/AssessmentQPHTMLMode1/sheet.html'
+
+        def hanging(source, **kwargs):
+            started.set()
+            release.wait(5)
+            return None
+
+        client = main.create_app({'TESTING': True}).test_client()
+        with mock.patch.object(singleflight, 'single_flight', SingleFlight(max_wait=0.1)), \
+                mock.patch.object(main, 'cached_result', lambda exam, url, compute: compute()), \
+                mock.patch.object(main, 'scrape_mts_key', hanging):
+            leader = threading.Thread(target=client.post, args=('/mts',), kwargs={'data': {'ans_key_url': url}})
+            leader.start()
+            started.wait(5)
+            try:
+                response = client.post('/mts', data={'ans_key_url': url})
+            finally:
+                release.set()
+                leader.join()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
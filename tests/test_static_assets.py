@@ -0,0 +1,46 @@
+import os
+import sys
+import gzip
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from static_assets import ASSET_MAX_AGE, PREVIOUS_ASSET_MAX_AGE, asset_manifest, fingerprint
+
+NAME = 'js/app.js'
+
+
+class StaticAssetRouteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = main.create_app({'TESTING': True}).test_client()
+        self.data = asset_manifest.by_name[NAME].data
+        self.current = '/assets/' + fingerprint(NAME, self.data)
+        self.assertEqual(asset_manifest.url(NAME), self.current)
+
+    def test_current_fingerprint_is_immutable(self):
+        response = self.client.get(self.current)
+        self.assertEqual(response.data, self.data)
+        self.assertEqual(response.headers['Cache-Control'], f'public, max-age={ASSET_MAX_AGE}, immutable')
+
+    def test_old_fingerprint_gets_short_max_age(self):
+        # e.g. linked by a permalink page stored before the file last changed
+        response = self.client.get('/assets/' + fingerprint(NAME, self.data + b'// earlier version'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, self.data)
+        self.assertEqual(response.headers['Cache-Control'], f'public, max-age={PREVIOUS_ASSET_MAX_AGE}')
+
+    def test_revalidation_and_gzip(self):
+        etag = self.client.get(self.current).headers['ETag']
+        self.assertEqual(self.client.get(self.current, headers={'If-None-Match': etag}).status_code, 304)
+        response = self.client.get(self.current, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.data), self.data)
+
+    def test_unknown_asset_is_404(self):
+        self.assertEqual(self.client.get('/assets/js/missing.0123456789.js').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
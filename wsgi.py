@@ -0,0 +1,76 @@
+# Production entry point for pre-fork WSGI servers:
+#
+#     gunicorn -c gunicorn.conf.py wsgi:app
+#
+# The application, the scrapers, the HTML tree builders, the compiled Jinja
+# templates and (optionally) the extraction plans of sample answer key pages
+# are loaded once here, in the server's master process, before it forks its
+# workers. The workers share those pages copy-on-write instead of each
+# importing and compiling everything again on its first request.
+import io
+import gc
+import os
+import time
+import contextlib
+
+from main import create_app
+
+# Saved answer key pages parsed during warm-up to compile their extraction
+# plans (os.pathsep-separated); pages are only parsed, never scored or stored
+WARMUP_PAGES = [path for path in os.environ.get('MARKSKING_WARMUP_PAGES', '').split(os.pathsep) if path]
+
+# Smallest page that takes every scraper through the tree builder
+_WARMUP_HTML = "<html><body><table class='main-info-pnl'><tr><td>Roll No</td><td>0</td></tr></table></body></html>"
+
+
+def warm_up(app, pages=WARMUP_PAGES):
+    """
+    Loads everything a first request would otherwise pay for, then moves the
+    surviving objects out of the garbage collector's reach (gc.freeze()) so
+    collections in the workers do not touch, and thereby copy, the shared pages.
+
+    Nothing here opens result store or cache connections: those belong to
+    each worker.
+
+    Args:
+        app (Flask): The application to warm up.
+        pages (list): Saved answer key pages whose extraction plans to compile.
+    """
+    from scraper import extract_answer_key
+    from scraper_je import extract_je_answer_key
+    from scraper_chsl import extract_chsl_answer_key
+
+    started = time.perf_counter()
+    extractors = (extract_answer_key, extract_je_answer_key, extract_chsl_answer_key)
+    samples = [_WARMUP_HTML]
+    for path in pages:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                samples.append(f.read())
+        except OSError as e:
+            print(f"⚠️ Warm-up page skipped ({path}): {e}")
+    for html_content in samples:
+        for extract in extractors:
+            # Most pages belong to one exam only; the others just reject them
+            with contextlib.redirect_stdout(io.StringIO()):
+                try:
+                    extract(html_content)
+                except Exception:
+                    pass
+
+    templates = 0
+    for name in app.jinja_env.list_templates(extensions=['html', 'xml', 'txt']):
+        try:
+            app.jinja_env.get_template(name)
+            templates += 1
+        except Exception as e:
+            print(f"⚠️ Template {name} failed to compile: {e}")
+
+    gc.collect()
+    gc.freeze()
+    print(f"✓ Warm-up done: {len(samples) - 1} page(s), {templates} template(s) in "
+          f"{time.perf_counter() - started:.2f}s ({gc.get_freeze_count()} objects frozen)")
+
+
+app = create_app()
+warm_up(app)